@@ -0,0 +1,278 @@
+"""Incrementally maintained daily rollups for attendance and notification analytics.
+
+The dashboard, analytics, settings and student pages all ask for 7/30/90-day
+summaries, and Streamlit reruns them on every widget interaction. Recomputing the
+summaries from raw rows each time is a full scan. These tables instead hold counts
+per day, per person, per category, per priority and per status, plus hourly
+histograms. Triggers update them in the same transaction as each raw insert, delete
+or status change. A summary is then a range scan over `days` rollup rows.
+
+compact_rollups() is the maintenance job. It deletes buckets that have dropped to
+zero and rebuilds a recent window from the raw rows, which repairs any drift from
+rows written while the triggers were missing. ensure_rollups() backfills everything
+the first time it runs.
+
+Attendance rollups assume the attendance table that AttendanceSystem writes
+(person_name, timestamp). That table may appear after the rollups are set up, so
+ensure_attendance_rollups() installs its triggers separately. It reports False
+until the table exists, and the caller runs it again later.
+"""
+from datetime import date, timedelta
+
+ROLLUP_TABLES = """
+CREATE TABLE IF NOT EXISTS attendance_daily (
+    day TEXT NOT NULL,
+    person_name TEXT NOT NULL,
+    count INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (day, person_name)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS attendance_hourly (
+    day TEXT NOT NULL,
+    hour INTEGER NOT NULL,
+    count INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (day, hour)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS notification_daily (
+    day TEXT NOT NULL,
+    notification_type TEXT NOT NULL,
+    priority INTEGER NOT NULL,
+    status TEXT NOT NULL,
+    count INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (day, notification_type, priority, status)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS notification_hourly (
+    day TEXT NOT NULL,
+    hour INTEGER NOT NULL,
+    count INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (day, hour)
+) WITHOUT ROWID;
+"""
+
+# Bucket keys. COALESCE keeps a NULL or malformed value from failing the raw write.
+_DAY = "COALESCE(date({ts}), date('now', 'localtime'))"
+_HOUR = "COALESCE(CAST(strftime('%H', {ts}) AS INTEGER), 0)"
+
+
+def _bucket(row, ts):
+    return _DAY.format(ts=f"{row}.{ts}"), _HOUR.format(ts=f"{row}.{ts}")
+
+
+def _attendance_triggers():
+    new_day, new_hour = _bucket('NEW', 'timestamp')
+    old_day, old_hour = _bucket('OLD', 'timestamp')
+    return f"""
+CREATE INDEX IF NOT EXISTS idx_attendance_timestamp ON attendance(timestamp);
+
+CREATE TRIGGER IF NOT EXISTS trg_rollup_attendance_insert AFTER INSERT ON attendance
+BEGIN
+    INSERT INTO attendance_daily (day, person_name, count)
+    VALUES ({new_day}, COALESCE(NEW.person_name, ''), 1)
+    ON CONFLICT(day, person_name) DO UPDATE SET count = count + 1;
+    INSERT INTO attendance_hourly (day, hour, count) VALUES ({new_day}, {new_hour}, 1)
+    ON CONFLICT(day, hour) DO UPDATE SET count = count + 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_rollup_attendance_delete AFTER DELETE ON attendance
+BEGIN
+    UPDATE attendance_daily SET count = count - 1
+    WHERE day = {old_day} AND person_name = COALESCE(OLD.person_name, '');
+    UPDATE attendance_hourly SET count = count - 1 WHERE day = {old_day} AND hour = {old_hour};
+END;
+"""
+
+
+def _notification_triggers():
+    new_day, new_hour = _bucket('NEW', 'created_at')
+    old_day, old_hour = _bucket('OLD', 'created_at')
+    new_key = "COALESCE(NEW.notification_type, ''), COALESCE(NEW.priority, 0), COALESCE(NEW.status, '')"
+    old_match = ("notification_type = COALESCE(OLD.notification_type, '') AND priority = COALESCE(OLD.priority, 0) "
+                 "AND status = COALESCE(OLD.status, '')")
+    return f"""
+CREATE TRIGGER IF NOT EXISTS trg_rollup_notification_insert AFTER INSERT ON notifications
+BEGIN
+    INSERT INTO notification_daily (day, notification_type, priority, status, count)
+    VALUES ({new_day}, {new_key}, 1)
+    ON CONFLICT(day, notification_type, priority, status) DO UPDATE SET count = count + 1;
+    INSERT INTO notification_hourly (day, hour, count) VALUES ({new_day}, {new_hour}, 1)
+    ON CONFLICT(day, hour) DO UPDATE SET count = count + 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_rollup_notification_status AFTER UPDATE OF status ON notifications
+WHEN COALESCE(OLD.status, '') != COALESCE(NEW.status, '')
+BEGIN
+    UPDATE notification_daily SET count = count - 1 WHERE day = {old_day} AND {old_match};
+    INSERT INTO notification_daily (day, notification_type, priority, status, count)
+    VALUES ({new_day}, {new_key}, 1)
+    ON CONFLICT(day, notification_type, priority, status) DO UPDATE SET count = count + 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_rollup_notification_delete AFTER DELETE ON notifications
+BEGIN
+    UPDATE notification_daily SET count = count - 1 WHERE day = {old_day} AND {old_match};
+    UPDATE notification_hourly SET count = count - 1 WHERE day = {old_day} AND hour = {old_hour};
+END;
+"""
+
+
+def _table_exists(conn, name):
+    return conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (name,)).fetchone() is not None
+
+
+def _rebuild_attendance(conn, since=None):
+    day_filter = "WHERE day >= :since" if since else ""
+    params = {'since': since}
+    if _table_exists(conn, 'attendance'):
+        day, hour = _DAY.format(ts='timestamp'), _HOUR.format(ts='timestamp')
+        conn.execute(f"DELETE FROM attendance_daily {day_filter}", params)
+        conn.execute(f"DELETE FROM attendance_hourly {day_filter}", params)
+        conn.execute(
+            f"INSERT INTO attendance_daily (day, person_name, count) "
+            f"SELECT * FROM (SELECT {day} AS day, COALESCE(person_name, ''), COUNT(*) FROM attendance "
+            f"GROUP BY 1, 2) {day_filter}", params)
+        conn.execute(
+            f"INSERT INTO attendance_hourly (day, hour, count) "
+            f"SELECT * FROM (SELECT {day} AS day, {hour}, COUNT(*) FROM attendance GROUP BY 1, 2) {day_filter}",
+            params)
+
+
+def _rebuild(conn, since=None):
+    """Recompute the rollups from raw rows, for every day or from `since` (YYYY-MM-DD) on"""
+    day_filter = "WHERE day >= :since" if since else ""
+    params = {'since': since}
+    _rebuild_attendance(conn, since)
+    day, hour = _DAY.format(ts='created_at'), _HOUR.format(ts='created_at')
+    conn.execute(f"DELETE FROM notification_daily {day_filter}", params)
+    conn.execute(f"DELETE FROM notification_hourly {day_filter}", params)
+    conn.execute(
+        f"INSERT INTO notification_daily (day, notification_type, priority, status, count) "
+        f"SELECT * FROM (SELECT {day} AS day, COALESCE(notification_type, ''), COALESCE(priority, 0), "
+        f"COALESCE(status, ''), COUNT(*) FROM notifications GROUP BY 1, 2, 3, 4) {day_filter}", params)
+    conn.execute(
+        f"INSERT INTO notification_hourly (day, hour, count) "
+        f"SELECT * FROM (SELECT {day} AS day, {hour}, COUNT(*) FROM notifications GROUP BY 1, 2) {day_filter}",
+        params)
+
+
+def ensure_rollups(conn):
+    fresh = not _table_exists(conn, 'notification_daily')
+    conn.executescript(ROLLUP_TABLES)
+    conn.executescript(_notification_triggers())
+    if fresh:
+        _rebuild(conn)
+    conn.commit()
+    ensure_attendance_rollups(conn)
+
+
+def ensure_attendance_rollups(conn):
+    """Install the attendance triggers once the attendance table exists; False until then"""
+    if not _table_exists(conn, 'attendance'):
+        return False
+    installed = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'trigger' AND name = 'trg_rollup_attendance_insert'"
+    ).fetchone()
+    if not installed:
+        conn.executescript(ROLLUP_TABLES)
+        conn.executescript(_attendance_triggers())
+        # Count the rows written before the triggers existed
+        _rebuild_attendance(conn)
+        conn.commit()
+    return True
+
+
+def compact_rollups(conn, rebuild_days=2):
+    """Drop empty buckets and rebuild the last rebuild_days days from raw rows"""
+    for table in ('attendance_daily', 'attendance_hourly', 'notification_daily', 'notification_hourly'):
+        conn.execute(f"DELETE FROM {table} WHERE count <= 0")
+    if rebuild_days:
+        since = (date.today() - timedelta(days=rebuild_days - 1)).isoformat()
+        _rebuild(conn, since)
+    conn.commit()
+
+
+def _since(days):
+    return (date.today() - timedelta(days=days - 1)).isoformat()
+
+
+def _day_range(days):
+    start = date.today() - timedelta(days=days - 1)
+    return [(start + timedelta(days=i)).isoformat() for i in range(days)]
+
+
+def attendance_summary(conn, days=7, registered_people=0):
+    """get_attendance_summary(days), served from the rollups
+
+    Adds 'daily' (one count per day, oldest first), 'per_person' and 'hourly' (24 counts).
+    """
+    since, today = _since(days), date.today().isoformat()
+    if not _table_exists(conn, 'attendance'):
+        return {'stats': {'total_attendance': 0, 'unique_people': 0, 'today_attendance': 0},
+                'registered_people': registered_people, 'people_list': [], 'today_attendance': [],
+                'daily': [0] * days, 'per_person': {}, 'hourly': [0] * 24}
+    by_day = dict(conn.execute(
+        "SELECT day, SUM(count) FROM attendance_hourly WHERE day >= ? GROUP BY day", (since,)
+    ).fetchall())
+    hourly = [0] * 24
+    for hour, count in conn.execute(
+        "SELECT hour, SUM(count) FROM attendance_hourly WHERE day >= ? GROUP BY hour", (since,)
+    ).fetchall():
+        hourly[hour % 24] = count
+    per_person = dict(conn.execute(
+        "SELECT person_name, SUM(count) FROM attendance_daily WHERE day >= ? GROUP BY person_name "
+        "HAVING SUM(count) > 0 ORDER BY 2 DESC", (since,)
+    ).fetchall())
+    tomorrow = (date.today() + timedelta(days=1)).isoformat()
+    today_records = [dict(row) for row in conn.execute(
+        "SELECT * FROM attendance WHERE timestamp >= ? AND timestamp < ? ORDER BY timestamp DESC", (today, tomorrow)
+    ).fetchall()]
+    return {
+        'stats': {
+            'total_attendance': sum(by_day.values()),
+            'unique_people': len(per_person),
+            'today_attendance': by_day.get(today, 0),
+        },
+        'registered_people': registered_people,
+        'people_list': list(per_person),
+        'today_attendance': today_records,
+        'daily': [by_day.get(day, 0) for day in _day_range(days)],
+        'per_person': per_person,
+        'hourly': hourly,
+    }
+
+
+def notification_analytics(conn, days=7):
+    """get_notification_analytics(days), served from the rollups
+
+    Adds 'daily' (one count per day, oldest first) and 'hourly' (24 counts).
+    """
+    since = _since(days)
+    total = sent = 0
+    by_day, by_type, by_priority = {}, {}, {}
+    for row in conn.execute(
+        "SELECT day, notification_type, priority, status, count FROM notification_daily "
+        "WHERE day >= ? AND count > 0", (since,)
+    ).fetchall():
+        count = row['count']
+        total += count
+        if row['status'] == 'sent':
+            sent += count
+        by_day[row['day']] = by_day.get(row['day'], 0) + count
+        by_type[row['notification_type']] = by_type.get(row['notification_type'], 0) + count
+        by_priority[row['priority']] = by_priority.get(row['priority'], 0) + count
+    hourly = [0] * 24
+    for hour, count in conn.execute(
+        "SELECT hour, SUM(count) FROM notification_hourly WHERE day >= ? GROUP BY hour", (since,)
+    ).fetchall():
+        hourly[hour % 24] = count
+    peak_hour = f"{hourly.index(max(hourly)):02d}:00" if any(hourly) else 'N/A'
+    return {
+        'total_notifications': total,
+        'sent_notifications': sent,
+        'delivery_rate': round(sent / total * 100, 1) if total else 0,
+        'priority_distribution': dict(sorted(by_priority.items())),
+        'patterns': {'category_distribution': by_type, 'peak_hour': peak_hour},
+        'daily': [by_day.get(day, 0) for day in _day_range(days)],
+        'hourly': hourly,
+    }
@@ -0,0 +1,102 @@
+"""Time-bucketed attendance series for the trend charts.
+
+attendance_series() returns dense NumPy arrays with one timestamp and one count per
+day or per hour. Missing buckets are filled with zeros. The series is read from the
+daily and hourly rollups (see analytics_rollups). A year of daily points is
+therefore about 365 rows from a primary-key range scan, never a pass over the raw
+attendance table. The one exception is per-person hourly buckets, which the rollups
+do not keep. Those come from the raw rows through the (person_name, timestamp) index.
+
+lttb() downsamples a series to a fixed number of points with Largest-Triangle-
+Three-Buckets. LTTB keeps the peaks and dips a chart needs, so 90-day and multi-year
+views stay cheap to draw.
+"""
+from datetime import date, timedelta
+
+import numpy as np
+
+SERIES_INDEXES = (
+    "CREATE INDEX IF NOT EXISTS idx_attendance_person_timestamp "
+    "ON attendance(person_name COLLATE NOCASE, timestamp)"
+)
+
+BUCKETS = {'day': 'D', 'hour': 'h'}
+
+
+def ensure_series_indexes(conn):
+    """Index the attendance table; False while AttendanceSystem has not created it yet"""
+    if not conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'attendance'").fetchone():
+        return False
+    conn.execute(SERIES_INDEXES)
+    conn.commit()
+    return True
+
+
+def _people_filter(people):
+    if not people:
+        return "", []
+    return f" AND person_name COLLATE NOCASE IN ({','.join('?' * len(people))})", list(people)
+
+
+def attendance_series(conn, start, end=None, bucket='day', people=None):
+    """Attendance counts from start to end (dates, both inclusive) as (timestamps, counts)
+
+    people restricts the series to those names, e.g. one student or a class roster.
+    timestamps is datetime64[D] or datetime64[h]; counts is int64.
+    """
+    if bucket not in BUCKETS:
+        raise ValueError(f"bucket must be one of {sorted(BUCKETS)}")
+    end = end or date.today()
+    unit = BUCKETS[bucket]
+    timestamps = np.arange(np.datetime64(start, 'D').astype(f'datetime64[{unit}]'),
+                           np.datetime64(end + timedelta(days=1), 'D').astype(f'datetime64[{unit}]'))
+    counts = np.zeros(len(timestamps), dtype=np.int64)
+    if not conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'attendance_daily'").fetchone():
+        return timestamps, counts
+
+    people_sql, people_params = _people_filter(people)
+    params = [start.isoformat(), end.isoformat()] + people_params
+    if bucket == 'day':
+        table = 'attendance_daily' if people else 'attendance_hourly'
+        rows = conn.execute(
+            f"SELECT day, SUM(count) FROM {table} WHERE day BETWEEN ? AND ?{people_sql} GROUP BY day", params
+        ).fetchall()
+    elif not people:
+        rows = conn.execute(
+            "SELECT day || 'T' || printf('%02d', hour), count FROM attendance_hourly WHERE day BETWEEN ? AND ?", params
+        ).fetchall()
+    else:
+        params[1] = (end + timedelta(days=1)).isoformat()
+        rows = conn.execute(
+            f"SELECT strftime('%Y-%m-%dT%H', timestamp), COUNT(*) FROM attendance "
+            f"WHERE timestamp >= ? AND timestamp < ?{people_sql} GROUP BY 1", params
+        ).fetchall()
+    rows = [row for row in rows if row[0] is not None]
+    if rows:
+        positions = (np.array([row[0] for row in rows], dtype=f'datetime64[{unit}]') - timestamps[0]).astype(np.int64)
+        values = np.array([row[1] for row in rows], dtype=np.int64)
+        valid = (positions >= 0) & (positions < len(counts))
+        np.add.at(counts, positions[valid], values[valid])
+    return timestamps, counts
+
+
+def lttb(x, y, threshold):
+    """Downsample (x, y) to at most threshold points with Largest-Triangle-Three-Buckets"""
+    n = len(y)
+    if threshold >= n or threshold < 3:
+        return x, y
+    xs = x.astype('datetime64[s]').astype(np.float64) if np.issubdtype(x.dtype, np.datetime64) else x.astype(np.float64)
+    ys = np.asarray(y, dtype=np.float64)
+    # threshold - 2 buckets between the fixed first and last points
+    edges = np.floor(np.linspace(1, n - 1, threshold - 1)).astype(np.int64)
+    selected = np.empty(threshold, dtype=np.int64)
+    selected[0], selected[-1] = 0, n - 1
+    a = 0
+    for i in range(threshold - 2):
+        lo, hi = edges[i], max(edges[i + 1], edges[i] + 1)
+        next_lo, next_hi = hi, edges[i + 2] if i + 2 < len(edges) else n
+        avg_x, avg_y = xs[next_lo:max(next_hi, next_lo + 1)].mean(), ys[next_lo:max(next_hi, next_lo + 1)].mean()
+        areas = np.abs((xs[a] - avg_x) * (ys[lo:hi] - ys[a]) - (xs[a] - xs[lo:hi]) * (avg_y - ys[a]))
+        a = lo + int(np.argmax(areas))
+        selected[i + 1] = a
+    return x[selected], np.asarray(y)[selected]
@@ -0,0 +1,121 @@
+"""Bulk person registration from a ZIP archive or a folder of photos.
+
+The person name comes from the parent folder for photos inside a per-person folder
+("Jane Doe/front.jpg"), and from the file name for loose photos ("Jane_Doe.jpg",
+"jane-doe_2.png"). A ZIP's single top-level folder is only a wrapper, not a person,
+when it holds person folders or is named after the archive. Photos are decoded and encoded in
+parallel on the face worker pool. Every successful encoding is written to the face
+store in one append, which is a single transaction. The report lists the outcome
+of each file and the overall throughput.
+"""
+import os
+import re
+import time
+import zipfile
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png')
+
+
+def _split_path(path):
+    return [p for p in re.split(r'[\\/]', path) if p]
+
+
+def person_name_from_path(path):
+    """Derive a display name from a photo path relative to the folder or archive root"""
+    parts = _split_path(path)
+    # "Jane Doe/front.jpg" - the folder names the person, whatever the file is called
+    stem = parts[-2] if len(parts) > 1 else os.path.splitext(parts[-1])[0]
+    stem = re.sub(r'[_\-\s]+\d+$', '', stem)
+    return ' '.join(word.capitalize() for word in re.split(r'[_\-\s.]+', stem) if word)
+
+
+def wrapper_folder(paths, archive_name=None):
+    """The single top-level folder wrapped around every photo of an archive, or None"""
+    split = [_split_path(path) for path in paths]
+    tops = {parts[0] for parts in split if len(parts) > 1}
+    if len(tops) != 1 or any(len(parts) == 1 for parts in split):
+        return None
+    top = tops.pop()
+    archive_stem = os.path.splitext(os.path.basename(archive_name or ''))[0]
+    if any(len(parts) > 2 for parts in split) or top == archive_stem:
+        return top
+    # A lone folder of loose photos is one person's folder
+    return None
+
+
+def iter_photos(source):
+    """Yield (relative_path, image_bytes) from a ZIP (path or file object) or a directory
+
+    Paths inside a ZIP are relative to its wrapper folder, if it has one.
+    """
+    if isinstance(source, str) and os.path.isdir(source):
+        for root, _, files in os.walk(source):
+            for filename in sorted(files):
+                if filename.lower().endswith(IMAGE_EXTENSIONS):
+                    path = os.path.join(root, filename)
+                    with open(path, 'rb') as f:
+                        yield os.path.relpath(path, source), f.read()
+        return
+    with zipfile.ZipFile(source) as archive:
+        photos = [info for info in archive.infolist()
+                  if not info.is_dir() and not info.filename.startswith('__MACOSX/')
+                  and info.filename.lower().endswith(IMAGE_EXTENSIONS)]
+        wrapper = wrapper_folder([info.filename for info in photos],
+                                 source if isinstance(source, str) else getattr(source, 'name', None))
+        for info in photos:
+            name = info.filename
+            if wrapper is not None:
+                name = '/'.join(_split_path(name)[1:])
+            yield name, archive.read(info)
+
+
+def bulk_register(source, pool, store, index=None, config=None, submit_timeout=300):
+    """Register every photo in source, returning a report dict
+
+    The report has one row per file ({'file', 'person', 'status', 'error'}),
+    plus 'registered', 'failed', 'elapsed_seconds' and 'images_per_second'.
+    """
+    started = time.perf_counter()
+    rows = []
+    pending = []
+    for path, image_bytes in iter_photos(source):
+        row = {'file': path, 'person': person_name_from_path(path), 'status': 'failed', 'error': None}
+        rows.append(row)
+        if not row['person']:
+            row['error'] = "Could not derive a name from the file name"
+            continue
+        try:
+            # Blocks while the pool is saturated instead of buffering the whole archive
+            pending.append((row, pool.submit(image_bytes, config, timeout=submit_timeout)))
+        except Exception as e:
+            row['error'] = str(e)
+
+    names, encodings = [], []
+    for row, future in pending:
+        try:
+            _, face_encodings, _ = future.result()
+        except Exception as e:
+            row['error'] = f"Could not process image: {e}"
+            continue
+        if len(face_encodings) == 0:
+            row['error'] = "No face found"
+        elif len(face_encodings) > 1:
+            row['error'] = f"{len(face_encodings)} faces found, expected one"
+        else:
+            row['status'] = 'registered'
+            names.append(row['person'])
+            encodings.append(face_encodings[0])
+
+    if names:
+        store.append_many(names, encodings)
+        if index is not None:
+            index.add_many(names, encodings)
+
+    elapsed = time.perf_counter() - started
+    return {
+        'rows': rows,
+        'registered': len(names),
+        'failed': len(rows) - len(names),
+        'elapsed_seconds': elapsed,
+        'images_per_second': len(rows) / elapsed if elapsed > 0 else 0.0,
+    }
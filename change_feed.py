@@ -0,0 +1,87 @@
+"""Change-version polling for live notification lists.
+
+Triggers keep a counter in change_versions that rises on every insert, update or
+delete of a notification. A live list polls that counter, which is one primary-key
+lookup. While the counter is unchanged the list re-renders the rows it already
+holds. When it moves, LiveFeed re-runs the list's own filtered query, bounded below
+by the oldest id it shows. New rows and status changes appear, and rows that no
+longer match the filters drop out. If rows dropped out, the page is topped up
+with the next older matching rows, so it stays full. Both queries are bounded
+index range scans of at most `limit` rows.
+"""
+
+CHANGE_FEED_SCHEMA = """
+CREATE TABLE IF NOT EXISTS change_versions (
+    name TEXT PRIMARY KEY,
+    version INTEGER NOT NULL DEFAULT 0
+) WITHOUT ROWID;
+INSERT OR IGNORE INTO change_versions (name, version) VALUES ('notifications', 0);
+
+CREATE TRIGGER IF NOT EXISTS trg_version_notification_insert AFTER INSERT ON notifications
+BEGIN
+    UPDATE change_versions SET version = version + 1 WHERE name = 'notifications';
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_version_notification_update AFTER UPDATE ON notifications
+BEGIN
+    UPDATE change_versions SET version = version + 1 WHERE name = 'notifications';
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_version_notification_delete AFTER DELETE ON notifications
+BEGIN
+    UPDATE change_versions SET version = version + 1 WHERE name = 'notifications';
+END;
+"""
+
+
+def ensure_change_feed(conn):
+    conn.executescript(CHANGE_FEED_SCHEMA)
+    conn.commit()
+
+
+def change_version(conn, name='notifications'):
+    row = conn.execute("SELECT version FROM change_versions WHERE name = ?", (name,)).fetchone()
+    return row[0] if row else 0
+
+
+class LiveFeed:
+    """The newest `limit` rows of a list, kept current by polling the change version
+
+    load(after_id, before_id, limit) must return the list's rows with
+    after_id < id < before_id (before_id None means no upper bound), newest first,
+    at most `limit` of them, with the list's filters applied.
+    """
+
+    def __init__(self, limit=20):
+        self.limit = limit
+        self.version = None
+        self.rows = []
+
+    @property
+    def cursor(self):
+        return self.rows[0]['id'] if self.rows else 0
+
+    def reset(self):
+        """Force a full reload on the next refresh, e.g. after the user changed read state"""
+        self.version = None
+        self.rows = []
+
+    def refresh(self, conn, load):
+        """Bring the rows up to date, returning the rows that are new since the last refresh"""
+        version = change_version(conn)
+        if version == self.version:
+            return []
+        first_load = self.version is None
+        cursor = self.cursor
+        if self.rows:
+            # Everything from the oldest shown row up, through the list's filters
+            floor = self.rows[-1]['id']
+            rows = load(floor - 1, None, self.limit)
+            if len(rows) < self.limit:
+                # Rows stopped matching or were deleted: top the page up from below
+                rows += load(0, floor, self.limit - len(rows))
+        else:
+            rows = load(0, None, self.limit)
+        self.rows = rows[:self.limit]
+        self.version = version
+        return [] if first_load else [row for row in self.rows if row['id'] > cursor]
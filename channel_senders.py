@@ -0,0 +1,450 @@
+"""Connection-reusing senders for the Email, Push and Webhook channels.
+
+- WebhookSender posts through one pooled requests.Session, so connections to each
+  destination are kept alive and reused instead of a TCP/TLS handshake per message.
+- EmailSender keeps a persistent SMTP session and sends many messages over it,
+  reconnecting when the server drops the connection.
+- PushSender groups messages into the gateway's batch size and sends one request
+  per batch.
+
+Every sender applies a token-bucket rate limit per destination. A failed send,
+whether refused, timed out or rejected, comes back as False; senders don't raise.
+
+ChannelSenders holds the configured destinations. with_channel_delivery() hooks it
+into NotificationEngine.send_notification, so every delivery path (dispatcher,
+outbox retries and the Send button) also goes out on the channels enabled in Settings.
+A send only succeeds when every enabled channel delivered. Per-channel results and
+delivered idempotency keys are stored by the outbox (notification_outbox), which
+drives retries of failed channels.
+
+Run this module directly to benchmark messages per second against a local SMTP stub
+and a local HTTP sink:
+
+    python channel_senders.py
+"""
+import functools
+import json
+import os
+import smtplib
+import threading
+import time
+from email.message import EmailMessage
+from urllib.parse import urlsplit
+
+
+class TokenBucket:
+    """Allow `rate` operations per second with bursts of up to `capacity`"""
+
+    def __init__(self, rate, capacity=None):
+        self.rate = float(rate)
+        self.capacity = float(capacity or max(rate, 1))
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens=1, blocking=True):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return True
+                wait = (tokens - self._tokens) / self.rate
+            if not blocking:
+                return False
+            time.sleep(wait)
+
+
+class DestinationLimiter:
+    """One token bucket per destination (host, address or gateway)"""
+
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def acquire(self, destination, tokens=1, blocking=True):
+        if not self.rate:
+            return True
+        with self._lock:
+            bucket = self._buckets.get(destination)
+            if bucket is None:
+                bucket = self._buckets[destination] = TokenBucket(self.rate, self.capacity)
+        return bucket.acquire(tokens, blocking)
+
+
+def _payload(notification):
+    return {key: notification.get(key)
+            for key in ('id', 'title', 'message', 'notification_type', 'priority', 'created_at', 'idempotency_key')}
+
+
+class WebhookSender:
+    """POST notifications as JSON over pooled keep-alive connections"""
+
+    def __init__(self, pool_size=20, timeout=10.0, rate_per_destination=None):
+        import requests
+        from requests.adapters import HTTPAdapter
+        self._errors = (requests.RequestException, OSError)
+        self.timeout = timeout
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.limiter = DestinationLimiter(rate_per_destination)
+
+    def _post(self, url, body, idempotency_key=None):
+        """POST a JSON body, returning False when the request fails or is rejected"""
+        self.limiter.acquire(urlsplit(url).netloc)
+        headers = {'Content-Type': 'application/json'}
+        if idempotency_key:
+            # Lets the receiver drop a repeated delivery
+            headers['Idempotency-Key'] = idempotency_key
+        try:
+            response = self.session.post(url, data=json.dumps(body, default=str), headers=headers, timeout=self.timeout)
+        except self._errors:
+            return False
+        return response.ok
+
+    def send(self, url, notification):
+        return self._post(url, _payload(notification), notification.get('idempotency_key'))
+
+    def send_many(self, url, notifications):
+        return [self.send(url, notification) for notification in notifications]
+
+    def close(self):
+        self.session.close()
+
+
+class PushSender(WebhookSender):
+    """Send push messages to a gateway that accepts JSON arrays, batch_size per request"""
+
+    def __init__(self, gateway_url, batch_size=100, **kwargs):
+        super().__init__(**kwargs)
+        self.gateway_url = gateway_url
+        self.batch_size = batch_size
+
+    def send_many(self, tokens, notifications):
+        """Send each notification to every device token, batching the gateway requests"""
+        messages = [
+            {'to': token, 'title': n.get('title'), 'body': n.get('message'), 'priority': n.get('priority'),
+             'idempotency_key': n.get('idempotency_key')}
+            for n in notifications for token in tokens
+        ]
+        results = []
+        for start in range(0, len(messages), self.batch_size):
+            batch = messages[start:start + self.batch_size]
+            results.extend([self._post(self.gateway_url, batch)] * len(batch))
+        return results
+
+    def send(self, token, notification):
+        return self.send_many([token], [notification])[0]
+
+
+class EmailSender:
+    """Send many messages over one persistent SMTP session"""
+
+    def __init__(self, host, port=587, username=None, password=None, use_tls=True,
+                 from_addr=None, timeout=30.0, rate_per_destination=None):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.use_tls = use_tls
+        self.from_addr = from_addr or username or 'notifications@localhost'
+        self.timeout = timeout
+        self.limiter = DestinationLimiter(rate_per_destination)
+        self._smtp = None
+        self._lock = threading.Lock()
+
+    def _connection(self):
+        if self._smtp is not None:
+            try:
+                if self._smtp.noop()[0] == 250:
+                    return self._smtp
+            except OSError:
+                pass
+            self._smtp = None
+        smtp = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+        if self.use_tls:
+            smtp.starttls()
+        if self.username:
+            smtp.login(self.username, self.password)
+        self._smtp = smtp
+        return smtp
+
+    def _message(self, to_addr, notification):
+        message = EmailMessage()
+        message['From'] = self.from_addr
+        message['To'] = to_addr
+        message['Subject'] = notification.get('title') or 'Notification'
+        if notification.get('idempotency_key'):
+            # A stable Message-ID per delivery lets mail systems drop a repeated send
+            message['Message-ID'] = f"<{notification['idempotency_key']}.{to_addr}@smart-notification-app>"
+        message.set_content(notification.get('message') or '')
+        return message
+
+    def send_many(self, to_addrs, notification):
+        """Send one notification to many recipients on the same SMTP session
+
+        Connection errors (refused, timed out, reset) are OSErrors, like SMTPException,
+        and mark the message as failed instead of propagating.
+        """
+        results = []
+        with self._lock:
+            smtp = None
+            for to_addr in to_addrs:
+                self.limiter.acquire(to_addr.rsplit('@', 1)[-1])
+                message = self._message(to_addr, notification)
+                try:
+                    smtp = smtp or self._connection()
+                    smtp.send_message(message)
+                    results.append(True)
+                except smtplib.SMTPServerDisconnected:
+                    # Reconnect once and retry this message
+                    self._smtp = None
+                    try:
+                        smtp = self._connection()
+                        smtp.send_message(message)
+                        results.append(True)
+                    except OSError:
+                        smtp = self._smtp = None
+                        results.append(False)
+                except OSError:
+                    smtp = self._smtp = None
+                    results.append(False)
+        return results
+
+    def send(self, to_addr, notification):
+        return self.send_many([to_addr], notification)[0]
+
+    def close(self):
+        with self._lock:
+            if self._smtp is not None:
+                try:
+                    self._smtp.quit()
+                except OSError:
+                    pass
+                self._smtp = None
+
+
+class ChannelSenders:
+    """The configured channel senders and their destinations, toggled from the Settings page
+
+    destinations maps 'email' to recipient addresses, 'webhook' to the URL and 'push'
+    to device tokens. A channel without a sender or a destination is not configured.
+    """
+
+    def __init__(self, email=None, webhook=None, push=None, destinations=None):
+        destinations = destinations or {}
+        self.destinations = {name: destinations.get(name) for name in ('email', 'webhook', 'push')}
+        self.senders = {name: sender if self.destinations[name] else None
+                        for name, sender in (('email', email), ('webhook', webhook), ('push', push))}
+        self.enabled = {name: sender is not None for name, sender in self.senders.items()}
+        self._stats = {name: {'sent': 0, 'failed': 0, 'duplicates': 0} for name in self.senders}
+        self._stats_lock = threading.Lock()
+
+    def configure(self, email_enabled, push_enabled, webhook_enabled):
+        for name, enabled in (('email', email_enabled), ('push', push_enabled), ('webhook', webhook_enabled)):
+            self.enabled[name] = enabled and self.senders[name] is not None
+
+    def get(self, channel):
+        return self.senders[channel] if self.enabled.get(channel) else None
+
+    def deliver(self, notification, delivered=()):
+        """Send a notification on every enabled channel, returning {channel: all sends succeeded}
+
+        Channels in delivered already delivered the notification's idempotency key and
+        are skipped.
+        """
+        outcomes = {}
+        for channel in self.senders:
+            sender = self.get(channel)
+            if sender is None:
+                continue
+            if channel in delivered:
+                with self._stats_lock:
+                    self._stats[channel]['duplicates'] += 1
+                continue
+            destination = self.destinations[channel]
+            if channel == 'email':
+                results = sender.send_many(destination, notification)
+            elif channel == 'push':
+                results = sender.send_many(destination, [notification])
+            else:
+                results = [sender.send(destination, notification)]
+            with self._stats_lock:
+                self._stats[channel]['sent'] += sum(1 for ok in results if ok)
+                self._stats[channel]['failed'] += sum(1 for ok in results if not ok)
+            outcomes[channel] = all(results)
+        return outcomes
+
+    def stats(self):
+        with self._stats_lock:
+            return {name: dict(counts) for name, counts in self._stats.items()}
+
+    def status(self):
+        return {name: ('enabled' if self.enabled[name] else 'disabled' if sender else 'not configured')
+                for name, sender in self.senders.items()}
+
+    def close(self):
+        for sender in self.senders.values():
+            if sender is not None:
+                sender.close()
+
+
+def _env_list(name):
+    return [item.strip() for item in os.environ.get(name, '').split(',') if item.strip()]
+
+
+def build_channel_senders():
+    """Create senders for the channels configured in the environment
+
+    Email needs SMTP_HOST and NOTIFY_EMAIL_TO (comma-separated recipients), webhooks
+    WEBHOOK_URL, and push PUSH_GATEWAY_URL and PUSH_DEVICE_TOKENS.
+    """
+    rate = float(os.environ.get('CHANNEL_RATE_PER_DESTINATION', '0')) or None
+    destinations = {
+        'email': _env_list('NOTIFY_EMAIL_TO'),
+        'webhook': os.environ.get('WEBHOOK_URL'),
+        'push': _env_list('PUSH_DEVICE_TOKENS'),
+    }
+    email = webhook = push = None
+    if os.environ.get('SMTP_HOST') and destinations['email']:
+        email = EmailSender(
+            os.environ['SMTP_HOST'],
+            port=int(os.environ.get('SMTP_PORT', '587')),
+            username=os.environ.get('SMTP_USERNAME'),
+            password=os.environ.get('SMTP_PASSWORD'),
+            use_tls=os.environ.get('SMTP_USE_TLS', '1') not in ('0', 'false', 'False'),
+            from_addr=os.environ.get('SMTP_FROM'),
+            rate_per_destination=rate,
+        )
+    if destinations['webhook']:
+        webhook = WebhookSender(rate_per_destination=rate)
+    if os.environ.get('PUSH_GATEWAY_URL') and destinations['push']:
+        push = PushSender(os.environ['PUSH_GATEWAY_URL'], rate_per_destination=rate)
+    return ChannelSenders(email=email, webhook=webhook, push=push, destinations=destinations)
+
+
+def with_channel_delivery(notification_engine, channels, load_notification, delivered=None, record=None):
+    """Make notification_engine.send_notification also deliver on the enabled channels
+
+    load_notification(notification_id) returns the notification row as a dict,
+    including its outbox idempotency_key. An idempotency_key passed by the caller takes
+    precedence; it is not forwarded to the engine. delivered(key) returns the channels
+    that already delivered a key, and record(notification_id, key, outcomes) stores
+    this attempt's {channel: ok}. The send succeeds only if the in-app send and every
+    attempted channel succeed. The engine also gets deliver_channels(), which retries
+    just the channels of a notification that was already sent in-app.
+    """
+    send_notification = notification_engine.send_notification
+
+    def deliver_channels(notification_id, idempotency_key=None):
+        if not any(channels.enabled.values()):
+            return True
+        notification = load_notification(notification_id)
+        if notification is None:
+            return True
+        if idempotency_key:
+            notification['idempotency_key'] = idempotency_key
+        key = notification.get('idempotency_key')
+        outcomes = channels.deliver(notification, delivered(key) if delivered and key else ())
+        if record is not None and key and outcomes:
+            record(notification_id, key, outcomes)
+        return all(outcomes.values())
+
+    @functools.wraps(send_notification)
+    def send_with_channels(notification_id, *args, idempotency_key=None, **kwargs):
+        success = send_notification(notification_id, *args, **kwargs)
+        return bool(success) and deliver_channels(notification_id, idempotency_key)
+
+    notification_engine.send_notification = send_with_channels
+    notification_engine.deliver_channels = deliver_channels
+    return notification_engine
+
+
+def run_benchmark(messages=500):
+    """Compare per-message connections with pooled senders against local stubs"""
+    import socketserver
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    import requests
+
+    class SMTPStubHandler(socketserver.StreamRequestHandler):
+        def handle(self):
+            self.wfile.write(b"220 stub ESMTP\r\n")
+            in_data = False
+            for line in self.rfile:
+                if in_data:
+                    if line == b".\r\n":
+                        in_data = False
+                        self.wfile.write(b"250 OK\r\n")
+                    continue
+                command = line[:4].upper()
+                if command in (b"EHLO", b"HELO"):
+                    self.wfile.write(b"250 stub\r\n")
+                elif command == b"DATA":
+                    in_data = True
+                    self.wfile.write(b"354 End data with <CR><LF>.<CR><LF>\r\n")
+                elif command == b"QUIT":
+                    self.wfile.write(b"221 Bye\r\n")
+                    return
+                else:
+                    self.wfile.write(b"250 OK\r\n")
+
+    class SinkHandler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def do_POST(self):
+            self.rfile.read(int(self.headers.get('Content-Length', 0)))
+            self.send_response(200)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+
+        def log_message(self, *args):
+            pass
+
+    socketserver.ThreadingTCPServer.allow_reuse_address = True
+    smtp_server = socketserver.ThreadingTCPServer(('127.0.0.1', 0), SMTPStubHandler)
+    http_server = ThreadingHTTPServer(('127.0.0.1', 0), SinkHandler)
+    for server in (smtp_server, http_server):
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+    smtp_port = smtp_server.server_address[1]
+    url = f"http://127.0.0.1:{http_server.server_address[1]}/hook"
+    notification = {'id': 1, 'title': 'Exam room change', 'message': 'Moved to B201', 'priority': 3}
+    recipients = [f"student{i}@example.edu" for i in range(messages)]
+
+    def timed(label, fn):
+        started = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - started
+        print(f"{label:<32} {messages / elapsed:>10.0f} msg/s")
+
+    def smtp_per_message():
+        for to_addr in recipients:
+            with smtplib.SMTP('127.0.0.1', smtp_port) as smtp:
+                smtp.send_message(EmailSender('127.0.0.1')._message(to_addr, notification))
+
+    def webhook_per_message():
+        for _ in range(messages):
+            requests.post(url, json=_payload(notification), headers={'Connection': 'close'})
+
+    email = EmailSender('127.0.0.1', smtp_port, use_tls=False)
+    webhook = WebhookSender()
+    push = PushSender(url)
+    timed("email: connection per message", smtp_per_message)
+    timed("email: persistent session", lambda: email.send_many(recipients, notification))
+    timed("webhook: connection per message", webhook_per_message)
+    timed("webhook: pooled keep-alive", lambda: webhook.send_many(url, [notification] * messages))
+    timed("push: batched (100/request)", lambda: push.send_many(recipients, [notification]))
+    for sender in (email, webhook, push):
+        sender.close()
+    smtp_server.shutdown()
+    http_server.shutdown()
+
+
+if __name__ == '__main__':
+    run_benchmark()
@@ -0,0 +1,302 @@
+"""Direct SQLite access for the background services.
+
+The scheduler and other helpers read the same database file as DatabaseManager.
+They connect to it here and manage their own indexes and side tables.
+
+SQLiteDatabase is the process-wide handle for that file:
+
+- The file is switched to WAL journaling, so readers never wait for the writer.
+  WAL is a property of the file, so DatabaseManager's own connections get it too.
+- Connections are pooled and tuned with PRAGMAs. close() returns a connection to
+  the pool.
+- Small writes go through write(). One writer thread coalesces everything queued
+  into a single transaction (group commit). A burst of 200 attendance marks then
+  costs a handful of fsyncs instead of 200 lock hand-offs and "database is locked"
+  errors. Attendance rows, outbox state changes, inbox read markers and session
+  revocations are written this way.
+
+Run this module directly for the concurrency benchmark:
+
+    python db_access.py
+"""
+import os
+import queue
+import sqlite3
+import tempfile
+import threading
+import time
+from concurrent.futures import Future
+
+DEFAULT_DB_PATH = 'smart_notifications.db'
+
+
+def resolve_db_path(db=None):
+    """Database file used by DatabaseManager (DATABASE_PATH overrides it)"""
+    return os.environ.get('DATABASE_PATH') or getattr(db, 'db_path', None) or DEFAULT_DB_PATH
+
+
+def connect(db_path, timeout=30.0):
+    conn = sqlite3.connect(db_path, timeout=timeout, check_same_thread=False)
+    conn.row_factory = sqlite3.Row
+    return conn
+
+
+def sql_timestamp(value):
+    """Format a datetime the way sqlite3 stores datetimes, so text comparisons order correctly"""
+    return value.isoformat(sep=' ')
+
+
+CONNECTION_PRAGMAS = (
+    "PRAGMA synchronous = NORMAL",
+    "PRAGMA busy_timeout = 30000",
+    "PRAGMA cache_size = -16000",
+    "PRAGMA temp_store = MEMORY",
+    "PRAGMA mmap_size = 268435456",
+)
+
+
+def configure(conn):
+    for pragma in CONNECTION_PRAGMAS:
+        conn.execute(pragma)
+    return conn
+
+
+class PooledConnection:
+    """A pooled sqlite3 connection; close() hands it back to the pool"""
+
+    __slots__ = ('_conn', '_database')
+
+    def __init__(self, conn, database):
+        self._conn = conn
+        self._database = database
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+    def __enter__(self):
+        return self._conn.__enter__()
+
+    def __exit__(self, *exc_info):
+        return self._conn.__exit__(*exc_info)
+
+    def close(self):
+        conn, self._conn = self._conn, None
+        if conn is not None:
+            self._database._release(conn)
+
+
+class SQLiteDatabase:
+    """Pooled connections, once-per-process schema setup and a group-commit writer for one database file"""
+
+    def __init__(self, db_path, pool_size=8, max_batch=500, batch_window=0.002):
+        self.db_path = db_path
+        self.pool_size = pool_size
+        self.max_batch = max_batch
+        self.batch_window = batch_window
+        self._ensured = set()
+        self._lock = threading.Lock()
+        self._pool = queue.LifoQueue()
+        self._wal_lock = threading.Lock()
+        self._wal_checked = False
+        self._writes = queue.Queue()
+        self._writer = None
+        self._closed = False
+        self.stats = {'connections': 0, 'overflow': 0, 'writes': 0, 'batches': 0, 'largest_batch': 0}
+
+    def _open(self):
+        conn = configure(connect(self.db_path))
+        if not self._wal_checked:
+            with self._wal_lock:
+                if not self._wal_checked:
+                    if self.db_path != ':memory:':
+                        conn.execute("PRAGMA journal_mode = WAL")
+                    self._wal_checked = True
+        return conn
+
+    def connect(self):
+        """A pooled connection; if every pooled one is in use an extra one is opened and closed after use"""
+        try:
+            conn = self._pool.get_nowait()
+        except queue.Empty:
+            conn = self._open()
+            self.stats['connections'] += 1
+        return PooledConnection(conn, self)
+
+    def _release(self, conn):
+        if conn.in_transaction:
+            conn.rollback()
+        if self._closed or self._pool.qsize() >= self.pool_size:
+            self.stats['overflow'] += 1
+            conn.close()
+        else:
+            self._pool.put(conn)
+
+    def ensure(self, name, setup):
+        """Run setup(conn) the first time name is requested in this process
+
+        A setup that returns False is not done yet (say, a table it needs does not
+        exist); it runs again on the next request.
+        """
+        if name in self._ensured:
+            return
+        with self._lock:
+            if name in self._ensured:
+                return
+            conn = self.connect()
+            try:
+                done = setup(conn) is not False
+            finally:
+                conn.close()
+            if done:
+                self._ensured.add(name)
+
+    def write(self, sql, params=(), rowcount=False):
+        """Queue one write statement, returning a Future of its lastrowid (or rowcount)
+
+        Writes queued together are committed together, so the Future resolves once the
+        row is durable. A failing statement fails only its own Future. Pass
+        rowcount=True for conditional UPDATEs and DELETEs whose caller needs to know
+        whether they matched.
+        """
+        future = Future()
+        self._writes.put((sql, params, rowcount, future))
+        if self._writer is None or not self._writer.is_alive():
+            with self._lock:
+                if self._writer is None or not self._writer.is_alive():
+                    self._writer = threading.Thread(target=self._write_loop, name='sqlite-writer', daemon=True)
+                    self._writer.start()
+        return future
+
+    def _next_batch(self):
+        batch = [self._writes.get()]
+        deadline = time.monotonic() + self.batch_window
+        while len(batch) < self.max_batch:
+            try:
+                batch.append(self._writes.get(timeout=max(deadline - time.monotonic(), 0)))
+            except queue.Empty:
+                break
+        return batch
+
+    def _write_loop(self):
+        conn = self._open()
+        conn.isolation_level = None
+        while True:
+            batch = self._next_batch()
+            if batch[-1] is None:
+                batch.pop()
+                self._commit(conn, batch)
+                conn.close()
+                return
+            self._commit(conn, batch)
+
+    def _commit(self, conn, batch):
+        if not batch:
+            return
+        results = []
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            for sql, params, rowcount, future in batch:
+                # A savepoint per statement keeps one bad row from failing the batch
+                conn.execute("SAVEPOINT write")
+                try:
+                    cursor = conn.execute(sql, params)
+                    results.append((future, cursor.rowcount if rowcount else cursor.lastrowid, None))
+                    conn.execute("RELEASE write")
+                except sqlite3.Error as e:
+                    conn.execute("ROLLBACK TO write")
+                    conn.execute("RELEASE write")
+                    results.append((future, None, e))
+            conn.execute("COMMIT")
+        except sqlite3.Error as e:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            for _, _, _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        self.stats['writes'] += len(batch)
+        self.stats['batches'] += 1
+        self.stats['largest_batch'] = max(self.stats['largest_batch'], len(batch))
+        for future, rowid, error in results:
+            if error is None:
+                future.set_result(rowid)
+            else:
+                future.set_exception(error)
+
+    def close(self):
+        self._closed = True
+        if self._writer is not None and self._writer.is_alive():
+            self._writes.put(None)
+            self._writer.join(timeout=10)
+        while True:
+            try:
+                self._pool.get_nowait().close()
+            except queue.Empty:
+                break
+
+
+ATTENDANCE_BENCHMARK_SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS attendance ("
+    "id INTEGER PRIMARY KEY AUTOINCREMENT, person_name TEXT NOT NULL, "
+    "timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP, confidence REAL)"
+)
+
+
+def run_benchmark(marks=200):
+    """Simulate `marks` simultaneous attendance marks, connection-per-write vs pooled WAL + group commit"""
+    from concurrent.futures import ThreadPoolExecutor
+
+    def simultaneous(mark):
+        barrier = threading.Barrier(marks)
+        errors = []
+
+        def one(i):
+            barrier.wait()
+            try:
+                mark(i)
+            except sqlite3.OperationalError as e:
+                errors.append(str(e))
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=marks) as executor:
+            list(executor.map(one, range(marks)))
+        return time.perf_counter() - started, errors
+
+    with tempfile.TemporaryDirectory() as directory:
+        # What each session's DatabaseManager does today: its own connection, default journal, commit per row
+        path = os.path.join(directory, 'baseline.db')
+        with sqlite3.connect(path) as conn:
+            conn.execute(ATTENDANCE_BENCHMARK_SCHEMA)
+
+        def baseline_mark(i):
+            conn = sqlite3.connect(path, timeout=5.0)
+            try:
+                conn.execute("INSERT INTO attendance (person_name, confidence) VALUES (?, ?)", (f"student{i}", 0.9))
+                conn.commit()
+            finally:
+                conn.close()
+
+        elapsed, errors = simultaneous(baseline_mark)
+        print(f"{'connection per write':<28} {elapsed * 1000:>8.0f} ms  {len(errors)} errors"
+              + (f" ({errors[0]})" if errors else ""))
+
+        database = SQLiteDatabase(os.path.join(directory, 'pooled.db'))
+        database.ensure('attendance', lambda conn: conn.execute(ATTENDANCE_BENCHMARK_SCHEMA))
+
+        def pooled_mark(i):
+            database.write("INSERT INTO attendance (person_name, confidence) VALUES (?, ?)",
+                           (f"student{i}", 0.9)).result()
+
+        elapsed, errors = simultaneous(pooled_mark)
+        conn = database.connect()
+        try:
+            rows = conn.execute("SELECT COUNT(*) FROM attendance").fetchone()[0]
+        finally:
+            conn.close()
+        print(f"{'pooled WAL + group commit':<28} {elapsed * 1000:>8.0f} ms  {len(errors)} errors, "
+              f"{rows} rows in {database.stats['batches']} transactions")
+        database.close()
+
+
+if __name__ == '__main__':
+    run_benchmark()
@@ -0,0 +1,343 @@
+"""Process-wide registry of the heavy engines used by the Streamlit app.
+
+Every browser session used to build its own AttendanceSystem, NotificationEngine,
+AIFeatures and DatabaseManager. The registry builds each engine once per process,
+shares it across sessions and keeps track of how long it took and how much memory
+it added. Sessions only hold EngineHandle objects that point back to the registry.
+"""
+import os
+import resource
+import threading
+import time
+
+import streamlit as st
+
+
+def _current_rss():
+    """Return the resident set size of this process in bytes"""
+    try:
+        with open('/proc/self/statm', 'r') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        # ru_maxrss is a high-water mark (KiB on Linux), good enough as a fallback
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+class _Entry:
+    def __init__(self, name, factory):
+        self.name = name
+        self.factory = factory
+        self.instance = None
+        self.lock = threading.Lock()
+        self.load_seconds = None
+        self.rss_delta = None
+        self.loaded_at = None
+        self.error = None
+
+
+class EngineRegistry:
+    """Thread-safe, lazily populated registry of shared engines"""
+
+    def __init__(self):
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def register(self, name, factory):
+        """Register a zero-argument factory under name (replaces an unloaded one)"""
+        with self._lock:
+            existing = self._entries.get(name)
+            if existing is not None and existing.instance is not None:
+                raise ValueError(f"Engine '{name}' is already loaded")
+            self._entries[name] = _Entry(name, factory)
+
+    def names(self):
+        with self._lock:
+            return list(self._entries)
+
+    def _entry(self, name):
+        with self._lock:
+            entry = self._entries.get(name)
+        if entry is None:
+            raise KeyError(f"Unknown engine '{name}'")
+        return entry
+
+    def get(self, name):
+        """Return the shared engine, building it on first use"""
+        entry = self._entry(name)
+        instance = entry.instance
+        if instance is not None:
+            return instance
+        with entry.lock:
+            if entry.instance is None:
+                rss_before = _current_rss()
+                started = time.perf_counter()
+                try:
+                    entry.instance = entry.factory()
+                except Exception as e:
+                    entry.error = str(e)
+                    raise
+                entry.load_seconds = time.perf_counter() - started
+                entry.rss_delta = max(_current_rss() - rss_before, 0)
+                entry.loaded_at = time.time()
+                entry.error = None
+            return entry.instance
+
+    def is_loaded(self, name):
+        return self._entry(name).instance is not None
+
+    def warm_up(self, names=None):
+        """Build the given engines (all registered ones by default), returning failures"""
+        failures = {}
+        for name in names or self.names():
+            try:
+                self.get(name)
+            except Exception as e:
+                failures[name] = str(e)
+        return failures
+
+    def release(self, name):
+        """Drop the shared instance so the next get() rebuilds it"""
+        entry = self._entry(name)
+        with entry.lock:
+            instance, entry.instance = entry.instance, None
+            entry.load_seconds = entry.rss_delta = entry.loaded_at = None
+        close = getattr(instance, 'close', None)
+        if callable(close):
+            close()
+
+    def shutdown(self):
+        for name in self.names():
+            self.release(name)
+
+    def stats(self):
+        """Per-engine load state, load time and memory added at construction"""
+        stats = {}
+        for name in self.names():
+            entry = self._entry(name)
+            stats[name] = {
+                'loaded': entry.instance is not None,
+                'load_seconds': entry.load_seconds,
+                'rss_delta_mb': None if entry.rss_delta is None else entry.rss_delta / (1024 * 1024),
+                'loaded_at': entry.loaded_at,
+                'error': entry.error,
+            }
+        return stats
+
+    def handle(self, name):
+        self._entry(name)
+        return EngineHandle(self, name)
+
+
+class EngineHandle:
+    """Lightweight per-session reference to a shared engine"""
+
+    __slots__ = ('_registry', '_name')
+
+    def __init__(self, registry, name):
+        self._registry = registry
+        self._name = name
+
+    @property
+    def engine(self):
+        return self._registry.get(self._name)
+
+    def __getattr__(self, attr):
+        return getattr(self._registry.get(self._name), attr)
+
+    def __repr__(self):
+        return f"EngineHandle({self._name!r})"
+
+
+# Read methods served from the query cache (ttl seconds, tags) and the writes that invalidate them
+ATTENDANCE_CACHE_POLICY = (
+    {'get_attendance_summary': (30, ('attendance', 'people'))},
+    {'mark_attendance': ('attendance',), 'register_person': ('people',)},
+)
+NOTIFICATION_CACHE_POLICY = (
+    {'get_notification_analytics': (30, ('notifications',))},
+    {'create_notification': ('notifications',), 'create_attendance_notification': ('notifications',),
+     'send_notification': ('notifications',), 'cleanup_old_notifications': ('notifications',)},
+)
+
+
+def _attendance_system(registry):
+    from attendance_system import AttendanceSystem
+    from query_cache import instrument
+    reads, writes = ATTENDANCE_CACHE_POLICY
+    return instrument(AttendanceSystem(), registry.get('query_cache'), reads, writes)
+
+
+def _notification_engine(registry):
+    from channel_senders import with_channel_delivery
+    from notification_engine import NotificationEngine
+    from notification_outbox import record_channel_results
+    from query_cache import instrument
+    reads, writes = NOTIFICATION_CACHE_POLICY
+    engine = instrument(NotificationEngine(), registry.get('query_cache'), reads, writes)
+    # Every successful send also goes out on the channels enabled in Settings
+    # Channel results and delivered idempotency keys are kept in the outbox tables
+    return with_channel_delivery(
+        engine, registry.get('channels'),
+        lambda notification_id: _load_notification(registry, notification_id),
+        delivered=lambda idempotency_key: _delivered_channels(registry, idempotency_key),
+        record=lambda *results: record_channel_results(registry.get('sqlite'), *results)
+    )
+
+
+def _load_notification(registry, notification_id):
+    from notification_outbox import ensure_outbox
+    sqlite_db = registry.get('sqlite')
+    sqlite_db.ensure('outbox', ensure_outbox)
+    conn = sqlite_db.connect()
+    try:
+        row = conn.execute(
+            "SELECT n.*, o.idempotency_key FROM notifications n "
+            "LEFT JOIN notification_outbox o ON o.notification_id = n.id WHERE n.id = ?", (notification_id,)
+        ).fetchone()
+        return dict(row) if row is not None else None
+    finally:
+        conn.close()
+
+
+def _delivered_channels(registry, idempotency_key):
+    from notification_outbox import delivered_channels, ensure_outbox
+    sqlite_db = registry.get('sqlite')
+    sqlite_db.ensure('outbox', ensure_outbox)
+    conn = sqlite_db.connect()
+    try:
+        return delivered_channels(conn, idempotency_key)
+    finally:
+        conn.close()
+
+
+def _query_cache():
+    from query_cache import QueryCache
+    return QueryCache()
+
+
+def _session_cache(registry):
+    from session_cache import SessionCache
+    # The database is opened on first use, not when the login page is drawn
+    return SessionCache(lambda: registry.get('sqlite').connect(),
+                        write=lambda sql, params: registry.get('sqlite').write(sql, params))
+
+
+def _ai_features():
+    from ai_features import AIFeatures
+    from sentiment_batcher import SentimentService
+    ai_features = AIFeatures()
+    # Route every analyze_sentiment call, including those made inside AIFeatures,
+    # through the shared micro-batcher and result cache
+    ai_features.sentiment_service = SentimentService(ai_features)
+    ai_features.analyze_sentiment = ai_features.sentiment_service.analyze
+    return ai_features
+
+
+def _database():
+    from database import DatabaseManager
+    return DatabaseManager()
+
+
+def _face_store():
+    from face_store import FaceEncodingStore
+    return FaceEncodingStore()
+
+
+def _face_index(registry):
+    store = registry.get('face_store')
+    store.refresh()
+    if not len(store):
+        # One-off migration: seed an empty store from the faces AttendanceSystem already
+        # knows. Registration appends to the store, so later builds read only the memmap.
+        attendance_system = registry.get('attendance_system')
+        store.sync_from(attendance_system.known_face_names,
+                        getattr(attendance_system, 'known_face_encodings', []))
+    return store.to_index()
+
+
+def _face_workers():
+    from face_pipeline import FaceWorkerPool
+    return FaceWorkerPool()
+
+
+def get_face_index(registry):
+    """Return the shared face index, rebuilding it if another process extended the store"""
+    if registry.is_loaded('face_index') and registry.get('face_store').refresh():
+        registry.release('face_index')
+    return registry.get('face_index')
+
+
+def _roster_cache():
+    from face_index import RosterIndexCache
+    return RosterIndexCache()
+
+
+def get_roster_index(registry, class_id, roster):
+    """Return the face index scoped to one class roster, cached per class"""
+    return registry.get('roster_cache').get(class_id, roster, get_face_index(registry))
+
+
+def invalidate_rosters(registry, class_id=None):
+    """Drop cached roster indexes after an enrollment or registration change"""
+    if registry.is_loaded('roster_cache'):
+        registry.get('roster_cache').invalidate(class_id)
+
+
+def _dispatcher(registry):
+    from notification_dispatcher import NotificationDispatcher
+    from scheduled_notifications import SCHEDULE_INDEX_SQL
+    sqlite_db = registry.get('sqlite')
+    # The pending query pages over the (status, scheduled_for) index
+    sqlite_db.ensure('schedule_index', lambda conn: (conn.execute(SCHEDULE_INDEX_SQL), conn.commit()))
+    return NotificationDispatcher(registry.get('notification_engine'), sqlite_db.connect).start()
+
+
+def _sqlite(registry):
+    from db_access import SQLiteDatabase, resolve_db_path
+    return SQLiteDatabase(resolve_db_path(registry.get('db')))
+
+
+def _scheduled_timer(registry):
+    from scheduled_notifications import ScheduledNotificationTimer
+    return ScheduledNotificationTimer(
+        registry.get('sqlite').connect,
+        on_due=lambda notifications: registry.get('dispatcher').submit(notifications)
+    ).start()
+
+
+def _channels():
+    from channel_senders import build_channel_senders
+    return build_channel_senders()
+
+
+def _outbox(registry):
+    from notification_outbox import OutboxRetryWorker
+    dispatcher = registry.get('dispatcher')
+    return OutboxRetryWorker(
+        registry.get('sqlite'),
+        registry.get('notification_engine'),
+        claims=dispatcher,
+        is_leader=dispatcher.lead
+    ).start()
+
+
+@st.cache_resource
+def get_engine_registry():
+    """Return the process-wide registry (created once per Streamlit server process)"""
+    registry = EngineRegistry()
+    registry.register('query_cache', _query_cache)
+    registry.register('attendance_system', lambda: _attendance_system(registry))
+    registry.register('notification_engine', lambda: _notification_engine(registry))
+    registry.register('ai_features', _ai_features)
+    registry.register('db', _database)
+    registry.register('face_store', _face_store)
+    registry.register('face_index', lambda: _face_index(registry))
+    registry.register('face_workers', _face_workers)
+    registry.register('roster_cache', _roster_cache)
+    registry.register('sqlite', lambda: _sqlite(registry))
+    registry.register('dispatcher', lambda: _dispatcher(registry))
+    registry.register('scheduled_timer', lambda: _scheduled_timer(registry))
+    registry.register('channels', _channels)
+    registry.register('outbox', lambda: _outbox(registry))
+    registry.register('session_cache', lambda: _session_cache(registry))
+    return registry
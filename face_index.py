@@ -0,0 +1,177 @@
+"""Vectorized nearest-neighbour index over known face encodings.
+
+Encodings live in one contiguous float32 matrix. A batch of query faces (for example
+all 40 faces of a group photo) is matched against every known face with a single
+matrix product instead of one face_distance scan per face. Rows are appended in
+place, so register_person stays incremental.
+"""
+import threading
+
+import numpy as np
+
+ENCODING_DIM = 128
+DEFAULT_TOLERANCE = 0.6
+
+
+class FaceEncodingIndex:
+    """Append-only index of (name, encoding) pairs"""
+
+    def __init__(self, dim=ENCODING_DIM):
+        self.dim = dim
+        self.names = []
+        self._matrix = np.empty((0, dim), dtype=np.float32)
+        self._sq_norms = np.empty(0, dtype=np.float32)
+        self._size = 0
+        self._lock = threading.RLock()
+
+    @classmethod
+    def from_arrays(cls, names, encodings, **kwargs):
+        """Build an index around an existing (n, dim) float32 array without copying it"""
+        index = cls(**kwargs)
+        matrix = np.asarray(encodings, dtype=np.float32)
+        if matrix.size == 0:
+            return index
+        if matrix.ndim != 2 or matrix.shape[1] != index.dim:
+            raise ValueError(f"Expected encodings of shape (n, {index.dim}), got {matrix.shape}")
+        if len(names) != len(matrix):
+            raise ValueError("names and encodings differ in length")
+        index.names = list(names)
+        index._matrix = matrix
+        index._sq_norms = np.einsum('ij,ij->i', matrix, matrix)
+        index._size = len(matrix)
+        return index
+
+    @classmethod
+    def from_attendance_system(cls, attendance_system, **kwargs):
+        index = cls(**kwargs)
+        index.sync(attendance_system.known_face_names,
+                   getattr(attendance_system, 'known_face_encodings', []))
+        return index
+
+    def __len__(self):
+        return self._size
+
+    @property
+    def encodings(self):
+        return self._matrix[:self._size]
+
+    def _reserve(self, extra):
+        needed = self._size + extra
+        capacity = len(self._matrix)
+        if needed <= capacity and self._matrix.flags.writeable:
+            return
+        new_capacity = max(needed, capacity * 2, 64)
+        matrix = np.empty((new_capacity, self.dim), dtype=np.float32)
+        matrix[:self._size] = self._matrix[:self._size]
+        sq_norms = np.empty(new_capacity, dtype=np.float32)
+        sq_norms[:self._size] = self._sq_norms[:self._size]
+        self._matrix, self._sq_norms = matrix, sq_norms
+
+    def add_many(self, names, encodings):
+        encodings = np.asarray(encodings, dtype=np.float32).reshape(-1, self.dim)
+        if len(names) != len(encodings):
+            raise ValueError("names and encodings differ in length")
+        if not len(encodings):
+            return
+        with self._lock:
+            self._reserve(len(encodings))
+            start, end = self._size, self._size + len(encodings)
+            self._matrix[start:end] = encodings
+            self._sq_norms[start:end] = np.einsum('ij,ij->i', encodings, encodings)
+            self.names.extend(names)
+            self._size = end
+
+    def add(self, name, encoding):
+        self.add_many([name], [encoding])
+
+    def sync(self, names, encodings):
+        """Append the entries of parallel name/encoding lists whose names are not indexed yet"""
+        with self._lock:
+            known = set(self.names[:self._size])
+            missing = [i for i, name in enumerate(names[:len(encodings)]) if name not in known]
+            if missing:
+                self.add_many([names[i] for i in missing], [encodings[i] for i in missing])
+
+    def _exact_nearest(self, queries, q_sq_norms, start, end):
+        keys = self._matrix[start:end]
+        # |q - k|^2 = |q|^2 + |k|^2 - 2 q.k, computed for the whole batch at once
+        sq_dists = q_sq_norms[:, None] + self._sq_norms[start:end][None, :] - 2.0 * (queries @ keys.T)
+        rows = np.arange(len(queries))
+        best = np.argmin(sq_dists, axis=1)
+        best_dists = np.sqrt(np.maximum(sq_dists[rows, best], 0.0))
+        return best + start, best_dists
+
+    def nearest(self, encodings):
+        """Return (indices, distances) of the nearest known face for each query"""
+        queries = np.ascontiguousarray(np.asarray(encodings, dtype=np.float32).reshape(-1, self.dim))
+        with self._lock:
+            if not self._size or not len(queries):
+                return np.full(len(queries), -1), np.full(len(queries), np.inf, dtype=np.float32)
+            q_sq_norms = np.einsum('ij,ij->i', queries, queries)
+            return self._exact_nearest(queries, q_sq_norms, 0, self._size)
+
+    def match(self, encodings, tolerance=DEFAULT_TOLERANCE):
+        """Match a batch of encodings, returning [{'name', 'distance', 'confidence'}]
+
+        name is None when the nearest known face is further than tolerance.
+        """
+        best, best_dists = self.nearest(encodings)
+        matches = []
+        for i, dist in zip(best, best_dists):
+            known = i >= 0 and dist <= tolerance
+            matches.append({
+                'name': self.names[i] if known else None,
+                'distance': float(dist),
+                'confidence': float(max(0.0, 1.0 - dist)) if known else 0.0,
+            })
+        return matches
+
+    def subset(self, names):
+        """Return a new index restricted to the given names"""
+        wanted = set(names)
+        with self._lock:
+            rows = [i for i, name in enumerate(self.names[:self._size]) if name in wanted]
+            return FaceEncodingIndex.from_arrays(
+                [self.names[i] for i in rows], self._matrix[rows], dim=self.dim
+            )
+
+
+class RosterIndexCache:
+    """Per-class face indexes restricted to the class roster
+
+    A class of 30 is matched against its 30 students instead of every registered
+    person. Subsets are cached per class and rebuilt when the roster changes or
+    when the underlying index grows (a new registration may belong to the roster).
+    """
+
+    def __init__(self, max_classes=256):
+        self.max_classes = max_classes
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _normalize(name):
+        return ' '.join(str(name).lower().split())
+
+    def get(self, class_id, roster, index):
+        """Return the cached subset of index for class_id's roster"""
+        roster_key = frozenset(self._normalize(name) for name in roster)
+        with self._lock:
+            entry = self._entries.get(class_id)
+            if entry is not None and entry[0] == roster_key and entry[1] is index and entry[2] == len(index):
+                return entry[3]
+        members = [name for name in set(index.names) if self._normalize(name) in roster_key]
+        subset = index.subset(members)
+        with self._lock:
+            if class_id not in self._entries and len(self._entries) >= self.max_classes:
+                self._entries.pop(next(iter(self._entries)))
+            self._entries[class_id] = (roster_key, index, len(index), subset)
+        return subset
+
+    def invalidate(self, class_id=None):
+        """Drop one class (after an enrollment change) or every class"""
+        with self._lock:
+            if class_id is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(class_id, None)
@@ -0,0 +1,195 @@
+"""Face detection/encoding off the Streamlit script thread.
+
+FaceWorkerPool runs detection and encoding in a pool of worker processes, one per
+core by default. Uploaded image bytes travel to the worker through
+multiprocessing.shared_memory instead of being pickled. Callers receive a Future.
+The number of images in flight is bounded: once the pool is full, submit() waits up
+to `timeout` seconds and then raises PoolBusy. A burst of uploads from several
+classrooms therefore cannot queue without limit.
+"""
+import io
+import os
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
+from multiprocessing import get_context, shared_memory
+
+import numpy as np
+
+from face_index import DEFAULT_TOLERANCE
+
+
+class PoolBusy(Exception):
+    pass
+
+
+class DetectionConfig:
+    """Accuracy/latency knobs for the detection cascade
+
+    Faces are detected on a copy of the image whose longest side is at most
+    detect_max_side pixels (None disables downscaling), then encoded at full
+    resolution only inside the boxes that were found.
+    """
+
+    def __init__(self, model='hog', detect_max_side=800, upsample=1):
+        self.model = model
+        self.detect_max_side = detect_max_side
+        self.upsample = upsample
+
+    def __repr__(self):
+        return f"DetectionConfig(model={self.model!r}, detect_max_side={self.detect_max_side}, upsample={self.upsample})"
+
+
+def load_rgb_image(image_bytes):
+    """Decode image bytes into an RGB uint8 array"""
+    from PIL import Image
+    with Image.open(io.BytesIO(image_bytes)) as image:
+        return np.asarray(image.convert('RGB'))
+
+
+def _downscale(rgb_image, max_side):
+    height, width = rgb_image.shape[:2]
+    scale = 1.0 if not max_side else min(1.0, max_side / float(max(height, width)))
+    if scale >= 1.0:
+        return rgb_image, 1.0
+    import cv2
+    size = (max(1, int(round(width * scale))), max(1, int(round(height * scale))))
+    return cv2.resize(rgb_image, size, interpolation=cv2.INTER_AREA), scale
+
+
+def detect_faces(rgb_image, config=None, timings=None):
+    """Find face boxes (top, right, bottom, left) in full-resolution coordinates"""
+    import face_recognition
+    config = config or DetectionConfig()
+    timings = {} if timings is None else timings
+    started = time.perf_counter()
+    small, scale = _downscale(rgb_image, config.detect_max_side)
+    timings['downscale_ms'] = (time.perf_counter() - started) * 1000
+
+    started = time.perf_counter()
+    boxes = face_recognition.face_locations(small, number_of_times_to_upsample=config.upsample, model=config.model)
+    timings['detect_ms'] = (time.perf_counter() - started) * 1000
+
+    height, width = rgb_image.shape[:2]
+    return [
+        (max(0, int(top / scale)), min(width, int(right / scale)),
+         min(height, int(bottom / scale)), max(0, int(left / scale)))
+        for top, right, bottom, left in boxes
+    ]
+
+
+def detect_and_encode(rgb_image, config=None):
+    """Return (locations, encodings, timings) for every face in an RGB image"""
+    import face_recognition
+    timings = {}
+    locations = detect_faces(rgb_image, config, timings)
+    started = time.perf_counter()
+    if locations:
+        encodings = np.asarray(face_recognition.face_encodings(rgb_image, known_face_locations=locations),
+                               dtype=np.float32)
+    else:
+        encodings = np.empty((0, 128), dtype=np.float32)
+    timings['encode_ms'] = (time.perf_counter() - started) * 1000
+    return locations, encodings, timings
+
+
+def match_faces(locations, encodings, timings, index, tolerance=DEFAULT_TOLERANCE):
+    """Match detected faces against index, returning a mark_attendance-style result"""
+    started = time.perf_counter()
+    matches = index.match(encodings, tolerance) if len(encodings) else []
+    timings['match_ms'] = (time.perf_counter() - started) * 1000
+    recognized, unknown = [], []
+    for location, match in zip(locations, matches):
+        if match['name'] is None:
+            unknown.append({'location': location})
+        else:
+            recognized.append({'name': match['name'], 'confidence': match['confidence'], 'location': location})
+    return {
+        'success': bool(recognized),
+        'recognized_faces': recognized,
+        'unknown_faces': unknown,
+        'timings': timings,
+    }
+
+
+def recognize_frame(rgb_image, index, config=None, tolerance=DEFAULT_TOLERANCE):
+    """Detect, encode and match an RGB frame in this thread, with no image encode/decode"""
+    return match_faces(*detect_and_encode(rgb_image, config), index, tolerance)
+
+
+def _process_shared_image(shm_name, size, config):
+    started = time.perf_counter()
+    shm = shared_memory.SharedMemory(name=shm_name)
+    try:
+        rgb_image = load_rgb_image(bytes(shm.buf[:size]))
+    finally:
+        shm.close()
+    decode_ms = (time.perf_counter() - started) * 1000
+    locations, encodings, timings = detect_and_encode(rgb_image, config)
+    timings['decode_ms'] = decode_ms
+    return locations, encodings, timings
+
+
+class FaceWorkerPool:
+    """Bounded process pool for face detection and encoding"""
+
+    def __init__(self, max_workers=None, max_pending=None):
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.max_pending = max_pending or self.max_workers * 2
+        self._executor = ProcessPoolExecutor(max_workers=self.max_workers, mp_context=get_context('spawn'))
+        self._slots = threading.BoundedSemaphore(self.max_pending)
+        self._stats_lock = threading.Lock()
+        self._stats = {'submitted': 0, 'completed': 0, 'failed': 0, 'rejected': 0, 'in_flight': 0}
+
+    def _count(self, **deltas):
+        with self._stats_lock:
+            for key, delta in deltas.items():
+                self._stats[key] += delta
+
+    def stats(self):
+        with self._stats_lock:
+            return dict(self._stats, max_workers=self.max_workers, max_pending=self.max_pending)
+
+    def submit(self, image_bytes, config=None, timeout=0):
+        """Queue an image, returning a Future of (locations, encodings, timings)"""
+        acquired = self._slots.acquire(timeout=timeout) if timeout else self._slots.acquire(blocking=False)
+        if not acquired:
+            self._count(rejected=1)
+            raise PoolBusy(f"{self.max_pending} images are already being processed")
+        try:
+            shm = shared_memory.SharedMemory(create=True, size=max(len(image_bytes), 1))
+        except Exception:
+            self._slots.release()
+            raise
+        shm.buf[:len(image_bytes)] = image_bytes
+        self._count(submitted=1, in_flight=1)
+
+        def release(failed):
+            shm.close()
+            shm.unlink()
+            self._slots.release()
+            self._count(in_flight=-1, completed=0 if failed else 1, failed=1 if failed else 0)
+
+        try:
+            future = self._executor.submit(_process_shared_image, shm.name, len(image_bytes), config)
+        except Exception:
+            release(failed=True)
+            raise
+        future.add_done_callback(lambda f: release(f.cancelled() or f.exception() is not None))
+        return future
+
+    def recognize(self, image_bytes, index, config=None, tolerance=DEFAULT_TOLERANCE, timeout=0):
+        """Detect, encode and match an image, returning a Future of a mark_attendance-style result"""
+        result = Future()
+
+        def on_encoded(future):
+            try:
+                result.set_result(match_faces(*future.result(), index, tolerance))
+            except Exception as e:
+                result.set_result({'success': False, 'recognized_faces': [], 'unknown_faces': [], 'error': str(e)})
+
+        self.submit(image_bytes, config, timeout).add_done_callback(on_encoded)
+        return result
+
+    def close(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
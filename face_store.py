@@ -0,0 +1,170 @@
+"""Persistent, memory-mapped store of known face encodings.
+
+Layout of the store directory:
+
+    encodings.f32   raw little-endian float32 rows, one 128-d encoding per person
+    index.json      {"format_version", "dim", "count", "generation", "names"}
+
+Readers map only the first `count` rows with np.memmap, so opening the store does
+not depend on how many people are registered and every process shares the same
+page cache. Writers append rows and then atomically replace index.json with a bumped
+generation. Other processes notice the new generation and reload.
+"""
+import fcntl
+import json
+import os
+import threading
+from contextlib import contextmanager
+
+import numpy as np
+
+from face_index import ENCODING_DIM, FaceEncodingIndex
+
+FORMAT_VERSION = 1
+DEFAULT_STORE_DIR = os.environ.get('FACE_STORE_DIR', 'face_store')
+
+
+class FaceStoreError(Exception):
+    pass
+
+
+class FaceEncodingStore:
+    """Append-only on-disk store of (name, encoding) pairs"""
+
+    def __init__(self, directory=DEFAULT_STORE_DIR, dim=ENCODING_DIM):
+        self.directory = directory
+        self.dim = dim
+        self.data_path = os.path.join(directory, 'encodings.f32')
+        self.index_path = os.path.join(directory, 'index.json')
+        self.lock_path = os.path.join(directory, '.lock')
+        self.names = []
+        self.generation = 0
+        self._encodings = np.empty((0, dim), dtype=np.float32)
+        self._index_mtime = None
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        self.reload()
+
+    @property
+    def row_bytes(self):
+        return self.dim * 4
+
+    def __len__(self):
+        return len(self.names)
+
+    @property
+    def encodings(self):
+        """Read-only (count, dim) float32 view backed by the memory-mapped file"""
+        return self._encodings
+
+    @contextmanager
+    def _file_lock(self):
+        with open(self.lock_path, 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _read_index(self):
+        if not os.path.exists(self.index_path):
+            return {'format_version': FORMAT_VERSION, 'dim': self.dim, 'count': 0, 'generation': 0, 'names': []}
+        with open(self.index_path, 'r') as f:
+            meta = json.load(f)
+        if meta.get('format_version') != FORMAT_VERSION:
+            raise FaceStoreError(f"Unsupported face store version {meta.get('format_version')}")
+        if meta.get('dim') != self.dim:
+            raise FaceStoreError(f"Face store holds {meta.get('dim')}-d encodings, expected {self.dim}")
+        return meta
+
+    def _write_index(self, meta):
+        tmp_path = self.index_path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(meta, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.index_path)
+
+    def _index_stat(self):
+        try:
+            return os.stat(self.index_path).st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    def reload(self):
+        """Re-read the name index and remap the encodings file"""
+        with self._lock:
+            mtime = self._index_stat()
+            meta = self._read_index()
+            count = meta['count']
+            if count:
+                if os.path.getsize(self.data_path) < count * self.row_bytes:
+                    raise FaceStoreError("Encodings file is shorter than the index claims")
+                encodings = np.memmap(self.data_path, dtype='<f4', mode='r', shape=(count, self.dim))
+            else:
+                encodings = np.empty((0, self.dim), dtype=np.float32)
+            self.names = meta['names'][:count]
+            self.generation = meta['generation']
+            self._encodings = encodings
+            self._index_mtime = mtime
+
+    def is_stale(self):
+        """True when another writer has published a newer generation"""
+        mtime = self._index_stat()
+        if mtime == self._index_mtime:
+            return False
+        try:
+            return self._read_index()['generation'] != self.generation
+        except (OSError, ValueError):
+            return True
+
+    def refresh(self):
+        """Reload if stale, returning True when the contents changed"""
+        if self.is_stale():
+            self.reload()
+            return True
+        return False
+
+    def append_many(self, names, encodings):
+        """Append encodings as one transaction: all rows become visible or none"""
+        encodings = np.ascontiguousarray(np.asarray(encodings, dtype='<f4').reshape(-1, self.dim))
+        if len(names) != len(encodings):
+            raise ValueError("names and encodings differ in length")
+        if not len(names):
+            return self.generation
+        with self._file_lock():
+            meta = self._read_index()
+            committed = meta['count'] * self.row_bytes
+            with open(self.data_path, 'ab') as f:
+                # Drop rows from a writer that died before publishing its index
+                f.truncate(committed)
+                f.write(encodings.tobytes())
+                f.flush()
+                os.fsync(f.fileno())
+            meta['names'] = meta['names'][:meta['count']] + list(names)
+            meta['count'] += len(names)
+            meta['generation'] += 1
+            self._write_index(meta)
+        self.reload()
+        return self.generation
+
+    def append(self, name, encoding):
+        return self.append_many([name], [encoding])
+
+    def sync_from(self, names, encodings):
+        """Append the entries of parallel name/encoding lists whose names the store lacks
+
+        Rows are matched by name, not position: the store is shared between processes
+        and also holds bulk imports, so its rows never line up with one process's lists.
+        """
+        self.refresh()
+        known = set(self.names)
+        missing = [i for i, name in enumerate(names[:len(encodings)]) if name not in known]
+        if missing:
+            return self.append_many([names[i] for i in missing], [encodings[i] for i in missing])
+        return self.generation
+
+    def to_index(self, **kwargs):
+        """Build a FaceEncodingIndex over the mapped encodings without copying them"""
+        with self._lock:
+            return FaceEncodingIndex.from_arrays(self.names, self._encodings, dim=self.dim, **kwargs)
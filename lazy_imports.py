@@ -0,0 +1,86 @@
+"""Deferred imports for heavy modules used by only some pages.
+
+cv2, pandas and plotly are wrapped in LazyModule proxies. Each one is imported the
+first time a page uses it, so the login screen renders without them. Every real
+import is timed, and the timings are available through import_metrics().
+"""
+import importlib
+import threading
+import time
+
+_metrics = {}
+_metrics_lock = threading.Lock()
+_prewarm_started = False
+_prewarm_lock = threading.Lock()
+
+
+def _import(module_name, trigger):
+    started = time.perf_counter()
+    module = importlib.import_module(module_name)
+    elapsed = time.perf_counter() - started
+    with _metrics_lock:
+        # A module already imported elsewhere costs ~0s; keep the first real measurement
+        if module_name not in _metrics:
+            _metrics[module_name] = {'seconds': elapsed, 'trigger': trigger, 'imported_at': time.time()}
+    return module
+
+
+class LazyModule:
+    """Module proxy that performs the import on first attribute access"""
+
+    def __init__(self, module_name):
+        self._module_name = module_name
+        self._module = None
+        self._lock = threading.Lock()
+
+    def _load(self, trigger='on demand'):
+        module = self._module
+        if module is None:
+            with self._lock:
+                if self._module is None:
+                    self._module = _import(self._module_name, trigger)
+                module = self._module
+        return module
+
+    @property
+    def is_loaded(self):
+        return self._module is not None
+
+    def __getattr__(self, attr):
+        return getattr(self._load(), attr)
+
+    def __repr__(self):
+        state = 'loaded' if self._module is not None else 'not loaded'
+        return f"<LazyModule {self._module_name!r} ({state})>"
+
+
+def lazy_import(module_name):
+    return LazyModule(module_name)
+
+
+def import_metrics():
+    """Return {module_name: {'seconds', 'trigger', 'imported_at'}} for deferred imports"""
+    with _metrics_lock:
+        return {name: dict(info) for name, info in _metrics.items()}
+
+
+def prewarm(modules, registry=None, engine_names=None):
+    """Import modules and build engines on a background thread, once per process"""
+    global _prewarm_started
+    with _prewarm_lock:
+        if _prewarm_started:
+            return False
+        _prewarm_started = True
+
+    def run():
+        for module in modules:
+            try:
+                module._load(trigger='prewarm')
+            except Exception:
+                # The page that needs the module will surface the import error
+                pass
+        if registry is not None:
+            registry.warm_up(engine_names)
+
+    threading.Thread(target=run, name='prewarm', daemon=True).start()
+    return True
@@ -0,0 +1,377 @@
+"""Always-on background delivery of pending notifications.
+
+NotificationDispatcher drains the pending queue on a background thread instead of
+waiting for someone to click "Process All Pending". Unscheduled pending rows are
+read straight from SQL in id-ordered pages over the (status, scheduled_for) index.
+A pass pages through the whole queue, so nothing is starved behind the newest rows.
+Rows with scheduled_for belong to ScheduledNotificationTimer, which submits them
+when they come due, so a poll never scans future reminders.
+
+Claimed notifications go into one shared heap ordered earliest-deadline-first by
+PriorityScheduler. Worker threads always pull the most urgent queued notification,
+so a Priority 4 item that arrives behind a bulk send runs next instead of waiting
+for everything queued before it. Bulk sends have a separate concurrency limit per
+channel. Reserved express workers only take Critical notifications and queued ones
+whose deadline has passed, so a bulk send never keeps those waiting.
+
+Only one app process dispatches at a time, because the leader holds an exclusive
+lock on a lock file. Every send, including the history page's Send button and
+outbox retries, first claims its row in the database with a conditional UPDATE
+that sets claimed_by and lease_until. Only one claimer can win a row, whatever
+process it runs in. Dispatch claims also require status 'pending', so a row sent
+and released by another process is not sent again. Outbox retries claim in any
+status, because they may re-deliver channels of a sent notification. A lease left
+by a crashed sender expires after lease_seconds. The status column stays with
+NotificationEngine, which moves it from 'pending' to 'sent' or 'failed'.
+"""
+import fcntl
+import heapq
+import itertools
+import os
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from datetime import datetime, timedelta
+
+from db_access import sql_timestamp
+from priority_scheduler import PriorityScheduler
+
+DEFAULT_LOCK_PATH = os.path.join('notifications', 'dispatcher.lock')
+
+# Equality on both columns of idx_notifications_status_scheduled, then a range on its implicit rowid
+DUE_PENDING_SQL = (
+    "SELECT * FROM notifications "
+    "WHERE status = 'pending' AND scheduled_for IS NULL AND id > ? "
+    "ORDER BY id LIMIT ?"
+)
+
+CLAIM_SQL = (
+    "UPDATE notifications SET claimed_by = ?, lease_until = ? "
+    "WHERE id = ? AND (lease_until IS NULL OR lease_until <= ?)"
+)
+
+
+def ensure_claim_columns(conn):
+    """Add the claim columns to the notifications table if it lacks them"""
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(notifications)")}
+    for column, kind in (('claimed_by', 'TEXT'), ('lease_until', 'TIMESTAMP')):
+        if columns and column not in columns:
+            conn.execute(f"ALTER TABLE notifications ADD COLUMN {column} {kind}")
+    conn.commit()
+
+
+class NotificationDispatcher:
+    """Background worker that drains pending notifications concurrently"""
+
+    def __init__(self, notification_engine, connect, poll_interval=5.0, batch_size=200, max_workers=8,
+                 channel_limits=None, lock_path=DEFAULT_LOCK_PATH, scheduler=None, express_workers=2,
+                 lease_seconds=300.0):
+        self.notification_engine = notification_engine
+        self._connect = connect
+        self.lease_seconds = lease_seconds
+        self.worker_id = f"{os.getpid()}-{random.getrandbits(32):08x}"
+        self._claim_columns_ready = False
+        self.poll_interval = poll_interval
+        self.batch_size = batch_size
+        self.max_workers = max_workers
+        self.channel_limits = dict(channel_limits or {'default': 4})
+        self.lock_path = lock_path
+        self.scheduler = scheduler or PriorityScheduler()
+        self.express_workers = express_workers
+        # Heaps of (deadline, -priority, seq, notification, future); express holds Critical/overdue items
+        self._queue = []
+        self._express_queue = []
+        self._queue_cond = threading.Condition()
+        self._seq = itertools.count()
+        self._workers = []
+        self._closing = False
+        self._latencies = {}
+        self._channel_slots = {}
+        self._claimed = set()
+        self._claimed_lock = threading.Lock()
+        self._pass_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self._lock_file = None
+        self._sent_times = deque()
+        self._metrics_lock = threading.Lock()
+        self._metrics = {'sent': 0, 'failed': 0, 'queue_depth': 0, 'in_flight': 0,
+                         'last_pass_at': None, 'last_pass_seconds': None, 'is_leader': False}
+
+    # Leadership -----------------------------------------------------------
+
+    def _try_lead(self):
+        if self._lock_file is not None:
+            return True
+        os.makedirs(os.path.dirname(self.lock_path) or '.', exist_ok=True)
+        lock_file = open(self.lock_path, 'a')
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return False
+        self._lock_file = lock_file
+        return True
+
+    def lead(self):
+        """True when this process is the one dispatching notifications"""
+        return self._try_lead()
+
+    def _resign(self):
+        if self._lock_file is not None:
+            fcntl.flock(self._lock_file, fcntl.LOCK_UN)
+            self._lock_file.close()
+            self._lock_file = None
+
+    # Claiming and sending -------------------------------------------------
+
+    def channel_of(self, notification):
+        return notification.get('channel') or 'default'
+
+    def _slots_for(self, channel):
+        slots = self._channel_slots.get(channel)
+        if slots is None:
+            limit = self.channel_limits.get(channel, self.channel_limits.get('default', 4))
+            slots = self._channel_slots.setdefault(channel, threading.BoundedSemaphore(limit))
+        return slots
+
+    def _claim_rows(self, notification_ids, pending_only):
+        """Lease rows in the database, returning the ids this dispatcher won"""
+        if not notification_ids:
+            return set()
+        now = datetime.now()
+        lease_until = sql_timestamp(now + timedelta(seconds=self.lease_seconds))
+        conn = self._connect()
+        try:
+            if not self._claim_columns_ready:
+                ensure_claim_columns(conn)
+                self._claim_columns_ready = True
+            sql = CLAIM_SQL + (" AND status = 'pending'" if pending_only else "")
+            won = {
+                notification_id for notification_id in notification_ids
+                if conn.execute(sql, (self.worker_id, lease_until, notification_id, sql_timestamp(now))).rowcount
+            }
+            conn.commit()
+        finally:
+            conn.close()
+        return won
+
+    def _claim_many(self, notification_ids, pending_only=True):
+        with self._claimed_lock:
+            # Rows already in flight here need no database round trip
+            candidates = [i for i in notification_ids if i not in self._claimed]
+            self._claimed.update(candidates)
+        try:
+            won = self._claim_rows(candidates, pending_only)
+        except Exception:
+            won = set()
+        with self._claimed_lock:
+            self._claimed.difference_update(set(candidates) - won)
+        return won
+
+    def claim(self, notification_id):
+        """Lease a notification in any status, for outbox retries; False if someone else holds it"""
+        return notification_id in self._claim_many([notification_id], pending_only=False)
+
+    def release(self, notification_id):
+        with self._claimed_lock:
+            self._claimed.discard(notification_id)
+        conn = self._connect()
+        try:
+            conn.execute("UPDATE notifications SET claimed_by = NULL, lease_until = NULL "
+                         "WHERE id = ? AND claimed_by = ?", (notification_id, self.worker_id))
+            conn.commit()
+        finally:
+            conn.close()
+
+    def _send(self, notification, express=False):
+        notification_id = notification['id']
+        try:
+            if express:
+                # Express workers are already capped at express_workers
+                success = self.notification_engine.send_notification(notification_id)
+            else:
+                with self._slots_for(self.channel_of(notification)):
+                    success = self.notification_engine.send_notification(notification_id)
+        except Exception:
+            success = False
+        due = self.scheduler.due_time(notification)
+        try:
+            self.release(notification_id)
+        except Exception:
+            # The lease simply runs out
+            pass
+        with self._metrics_lock:
+            self._metrics['in_flight'] -= 1
+            if success:
+                self._metrics['sent'] += 1
+                self._sent_times.append(time.time())
+                if due is not None:
+                    latencies = self._latencies.setdefault(notification.get('priority') or 1, deque(maxlen=1000))
+                    latencies.append((datetime.now() - due).total_seconds())
+            else:
+                self._metrics['failed'] += 1
+        return success
+
+    def pending(self, after_id=0):
+        """One page of unscheduled pending notifications with id > after_id, oldest first"""
+        conn = self._connect()
+        try:
+            rows = conn.execute(DUE_PENDING_SQL, (after_id, self.batch_size)).fetchall()
+        finally:
+            conn.close()
+        return [dict(row) for row in rows]
+
+    def _next(self, express):
+        """Pop the most urgent queued item this worker may take, or None"""
+        if self._express_queue:
+            return heapq.heappop(self._express_queue)
+        if not self._queue:
+            return None
+        # Express workers stay free for Critical work; from the bulk heap they only take overdue items
+        if express and self._queue[0][0] > datetime.now():
+            return None
+        return heapq.heappop(self._queue)
+
+    def _work(self, express):
+        while True:
+            with self._queue_cond:
+                while True:
+                    item = self._next(express)
+                    if item is not None:
+                        break
+                    if self._closing:
+                        return
+                    timeout = None
+                    if express and self._queue:
+                        # Wake when the most urgent bulk item becomes overdue
+                        timeout = max((self._queue[0][0] - datetime.now()).total_seconds(), 0.01)
+                    self._queue_cond.wait(timeout)
+            notification, future = item[3], item[4]
+            if future.set_running_or_notify_cancel():
+                future.set_result(self._send(notification, express))
+
+    def _start_workers(self):
+        with self._queue_cond:
+            if self._workers:
+                return
+            self._closing = False
+            for i in range(self.max_workers + self.express_workers):
+                express = i >= self.max_workers
+                worker = threading.Thread(target=self._work, args=(express,), daemon=True,
+                                          name=f"dispatch{'-express' if express else ''}-{i}")
+                worker.start()
+                self._workers.append(worker)
+
+    def submit(self, notifications):
+        """Claim notifications and queue them by deadline, returning their futures
+
+        Only the leader process sends; elsewhere this returns no futures.
+        """
+        if not self._try_lead():
+            with self._metrics_lock:
+                self._metrics['is_leader'] = False
+            return []
+        self._start_workers()
+        now = datetime.now()
+        futures = []
+        won = self._claim_many([notification['id'] for notification in notifications])
+        with self._queue_cond:
+            for notification in notifications:
+                if notification['id'] not in won:
+                    continue
+                with self._metrics_lock:
+                    self._metrics['in_flight'] += 1
+                future = Future()
+                item = (self.scheduler.deadline(notification), -(notification.get('priority') or 1),
+                        next(self._seq), notification, future)
+                express = self.scheduler.is_express(notification, now)
+                heapq.heappush(self._express_queue if express else self._queue, item)
+                futures.append(future)
+            self._queue_cond.notify_all()
+        return futures
+
+    def run_once(self, wait=True):
+        """Run one dispatch pass, returning the number of notifications sent"""
+        with self._pass_lock:
+            if not self._try_lead():
+                with self._metrics_lock:
+                    self._metrics['is_leader'] = False
+                return 0
+            started = time.perf_counter()
+            # Page through the whole queue; rows still in flight from an earlier pass are skipped by the claim
+            futures, queue_depth, after_id = [], 0, 0
+            while True:
+                page = self.pending(after_id)
+                futures.extend(self.submit(page))
+                queue_depth += len(page)
+                if len(page) < self.batch_size:
+                    break
+                after_id = page[-1]['id']
+            with self._metrics_lock:
+                self._metrics.update(queue_depth=queue_depth, is_leader=True, last_pass_at=time.time())
+            sent = sum(1 for future in futures if future.result()) if wait else 0
+            with self._metrics_lock:
+                self._metrics['last_pass_seconds'] = time.perf_counter() - started
+            return sent
+
+    # Lifecycle ------------------------------------------------------------
+
+    def _loop(self):
+        while not self._stop.is_set():
+            try:
+                # Don't wait for the queued sends: the next poll must still see new critical items
+                self.run_once(wait=False)
+            except Exception:
+                # Keep the dispatcher alive through transient database errors
+                pass
+            self._wake.wait(self.poll_interval)
+            self._wake.clear()
+
+    def start(self):
+        self._start_workers()
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._loop, name='notification-dispatcher', daemon=True)
+            self._thread.start()
+        return self
+
+    def wake(self):
+        """Start the next pass now instead of at the next poll interval"""
+        self._wake.set()
+
+    def close(self):
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.poll_interval + 1)
+        # Workers drain what is already queued, then exit
+        with self._queue_cond:
+            self._closing = True
+            self._queue_cond.notify_all()
+        for worker in self._workers:
+            worker.join()
+        self._workers = []
+        self._resign()
+
+    def metrics(self):
+        """Counters, queue depth, sends per minute and p50/p99 latency (seconds from due) per priority"""
+        now = time.time()
+        with self._metrics_lock:
+            while self._sent_times and self._sent_times[0] < now - 60:
+                self._sent_times.popleft()
+            metrics = dict(self._metrics)
+            metrics['throughput_per_minute'] = len(self._sent_times)
+            metrics['latency_by_priority'] = {}
+            for priority, latencies in sorted(self._latencies.items()):
+                ordered = sorted(latencies)
+                metrics['latency_by_priority'][priority] = {
+                    'p50': ordered[len(ordered) // 2],
+                    'p99': ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))],
+                    'target': self.scheduler.target(priority),
+                }
+        metrics['running'] = self._thread is not None and self._thread.is_alive()
+        return metrics
@@ -0,0 +1,186 @@
+"""Per-recipient inboxes with compact read markers.
+
+Fan-out happens on read, through pointers. A notification gets one
+notification_audience row per audience ('all', 'major:Computer Science',
+'department:Physics', 'user:jdoe', ...), not one row per recipient. A user's inbox
+merges the audiences that user belongs to. Each audience is read by a bounded
+descending range scan of the (audience, notification_id) primary key, so opening
+"My Notifications" costs O(page size x audiences) however many students and
+deliveries exist.
+
+create_notification only returns a bool, not the new id, so a targeted
+notification is written by create_targeted_notification instead. It picks the new
+id under the write lock and writes the audience rows for that id in the same
+transaction as the notification row. The insert trigger only adds 'all' for a
+notification that has no audience rows. A targeted notification is therefore
+never visible to 'all', not even briefly. If the insert fails, nothing is
+created.
+
+Read state is kept in two parts: a per-user watermark ("everything up to id N is
+read") plus individual (user_id, notification_id) rows for notifications read above
+the watermark. Both tables are WITHOUT ROWID and keyed on their lookup columns.
+Markers are written through db_access.SQLiteDatabase.write(), so a burst of clicks
+shares commits.
+"""
+from datetime import datetime
+
+from db_access import sql_timestamp
+
+INBOX_SCHEMA = """
+CREATE TABLE IF NOT EXISTS notification_audience (
+    audience TEXT NOT NULL,
+    notification_id INTEGER NOT NULL,
+    PRIMARY KEY (audience, notification_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_audience_notification ON notification_audience(notification_id);
+
+CREATE TABLE IF NOT EXISTS inbox_reads (
+    user_id TEXT NOT NULL,
+    notification_id INTEGER NOT NULL,
+    PRIMARY KEY (user_id, notification_id)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS inbox_watermarks (
+    user_id TEXT PRIMARY KEY,
+    read_through_id INTEGER NOT NULL
+) WITHOUT ROWID;
+
+DROP TRIGGER IF EXISTS trg_audience_insert;
+DROP TRIGGER IF EXISTS trg_audience_staged_insert;
+DROP TABLE IF EXISTS staged_audiences;
+CREATE TRIGGER IF NOT EXISTS trg_audience_default_insert AFTER INSERT ON notifications
+BEGIN
+    INSERT OR IGNORE INTO notification_audience (audience, notification_id)
+    SELECT 'all', NEW.id WHERE NOT EXISTS (SELECT 1 FROM notification_audience WHERE notification_id = NEW.id);
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_audience_delete AFTER DELETE ON notifications
+BEGIN
+    DELETE FROM notification_audience WHERE notification_id = OLD.id;
+    DELETE FROM inbox_reads WHERE notification_id = OLD.id;
+END;
+"""
+
+ALL_AUDIENCE = 'all'
+
+
+def ensure_inbox(conn):
+    # One transaction, so no insert runs between dropping the old trigger and creating its replacement
+    conn.executescript("BEGIN IMMEDIATE;\n" + INBOX_SCHEMA + "COMMIT;")
+    # Notifications created before the inbox existed were global
+    conn.execute(
+        "INSERT OR IGNORE INTO notification_audience (audience, notification_id) "
+        "SELECT 'all', id FROM notifications WHERE id NOT IN (SELECT notification_id FROM notification_audience)"
+    )
+    conn.commit()
+
+
+def audiences_for(username, profile=None):
+    """Audiences a user belongs to, from their username and profile"""
+    audiences = [ALL_AUDIENCE, f"user:{username.lower()}"]
+    for field in ('major', 'department', 'year', 'class'):
+        value = (profile or {}).get(field)
+        if value:
+            audiences.append(f"{field}:{str(value).lower()}")
+    return audiences
+
+
+def create_targeted_notification(conn, audiences, title, message, notification_type='info', priority=2,
+                                 scheduled_for=None):
+    """Insert a notification visible only to the given audiences, returning its id"""
+    audiences = sorted({a.lower() for a in audiences if a and a != ALL_AUDIENCE})
+    if not audiences:
+        raise ValueError("A targeted notification needs at least one audience other than 'all'")
+    fields = {
+        'title': title, 'message': message, 'notification_type': notification_type, 'priority': priority,
+        'status': 'pending', 'created_at': sql_timestamp(datetime.now()),
+        'scheduled_for': sql_timestamp(scheduled_for) if scheduled_for else None,
+    }
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(notifications)")}
+    fields = {column: value for column, value in fields.items() if column in columns}
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        # The write lock is held, so no other connection can take this id before the insert
+        notification_id = conn.execute("SELECT COALESCE(MAX(id), 0) + 1 FROM notifications").fetchone()[0]
+        if conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'sqlite_sequence'").fetchone():
+            row = conn.execute("SELECT seq FROM sqlite_sequence WHERE name = 'notifications'").fetchone()
+            if row is not None:
+                notification_id = max(notification_id, row[0] + 1)
+        # Audience rows go in first, so the insert trigger sees them and does not add 'all'
+        conn.executemany(
+            "INSERT OR IGNORE INTO notification_audience (audience, notification_id) VALUES (?, ?)",
+            [(audience, notification_id) for audience in audiences]
+        )
+        conn.execute(
+            f"INSERT INTO notifications (id, {', '.join(fields)}) VALUES (?{', ?' * len(fields)})",
+            [notification_id] + list(fields.values())
+        )
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return notification_id
+
+
+def get_inbox(conn, user_id, audiences, limit=20, before_id=None, after_id=0):
+    """Newest notifications for a user, each with an 'is_read' flag"""
+    before_id = before_id if before_id is not None else 2 ** 63 - 1
+    # One bounded index range scan per audience, merged
+    pointer_queries = " UNION ".join(
+        "SELECT notification_id FROM (SELECT notification_id FROM notification_audience "
+        "WHERE audience = ? AND notification_id < ? AND notification_id > ? ORDER BY notification_id DESC LIMIT ?)"
+        for _ in audiences
+    )
+    params = []
+    for audience in audiences:
+        params.extend([audience, before_id, after_id, limit])
+    rows = conn.execute(
+        f"SELECT n.*, "
+        f"       (r.notification_id IS NOT NULL OR n.id <= COALESCE(w.read_through_id, 0)) AS is_read "
+        f"FROM ({pointer_queries}) p "
+        f"JOIN notifications n ON n.id = p.notification_id "
+        f"LEFT JOIN inbox_reads r ON r.user_id = ? AND r.notification_id = n.id "
+        f"LEFT JOIN inbox_watermarks w ON w.user_id = ? "
+        f"ORDER BY n.id DESC LIMIT ?",
+        params + [user_id, user_id, limit]
+    ).fetchall()
+    return [dict(row, is_read=bool(row['is_read'])) for row in rows]
+
+
+def unread_count(conn, user_id, audiences, cap=100):
+    """Unread notifications above the user's watermark, counted up to cap"""
+    placeholders = ','.join('?' * len(audiences))
+    row = conn.execute(
+        f"SELECT COUNT(*) AS n FROM (SELECT DISTINCT a.notification_id FROM notification_audience a "
+        f"WHERE a.audience IN ({placeholders}) "
+        f"AND a.notification_id > COALESCE((SELECT read_through_id FROM inbox_watermarks WHERE user_id = ?), 0) "
+        f"AND NOT EXISTS (SELECT 1 FROM inbox_reads r WHERE r.user_id = ? AND r.notification_id = a.notification_id) "
+        f"LIMIT ?)",
+        list(audiences) + [user_id, user_id, cap]
+    ).fetchone()
+    return row['n']
+
+
+def mark_read(database, user_id, notification_ids):
+    """Record read markers through the database's group-commit writer"""
+    futures = [
+        database.write("INSERT OR IGNORE INTO inbox_reads (user_id, notification_id) VALUES (?, ?)",
+                       (user_id, notification_id))
+        for notification_id in notification_ids
+    ]
+    for future in futures:
+        future.result()
+
+
+def mark_all_read(database, user_id, through_id):
+    """Advance the watermark and drop the per-notification markers it now covers"""
+    futures = [
+        database.write(
+            "INSERT INTO inbox_watermarks (user_id, read_through_id) VALUES (?, ?) "
+            "ON CONFLICT(user_id) DO UPDATE SET read_through_id = MAX(read_through_id, excluded.read_through_id)",
+            (user_id, through_id)
+        ),
+        database.write("DELETE FROM inbox_reads WHERE user_id = ? AND notification_id <= ?", (user_id, through_id)),
+    ]
+    for future in futures:
+        future.result()
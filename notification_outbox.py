@@ -0,0 +1,301 @@
+"""Durable outbox with automatic retries for notification delivery.
+
+Each notification to be delivered gets a row in notification_outbox, which carries a
+unique idempotency key for that delivery. The key travels with every send
+(send_notification(..., idempotency_key=...)) to the channel senders, which skip
+a key they already delivered and hand it to receivers as Idempotency-Key /
+Message-ID. Failed sends are not left for an operator to click. They are retried
+with exponential backoff plus jitter, and moved to the 'dead' state after
+max_attempts.
+
+Retries only run in the process that holds dispatcher leadership, and under the
+dispatcher's in-process claim. A retried row is briefly moved back from 'failed'
+to 'pending', and only the leader's dispatcher, which respects that claim, could
+see it. A retry is only attempted after that conditional 'failed' -> 'pending'
+update succeeds, so a notification that was already delivered is never sent
+again. Rows are claimed with a conditional UPDATE that records claimed_by.
+A 'sending' row whose claim is older than lease_seconds belonged to a worker
+that died, and is claimed again. Claims and state changes are queued on the
+database's group-commit writer, so one pass commits all of its claims at once.
+
+Email, webhook and push deliveries are recorded per (idempotency key, channel) in
+outbox_channel_deliveries. A channel that already delivered a key is skipped on
+every later attempt, by any process and after a restart. A channel failure puts the
+row back into 'retry' even though the in-app send succeeded. The retry then only
+re-sends on the channels that failed, with the same backoff and dead-lettering.
+
+Rows are written by triggers on the notifications table. An outbox row is therefore
+committed in the same transaction as the INSERT made by create_notification, and its
+state follows the notification's status updates.
+"""
+import random
+import threading
+from datetime import datetime, timedelta
+
+from db_access import sql_timestamp
+
+OUTBOX_SCHEMA = """
+CREATE TABLE IF NOT EXISTS notification_outbox (
+    notification_id INTEGER PRIMARY KEY,
+    idempotency_key TEXT NOT NULL UNIQUE,
+    state TEXT NOT NULL DEFAULT 'queued',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at TIMESTAMP,
+    last_error TEXT,
+    claimed_by TEXT,
+    updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+CREATE INDEX IF NOT EXISTS idx_outbox_state_next ON notification_outbox(state, next_attempt_at);
+
+CREATE TABLE IF NOT EXISTS outbox_channel_deliveries (
+    idempotency_key TEXT NOT NULL,
+    channel TEXT NOT NULL,
+    state TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (idempotency_key, channel)
+) WITHOUT ROWID;
+
+CREATE TRIGGER IF NOT EXISTS trg_outbox_insert AFTER INSERT ON notifications
+BEGIN
+    INSERT OR IGNORE INTO notification_outbox (notification_id, idempotency_key)
+    VALUES (NEW.id, NEW.id || ':' || hex(randomblob(8)));
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_outbox_status AFTER UPDATE OF status ON notifications
+BEGIN
+    UPDATE notification_outbox
+    SET state = CASE NEW.status
+                    WHEN 'sent' THEN 'delivered'
+                    WHEN 'failed' THEN CASE WHEN state = 'dead' THEN 'dead' ELSE 'retry' END
+                    ELSE state END,
+        next_attempt_at = CASE WHEN NEW.status = 'failed' AND state NOT IN ('retry', 'dead')
+                               THEN CURRENT_TIMESTAMP ELSE next_attempt_at END,
+        updated_at = CURRENT_TIMESTAMP
+    WHERE notification_id = NEW.id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_outbox_channels_delete BEFORE DELETE ON notifications
+BEGIN
+    DELETE FROM outbox_channel_deliveries
+    WHERE idempotency_key IN (SELECT idempotency_key FROM notification_outbox WHERE notification_id = OLD.id);
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_outbox_delete AFTER DELETE ON notifications
+BEGIN
+    DELETE FROM notification_outbox WHERE notification_id = OLD.id;
+END;
+"""
+
+
+def ensure_outbox(conn):
+    conn.executescript(OUTBOX_SCHEMA)
+    # Failed notifications that predate the outbox become retryable too
+    conn.execute(
+        "INSERT OR IGNORE INTO notification_outbox (notification_id, idempotency_key, state, next_attempt_at) "
+        "SELECT id, id || ':' || hex(randomblob(8)), 'retry', CURRENT_TIMESTAMP FROM notifications "
+        "WHERE status = 'failed'"
+    )
+    conn.commit()
+
+
+def delivered_channels(conn, idempotency_key):
+    """Channels that already delivered this idempotency key"""
+    rows = conn.execute(
+        "SELECT channel FROM outbox_channel_deliveries WHERE idempotency_key = ? AND state = 'delivered'",
+        (idempotency_key,)
+    ).fetchall()
+    return {row[0] for row in rows}
+
+
+def record_channel_results(database, notification_id, idempotency_key, outcomes):
+    """Store {channel: delivered} for a key; any failure makes a delivered outbox row due for retry"""
+    statements = [
+        ("INSERT INTO outbox_channel_deliveries (idempotency_key, channel, state, attempts) VALUES (?, ?, ?, 1) "
+         "ON CONFLICT(idempotency_key, channel) DO UPDATE SET state = excluded.state, attempts = attempts + 1, "
+         "updated_at = CURRENT_TIMESTAMP",
+         (idempotency_key, channel, 'delivered' if ok else 'failed'))
+        for channel, ok in outcomes.items()
+    ]
+    failed = sorted(channel for channel, ok in outcomes.items() if not ok)
+    if failed:
+        # A row the retry worker holds ('sending') gets its backoff from the worker instead
+        statements.append((
+            "UPDATE notification_outbox SET state = 'retry', next_attempt_at = CURRENT_TIMESTAMP, last_error = ?, "
+            "updated_at = CURRENT_TIMESTAMP WHERE notification_id = ? AND state = 'delivered'",
+            (f"channel delivery failed: {', '.join(failed)}", notification_id)
+        ))
+    futures = [database.write(sql, params) for sql, params in statements]
+    for future in futures:
+        future.result()
+
+
+class OutboxRetryWorker:
+    """Retries failed notifications with exponential backoff, jitter and a dead-letter state"""
+
+    def __init__(self, database, notification_engine, claims=None, is_leader=None, base_delay=30.0,
+                 max_delay=3600.0, max_attempts=6, batch_size=50, poll_interval=10.0, lease_seconds=300.0,
+                 worker_id=None):
+        # A db_access.SQLiteDatabase: reads use its pooled connections, state changes its group commit
+        self.database = database
+        self.notification_engine = notification_engine
+        # The dispatcher's claim/release, so a retry and a dispatcher pass never overlap
+        self.claims = claims
+        # Retries run only where the dispatcher leads; elsewhere a reopened row would be fair game
+        self.is_leader = is_leader
+        self.lease_seconds = lease_seconds
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.max_attempts = max_attempts
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.worker_id = worker_id or f"{threading.get_ident()}-{random.getrandbits(32):08x}"
+        self._stop = threading.Event()
+        self._thread = None
+        self.stats = {'retried': 0, 'delivered': 0, 'dead': 0, 'recovered': 0}
+
+    def backoff(self, attempts):
+        """Full-jitter exponential backoff in seconds for the given attempt count"""
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempts)))
+
+    def _query(self, sql, params=()):
+        conn = self.database.connect()
+        try:
+            return conn.execute(sql, params).fetchall()
+        finally:
+            conn.close()
+
+    def _write(self, *statements):
+        """Queue statements on the group-commit writer and wait for them, returning their rowcounts"""
+        futures = [self.database.write(sql, params, rowcount=True) for sql, params in statements]
+        return [future.result() for future in futures]
+
+    def _claim(self):
+        now = datetime.utcnow()
+        lease_expired = sql_timestamp(now - timedelta(seconds=self.lease_seconds))
+        rows = self._query(
+            "SELECT notification_id, attempts, idempotency_key, state FROM notification_outbox "
+            "WHERE state = 'retry' AND next_attempt_at <= ? "
+            "UNION ALL "
+            "SELECT notification_id, attempts, idempotency_key, state FROM notification_outbox "
+            "WHERE state = 'sending' AND updated_at <= ? "
+            "LIMIT ?",
+            (sql_timestamp(now), lease_expired, self.batch_size)
+        )
+        # Conditional update: only one worker wins each row. A 'sending' row is only
+        # taken over once its lease has expired, i.e. its worker died mid-send.
+        # All claims of a pass are queued together, so they share one commit.
+        won = self._write(*[
+            ("UPDATE notification_outbox SET state = 'sending', claimed_by = ?, attempts = attempts + 1, "
+             "updated_at = CURRENT_TIMESTAMP WHERE notification_id = ? AND "
+             "(state = 'retry' OR (state = 'sending' AND updated_at <= ?))",
+             (self.worker_id, row['notification_id'], lease_expired))
+            for row in rows
+        ])
+        claimed = []
+        for row, rowcount in zip(rows, won):
+            if rowcount:
+                if row['state'] == 'sending':
+                    self.stats['recovered'] += 1
+                claimed.append((row['notification_id'], row['attempts'] + 1, row['idempotency_key']))
+        return claimed
+
+    def _retry(self, notification_id, attempts, idempotency_key):
+        if self.claims is not None and not self.claims.claim(notification_id):
+            self._write(("UPDATE notification_outbox SET state = 'retry', attempts = attempts - 1 "
+                         "WHERE notification_id = ? AND state = 'sending' AND claimed_by = ?",
+                         (notification_id, self.worker_id)))
+            return
+        try:
+            self._attempt(notification_id, attempts, idempotency_key)
+        finally:
+            if self.claims is not None:
+                self.claims.release(notification_id)
+
+    def _attempt(self, notification_id, attempts, idempotency_key):
+        # Reopen the notification only if it is still failed (or was left pending by a
+        # worker that died mid-retry), so a delivered one is never resent
+        reopened, = self._write(
+            ("UPDATE notifications SET status = 'pending' WHERE id = ? AND status IN ('failed', 'pending')",
+             (notification_id,))
+        )
+        deliver_channels = getattr(self.notification_engine, 'deliver_channels', None)
+        if not reopened and deliver_channels is None:
+            self._write(("UPDATE notification_outbox SET state = 'delivered' WHERE notification_id = ? "
+                         "AND state = 'sending'", (notification_id,)))
+            return
+        self.stats['retried'] += 1
+        try:
+            if reopened:
+                success = self.notification_engine.send_notification(notification_id, idempotency_key=idempotency_key)
+            else:
+                # Already sent in-app: only the channels that have not delivered this key are tried
+                success = deliver_channels(notification_id, idempotency_key=idempotency_key)
+            error = None if success else 'send_notification returned False'
+        except Exception as e:
+            success, error = False, str(e)
+        if success:
+            self.stats['delivered'] += 1
+            self._write(("UPDATE notification_outbox SET state = 'delivered', last_error = NULL, "
+                         "updated_at = CURRENT_TIMESTAMP WHERE notification_id = ?", (notification_id,)))
+        elif attempts >= self.max_attempts:
+            self.stats['dead'] += 1
+            self._write(
+                ("UPDATE notifications SET status = 'failed' WHERE id = ? AND status = 'pending'",
+                 (notification_id,)),
+                ("UPDATE notification_outbox SET state = 'dead', last_error = ?, "
+                 "updated_at = CURRENT_TIMESTAMP WHERE notification_id = ?", (error, notification_id))
+            )
+        else:
+            next_attempt = datetime.utcnow() + timedelta(seconds=self.backoff(attempts))
+            self._write(
+                ("UPDATE notifications SET status = 'failed' WHERE id = ? AND status = 'pending'",
+                 (notification_id,)),
+                ("UPDATE notification_outbox SET state = 'retry', next_attempt_at = ?, last_error = ?, "
+                 "updated_at = CURRENT_TIMESTAMP WHERE notification_id = ?",
+                 (sql_timestamp(next_attempt), error, notification_id))
+            )
+
+    def run_once(self):
+        """Retry every due row once, returning the number of rows attempted"""
+        if self.is_leader is not None and not self.is_leader():
+            return 0
+        claimed = self._claim()
+        for notification_id, attempts, idempotency_key in claimed:
+            self._retry(notification_id, attempts, idempotency_key)
+        return len(claimed)
+
+    def requeue(self, notification_id):
+        """Retry a failed or dead-lettered notification on the next pass"""
+        requeued, = self._write((
+            "UPDATE notification_outbox SET state = 'retry', next_attempt_at = CURRENT_TIMESTAMP, "
+            "attempts = CASE WHEN state = 'dead' THEN 0 ELSE attempts END "
+            "WHERE notification_id = ? AND state IN ('retry', 'dead')",
+            (notification_id,)
+        ))
+        return requeued > 0
+
+    def counts(self):
+        rows = self._query("SELECT state, COUNT(*) AS n FROM notification_outbox GROUP BY state")
+        return {row['state']: row['n'] for row in rows}
+
+    def _loop(self):
+        while not self._stop.is_set():
+            try:
+                self.run_once()
+            except Exception:
+                pass
+            self._stop.wait(self.poll_interval)
+
+    def start(self):
+        self.database.ensure('outbox', ensure_outbox)
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._loop, name='outbox-retry', daemon=True)
+            self._thread.start()
+        return self
+
+    def close(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.poll_interval + 1)
@@ -0,0 +1,77 @@
+"""Filtered, keyset-paginated notification history.
+
+Status, type, priority and date filters are applied in SQL and served by composite
+indexes that end in id. Each filter combination is therefore a single index range
+scan in id order. Pages are addressed by a cursor (the last id shown) rather than
+an OFFSET, so page 500 costs the same as page 1 and never comes back short because
+rows were filtered out after fetching.
+
+Date bounds are turned into id bounds first. Ids are assigned in creation order, so
+"created on or after D" is the same as "id >= first id created on or after D". That
+lookup is one probe of the created_at index.
+"""
+
+HISTORY_INDEXES = """
+CREATE INDEX IF NOT EXISTS idx_notifications_status_id ON notifications(status, id);
+CREATE INDEX IF NOT EXISTS idx_notifications_type_id ON notifications(notification_type, id);
+CREATE INDEX IF NOT EXISTS idx_notifications_priority_id ON notifications(priority, id);
+CREATE INDEX IF NOT EXISTS idx_notifications_status_type_id ON notifications(status, notification_type, id);
+CREATE INDEX IF NOT EXISTS idx_notifications_created_at ON notifications(created_at);
+"""
+
+
+def ensure_history_indexes(conn):
+    conn.executescript(HISTORY_INDEXES)
+    conn.commit()
+
+
+def id_bounds(conn, start=None, end=None):
+    """Translate an inclusive [start, end) created_at range into id bounds"""
+    low = high = None
+    if start is not None:
+        row = conn.execute("SELECT id FROM notifications WHERE created_at >= ? "
+                           "ORDER BY created_at, id LIMIT 1", (start,)).fetchone()
+        low = row['id'] if row is not None else 2 ** 63 - 1
+    if end is not None:
+        row = conn.execute("SELECT id FROM notifications WHERE created_at < ? "
+                           "ORDER BY created_at DESC, id DESC LIMIT 1", (end,)).fetchone()
+        high = row['id'] if row is not None else 0
+    return low, high
+
+
+def query_notifications(conn, status=None, notification_type=None, priority=None,
+                        start=None, end=None, before_id=None, after_id=None, limit=25):
+    """One page of notifications, newest first
+
+    start and end are created_at bounds (start inclusive, end exclusive) as strings or
+    datetimes. Pass the returned 'next_cursor' as before_id to get the following page;
+    it is None on the last page. after_id restricts the page to rows newer than that id.
+    """
+    clauses, params = [], []
+    for column, value in (('status', status), ('notification_type', notification_type), ('priority', priority)):
+        if value is not None:
+            clauses.append(f"{column} = ?")
+            params.append(value)
+    low, high = id_bounds(conn, start, end)
+    if before_id is not None:
+        high = before_id - 1 if high is None else min(high, before_id - 1)
+    if after_id is not None:
+        low = after_id + 1 if low is None else max(low, after_id + 1)
+    if low is not None:
+        clauses.append("id >= ?")
+        params.append(low)
+    if high is not None:
+        clauses.append("id <= ?")
+        params.append(high)
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+    # One extra row tells us whether another page exists
+    rows = conn.execute(
+        f"SELECT * FROM notifications {where} ORDER BY id DESC LIMIT ?", params + [limit + 1]
+    ).fetchall()
+    rows = [dict(row) for row in rows]
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    return {
+        'notifications': rows,
+        'next_cursor': rows[-1]['id'] if has_more and rows else None,
+    }
@@ -0,0 +1,118 @@
+"""Full-text search over notification titles and messages.
+
+notifications_fts is an FTS5 external-content index. The notifications table holds
+the text and the index holds only the inverted lists. Triggers on insert, update and
+delete keep the index in step with every write path, including the cleanup that
+deletes old rows. Searches are BM25-ranked, and title matches are weighted above
+message matches. Each result carries a highlighted snippet of the message.
+
+Searches take the same status, type, priority and created_at filters as the history
+list, and page by keyset: the cursor is the (rank, id) of the last row shown, so
+later pages never re-rank or skip the rows before them.
+
+If the SQLite build lacks FTS5, ensure_search() raises sqlite3.OperationalError.
+"""
+import re
+
+from notification_queries import id_bounds
+
+SEARCH_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS notifications_fts USING fts5(
+    title, message,
+    content='notifications', content_rowid='id',
+    tokenize='porter unicode61', prefix='2 3'
+);
+
+CREATE TRIGGER IF NOT EXISTS trg_fts_insert AFTER INSERT ON notifications
+BEGIN
+    INSERT INTO notifications_fts (rowid, title, message) VALUES (NEW.id, NEW.title, NEW.message);
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_fts_delete AFTER DELETE ON notifications
+BEGIN
+    INSERT INTO notifications_fts (notifications_fts, rowid, title, message)
+    VALUES ('delete', OLD.id, OLD.title, OLD.message);
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_fts_update AFTER UPDATE OF title, message ON notifications
+BEGIN
+    INSERT INTO notifications_fts (notifications_fts, rowid, title, message)
+    VALUES ('delete', OLD.id, OLD.title, OLD.message);
+    INSERT INTO notifications_fts (rowid, title, message) VALUES (NEW.id, NEW.title, NEW.message);
+END;
+"""
+
+# BM25 column weights: (title, message)
+TITLE_WEIGHT = 5.0
+MESSAGE_WEIGHT = 1.0
+
+
+def ensure_search(conn):
+    existed = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'notifications_fts'"
+    ).fetchone()
+    conn.executescript(SEARCH_SCHEMA)
+    if not existed:
+        # Index the notifications written before search existed
+        conn.execute("INSERT INTO notifications_fts (notifications_fts) VALUES ('rebuild')")
+    conn.commit()
+
+
+def to_match_query(text):
+    """Turn free text into an FTS5 query: every word must match, the last one as a prefix
+
+    Quoting each term keeps user input such as "room-change" or "B201:" from being
+    parsed as FTS5 syntax.
+    """
+    terms = re.findall(r"\w+", text or "")
+    if not terms:
+        return None
+    quoted = [f'"{term}"' for term in terms]
+    quoted[-1] += '*'
+    return ' '.join(quoted)
+
+
+def search_notifications(conn, text, limit=20, status=None, notification_type=None, priority=None,
+                         start=None, end=None, cursor=None):
+    """One page of the best matches for text, each with a 'snippet' and a 'rank' (lower is better)
+
+    start and end are created_at bounds (start inclusive, end exclusive). Pass the
+    returned 'next_cursor' as cursor to get the following page; it is None on the
+    last page.
+    """
+    query = to_match_query(text)
+    if query is None:
+        return {'notifications': [], 'next_cursor': None}
+    clauses, params = ["notifications_fts MATCH ?"], [query]
+    for column, value in (('status', status), ('notification_type', notification_type), ('priority', priority)):
+        if value is not None:
+            clauses.append(f"n.{column} = ?")
+            params.append(value)
+    low, high = id_bounds(conn, start, end)
+    if low is not None:
+        clauses.append("n.id >= ?")
+        params.append(low)
+    if high is not None:
+        clauses.append("n.id <= ?")
+        params.append(high)
+    after = ""
+    if cursor is not None:
+        after = "WHERE rank > ? OR (rank = ? AND id > ?)"
+        params += [cursor[0], cursor[0], cursor[1]]
+    # One extra row tells us whether another page exists
+    rows = conn.execute(
+        f"SELECT * FROM ("
+        f"  SELECT n.*, snippet(notifications_fts, 1, '**', '**', '…', 12) AS snippet, "
+        f"         bm25(notifications_fts, {TITLE_WEIGHT}, {MESSAGE_WEIGHT}) AS rank "
+        f"  FROM notifications_fts JOIN notifications n ON n.id = notifications_fts.rowid "
+        f"  WHERE {' AND '.join(clauses)}"
+        f") {after} ORDER BY rank, id LIMIT ?",
+        params + [limit + 1]
+    ).fetchall()
+    rows = [dict(row) for row in rows]
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    return {
+        'notifications': rows,
+        'next_cursor': (rows[-1]['rank'], rows[-1]['id']) if has_more and rows else None,
+    }
@@ -0,0 +1,140 @@
+"""Attendance for one person, read through the (person_name, timestamp) index.
+
+Student pages used to load the school-wide summary and filter it in Python. These
+queries touch only the requesting student's rows, so a student page costs the same
+whether the school has 50 students or 20,000. Names match case-insensitively, like
+the old username comparison.
+
+Streaks and the monthly rate count school days (Monday to Friday). A weekend
+without attendance does not break a streak.
+
+record_attendance() writes the rows for faces recognised outside
+AttendanceSystem.mark_attendance (video streams and face-index matches). It checks
+the attendance table's columns first and raises AttendanceUnavailable, rather than
+a raw sqlite3 error, when the table is missing or cannot be written.
+"""
+import sqlite3
+from datetime import date, datetime, timedelta
+
+from db_access import sql_timestamp
+from priority_scheduler import parse_timestamp
+
+
+class AttendanceUnavailable(Exception):
+    """The attendance table is missing, lacks a required column or rejected the rows"""
+
+
+def _has_attendance(conn):
+    return conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'attendance'").fetchone() is not None
+
+
+def _attendance_columns(conn):
+    return {row[1] for row in conn.execute("PRAGMA table_info(attendance)")}
+
+
+def person_records(conn, person_name, since=None, limit=200):
+    """The person's attendance rows, newest first, optionally only from `since` (a date) on"""
+    if not _has_attendance(conn):
+        return []
+    sql = "SELECT * FROM attendance WHERE person_name = ? COLLATE NOCASE"
+    params = [person_name]
+    if since is not None:
+        sql += " AND timestamp >= ?"
+        params.append(since.isoformat())
+    rows = conn.execute(sql + " ORDER BY timestamp DESC LIMIT ?", params + [limit]).fetchall()
+    return [dict(row) for row in rows]
+
+
+def _school_days(start, end):
+    """Weekdays from start to end inclusive"""
+    day, days = start, []
+    while day <= end:
+        if day.weekday() < 5:
+            days.append(day)
+        day += timedelta(days=1)
+    return days
+
+
+def _streaks(present, today):
+    """(current, longest) runs of consecutive school days present"""
+    if not present:
+        return 0, 0
+    days = _school_days(min(present), today)
+    longest = run = 0
+    for day in days:
+        run = run + 1 if day in present else 0
+        longest = max(longest, run)
+    # Today does not break the current streak until it is over
+    current = 0
+    for day in reversed(days):
+        if day in present:
+            current += 1
+        elif day != today:
+            break
+    return current, longest
+
+
+def person_summary(conn, person_name, days=30, today=None):
+    """Attendance totals, streaks, this month's rate and last-seen time for one person"""
+    today = today or date.today()
+    if not _has_attendance(conn):
+        return {'total_records': 0, 'days_present': 0, 'today': 0, 'current_streak': 0,
+                'longest_streak': 0, 'monthly_rate': 0.0, 'last_seen': None}
+    present_rows = conn.execute(
+        "SELECT date(timestamp) AS day, COUNT(*) AS n FROM attendance "
+        "WHERE person_name = ? COLLATE NOCASE GROUP BY 1", (person_name,)
+    ).fetchall()
+    by_day = {date.fromisoformat(row['day']): row['n'] for row in present_rows if row['day']}
+    since = today - timedelta(days=days - 1)
+    current_streak, longest_streak = _streaks(set(by_day), today)
+    month_days = _school_days(today.replace(day=1), today)
+    present_this_month = sum(1 for day in month_days if day in by_day)
+    last = conn.execute(
+        "SELECT timestamp FROM attendance WHERE person_name = ? COLLATE NOCASE ORDER BY timestamp DESC LIMIT 1",
+        (person_name,)
+    ).fetchone()
+    return {
+        'total_records': sum(n for day, n in by_day.items() if day >= since),
+        'days_present': sum(1 for day in by_day if day >= since),
+        'today': by_day.get(today, 0),
+        'current_streak': current_streak,
+        'longest_streak': longest_streak,
+        'monthly_rate': round(present_this_month / len(month_days) * 100, 1) if month_days else 0.0,
+        'last_seen': parse_timestamp(last['timestamp']) if last else None,
+    }
+
+
+def record_attendance(database, recognized_faces, timestamp=None):
+    """Insert one attendance row per recognised face, returning the number written
+
+    database is the SQLiteDatabase; the rows go through its group-commit writer.
+    The confidence is stored when the table has a confidence column.
+    """
+    conn = database.connect()
+    try:
+        columns = _attendance_columns(conn)
+    finally:
+        conn.close()
+    if not columns:
+        raise AttendanceUnavailable("the attendance table does not exist yet")
+    missing = [column for column in ('person_name', 'timestamp') if column not in columns]
+    if missing:
+        raise AttendanceUnavailable(f"the attendance table has no {', '.join(missing)} column")
+    with_confidence = 'confidence' in columns
+    sql = ("INSERT INTO attendance (person_name, timestamp, confidence) VALUES (?, ?, ?)" if with_confidence
+           else "INSERT INTO attendance (person_name, timestamp) VALUES (?, ?)")
+    timestamp = sql_timestamp(timestamp or datetime.now())
+    futures = [
+        database.write(sql, (face['name'], timestamp, face.get('confidence')) if with_confidence
+                       else (face['name'], timestamp))
+        for face in recognized_faces
+    ]
+    errors = []
+    for future in futures:
+        try:
+            future.result()
+        except sqlite3.Error as e:
+            errors.append(str(e))
+    if errors:
+        raise AttendanceUnavailable(f"{len(errors)} of {len(futures)} attendance rows were not written: {errors[0]}")
+    return len(futures)
@@ -0,0 +1,145 @@
+"""Priority-aware ordering for notification delivery.
+
+Each priority has a latency target, which is the longest it should wait between
+becoming due and delivery. A notification is due when it is created, or at
+scheduled_for if that is later. Notifications are dispatched earliest-deadline-first,
+where deadline = due time + target[priority]. A scheduled Low reminder is therefore
+not overdue the moment it comes due. A Critical alert created now therefore
+goes ahead of Low announcements that were queued a minute ago. Low items still age:
+once their own deadline has passed they sort ahead of newer work. Critical and
+overdue items use a reserved express lane, so a bulk send cannot occupy every worker.
+
+Run this module directly for a latency benchmark:
+
+    python priority_scheduler.py
+"""
+import statistics
+from datetime import datetime, timedelta
+
+# Seconds from creation to delivery, by priority (1 Low ... 5 Critical)
+DEFAULT_LATENCY_TARGETS = {5: 5, 4: 30, 3: 120, 2: 600, 1: 1800}
+
+
+def parse_timestamp(value):
+    """Return value as a datetime, accepting datetimes and ISO strings"""
+    if value is None or isinstance(value, datetime):
+        return value
+    try:
+        return datetime.fromisoformat(str(value))
+    except ValueError:
+        return None
+
+
+class PriorityScheduler:
+    """Earliest-deadline-first ordering with per-priority latency targets"""
+
+    def __init__(self, latency_targets=None, express_priority=5):
+        self.latency_targets = dict(DEFAULT_LATENCY_TARGETS)
+        self.latency_targets.update(latency_targets or {})
+        self.express_priority = express_priority
+
+    def target(self, priority):
+        return self.latency_targets.get(priority, max(self.latency_targets.values()))
+
+    def due_time(self, notification):
+        """When the notification became deliverable: max(created_at, scheduled_for)"""
+        created_at = parse_timestamp(notification.get('created_at'))
+        scheduled_for = parse_timestamp(notification.get('scheduled_for'))
+        if created_at is None:
+            return scheduled_for
+        return max(created_at, scheduled_for) if scheduled_for is not None else created_at
+
+    def deadline(self, notification):
+        due = self.due_time(notification) or datetime.now()
+        return due + timedelta(seconds=self.target(notification.get('priority') or 1))
+
+    def order(self, notifications):
+        return sorted(notifications, key=lambda n: (self.deadline(n), -(n.get('priority') or 1)))
+
+    def is_express(self, notification, now=None):
+        """Critical and overdue notifications skip the bulk lane"""
+        if (notification.get('priority') or 1) >= self.express_priority:
+            return True
+        return self.deadline(notification) <= (now or datetime.now())
+
+
+def _percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+def run_benchmark(bulk_size=2000, critical_every=0.05, send_ms=5.0, duration=10.0):
+    """Send a bulk announcement while critical alerts keep arriving, print p50/p99 per priority"""
+    import os
+    import random
+    import tempfile
+    import threading
+    import time
+
+    from db_access import connect, sql_timestamp
+    from notification_dispatcher import NotificationDispatcher
+
+    db_path = os.path.join(tempfile.mkdtemp(), 'benchmark.db')
+    with connect(db_path) as conn:
+        conn.execute("PRAGMA journal_mode = WAL")
+        conn.execute("CREATE TABLE notifications (id INTEGER PRIMARY KEY AUTOINCREMENT, title TEXT, "
+                     "priority INTEGER, status TEXT DEFAULT 'pending', created_at TIMESTAMP, scheduled_for TIMESTAMP)")
+        conn.execute("CREATE INDEX idx_notifications_status_scheduled ON notifications(status, scheduled_for)")
+    add_lock = threading.Lock()
+
+    def add(priority):
+        with add_lock, connect(db_path) as conn:
+            conn.execute("INSERT INTO notifications (title, priority, created_at) VALUES (?, ?, ?)",
+                         (f'p{priority}', priority, sql_timestamp(datetime.now())))
+
+    class FakeEngine:
+        def __init__(self):
+            self.latencies = {}
+            self.lock = threading.Lock()
+
+        def send_notification(self, notification_id):
+            time.sleep(send_ms / 1000.0)
+            conn = connect(db_path)
+            try:
+                with conn:
+                    cursor = conn.execute("UPDATE notifications SET status = 'sent' WHERE id = ? AND status = 'pending'",
+                                          (notification_id,))
+                row = conn.execute("SELECT priority, created_at FROM notifications WHERE id = ?",
+                                   (notification_id,)).fetchone()
+            finally:
+                conn.close()
+            if not cursor.rowcount:
+                return False
+            latency = (datetime.now() - parse_timestamp(row['created_at'])).total_seconds() * 1000
+            with self.lock:
+                self.latencies.setdefault(row['priority'], []).append(latency)
+            return True
+
+    def pending_count():
+        with connect(db_path) as conn:
+            return conn.execute("SELECT COUNT(*) FROM notifications WHERE status = 'pending'").fetchone()[0]
+
+    engine = FakeEngine()
+    for _ in range(bulk_size):
+        add(random.choice([1, 1, 1, 2, 3]))
+    lock_path = os.path.join(tempfile.mkdtemp(), 'dispatcher.lock')
+    dispatcher = NotificationDispatcher(engine, lambda: connect(db_path), poll_interval=0.2,
+                                        max_workers=8, lock_path=lock_path).start()
+    started = time.time()
+    while time.time() - started < duration:
+        add(random.choice([4, 5]))
+        dispatcher.wake()
+        time.sleep(critical_every)
+    while pending_count():
+        time.sleep(0.1)
+    dispatcher.close()
+
+    print(f"{'priority':>8} {'sent':>6} {'p50 ms':>10} {'p99 ms':>10} {'target ms':>10}")
+    for priority in sorted(engine.latencies, reverse=True):
+        values = engine.latencies[priority]
+        print(f"{priority:>8} {len(values):>6} {statistics.median(values):>10.1f} "
+              f"{_percentile(values, 0.99):>10.1f} {dispatcher.scheduler.target(priority) * 1000:>10}")
+
+
+if __name__ == '__main__':
+    run_benchmark()
@@ -0,0 +1,132 @@
+"""Process-wide cache for read-query results across Streamlit reruns.
+
+Every widget interaction reruns the whole script, so pages recompute the same
+summaries many times a minute while nothing has changed. QueryCache holds results
+keyed by query name and arguments. Each result has a TTL and a set of tags such as
+'attendance' or 'notifications'. A write invalidates every result carrying one of
+its tags.
+
+instrument() applies this to an engine instance. Read methods are wrapped to go
+through the cache, and write methods are wrapped to invalidate their tags. Because
+the engine instances are shared through the engine registry, a write from any
+session or background thread (the dispatcher, the outbox) invalidates the cache
+for everyone. The TTL bounds staleness from writes made by other processes.
+
+Cached values are shared between sessions and must be treated as read-only.
+"""
+import functools
+import threading
+import time
+
+
+class QueryCache:
+    """TTL cache with tag-based invalidation and hit/miss statistics"""
+
+    def __init__(self, default_ttl=30.0, max_entries=2048):
+        self.default_ttl = default_ttl
+        self.max_entries = max_entries
+        self._entries = {}
+        self._tag_versions = {}
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'invalidations': 0, 'evictions': 0, 'uncacheable': 0}
+
+    def _versions(self, tags):
+        return tuple(self._tag_versions.get(tag, 0) for tag in tags)
+
+    def get(self, key, compute, ttl=None, tags=()):
+        """Return the cached value for key, calling compute() on a miss"""
+        tags = tuple(tags)
+        try:
+            hash(key)
+        except TypeError:
+            with self._lock:
+                self._stats['uncacheable'] += 1
+            return compute()
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > now and entry[2] == self._versions(entry[3]):
+                self._stats['hits'] += 1
+                return entry[1]
+            self._stats['misses'] += 1
+            versions = self._versions(tags)
+        value = compute()
+        with self._lock:
+            # Not stored if a write invalidated these tags while computing
+            if versions == self._versions(tags):
+                self._entries.pop(key, None)
+                self._entries[key] = (now + (self.default_ttl if ttl is None else ttl), value, versions, tags)
+                self._evict(now)
+        return value
+
+    def _evict(self, now):
+        if len(self._entries) <= self.max_entries:
+            return
+        for key in [key for key, entry in self._entries.items() if entry[0] <= now]:
+            del self._entries[key]
+            self._stats['evictions'] += 1
+        while len(self._entries) > self.max_entries:
+            # Oldest insertion first
+            del self._entries[next(iter(self._entries))]
+            self._stats['evictions'] += 1
+
+    def invalidate(self, *tags):
+        """Drop every result carrying any of tags, or everything when no tags are given"""
+        with self._lock:
+            self._stats['invalidations'] += 1
+            if not tags:
+                tags = set(self._tag_versions).union(*(entry[3] for entry in self._entries.values()))
+            for tag in tags:
+                self._tag_versions[tag] = self._tag_versions.get(tag, 0) + 1
+            for key in [key for key, entry in self._entries.items() if set(entry[3]) & set(tags)]:
+                del self._entries[key]
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats, entries=len(self._entries))
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = round(stats['hits'] / lookups * 100, 1) if lookups else 0.0
+        return stats
+
+
+def _freeze(value):
+    if isinstance(value, dict):
+        return tuple(sorted((k, _freeze(v)) for k, v in value.items()))
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(v) for v in value)
+    return value
+
+
+def instrument(engine, cache, reads=None, writes=None, namespace=None):
+    """Route engine's read methods through cache and make its write methods invalidate it
+
+    reads maps method name to (ttl, tags); writes maps method name to tags. Methods the
+    engine does not have are skipped.
+    """
+    namespace = namespace or type(engine).__name__
+
+    def cached(name, method, ttl, tags):
+        @functools.wraps(method)
+        def wrapper(*args, **kwargs):
+            key = (namespace, name, _freeze(args), _freeze(kwargs))
+            return cache.get(key, lambda: method(*args, **kwargs), ttl=ttl, tags=tags)
+        return wrapper
+
+    def invalidating(method, tags):
+        @functools.wraps(method)
+        def wrapper(*args, **kwargs):
+            try:
+                return method(*args, **kwargs)
+            finally:
+                cache.invalidate(*tags)
+        return wrapper
+
+    for name, (ttl, tags) in (reads or {}).items():
+        method = getattr(engine, name, None)
+        if callable(method):
+            setattr(engine, name, cached(name, method, ttl, tuple(tags)))
+    for name, tags in (writes or {}).items():
+        method = getattr(engine, name, None)
+        if callable(method):
+            setattr(engine, name, invalidating(method, tuple(tags)))
+    return engine
@@ -0,0 +1,159 @@
+"""Wake-on-due delivery of notifications created with scheduled_for.
+
+ScheduledNotificationTimer keeps only the upcoming window of scheduled notifications
+(one hour by default) in a heap. The window is loaded with an indexed range query on
+(status, scheduled_for). The timer thread sleeps on a condition variable until the
+earlier of the next due time and the end of the window. Tens of thousands of future
+reminders therefore cost no CPU between due times, and only the rows inside the
+window are held in memory. After a restart the window is simply reloaded from the
+database.
+
+on_due returns the futures of the sends it started. A row counts as fired only
+once it has futures. In a process that is not dispatching, on_due returns none,
+so the rows are retried every retry_interval and are picked up after a failover.
+"""
+import heapq
+import sqlite3
+import threading
+from datetime import datetime, timedelta
+
+from db_access import sql_timestamp
+from priority_scheduler import parse_timestamp
+
+SCHEDULE_INDEX_SQL = (
+    "CREATE INDEX IF NOT EXISTS idx_notifications_status_scheduled "
+    "ON notifications(status, scheduled_for)"
+)
+
+
+class ScheduledNotificationTimer:
+    """Fire on_due(notifications) when scheduled notifications become due"""
+
+    def __init__(self, connect, on_due, window=timedelta(hours=1), retry_interval=timedelta(seconds=30)):
+        self._connect = connect
+        self.on_due = on_due
+        self.window = window
+        self.retry_interval = retry_interval
+        self._heap = []
+        self._fired = set()
+        self._window_end = None
+        self._reload = True
+        self._stop = False
+        self._cond = threading.Condition()
+        self._thread = None
+        self.stats = {'loaded': 0, 'fired': 0, 'reloads': 0, 'next_due': None}
+
+    def _query(self, sql, params=()):
+        conn = self._connect()
+        try:
+            return conn.execute(sql, params).fetchall()
+        finally:
+            conn.close()
+
+    def ensure_index(self):
+        conn = self._connect()
+        try:
+            conn.execute(SCHEDULE_INDEX_SQL)
+            conn.commit()
+        finally:
+            conn.close()
+
+    def _load_window(self, now):
+        window_end = now + self.window
+        rows = self._query(
+            "SELECT id, scheduled_for FROM notifications "
+            "WHERE status = 'pending' AND scheduled_for IS NOT NULL AND scheduled_for <= ? "
+            "ORDER BY scheduled_for",
+            (sql_timestamp(window_end),)
+        )
+        heap = []
+        for row in rows:
+            due = parse_timestamp(row['scheduled_for'])
+            if due is not None and row['id'] not in self._fired:
+                heap.append((due, row['id']))
+        heapq.heapify(heap)
+        # Rows fired earlier that are still pending are in flight; forget the rest
+        self._fired &= {row['id'] for row in rows}
+        self._heap = heap
+        self._window_end = window_end
+        self._reload = False
+        self.stats['loaded'] = len(heap)
+        self.stats['reloads'] += 1
+
+    def _fetch(self, notification_ids):
+        placeholders = ','.join('?' * len(notification_ids))
+        rows = self._query(
+            f"SELECT * FROM notifications WHERE status = 'pending' AND id IN ({placeholders})",
+            tuple(notification_ids)
+        )
+        return [dict(row) for row in rows]
+
+    def _run(self):
+        while True:
+            with self._cond:
+                if self._stop:
+                    return
+                now = datetime.now()
+                if self._reload or now >= self._window_end:
+                    try:
+                        self._load_window(now)
+                    except Exception:
+                        # Database unavailable: retry in a minute
+                        self._heap, self._window_end = [], now + timedelta(minutes=1)
+                        self._reload = False
+                due_ids = []
+                while self._heap and self._heap[0][0] <= now:
+                    due_ids.append(heapq.heappop(self._heap)[1])
+                if not due_ids:
+                    wake_at = self._heap[0][0] if self._heap else self._window_end
+                    self.stats['next_due'] = self._heap[0][0] if self._heap else None
+                    self._cond.wait(max((min(wake_at, self._window_end) - now).total_seconds(), 0.0))
+                    continue
+            try:
+                notifications = self._fetch(due_ids)
+                futures = self.on_due(notifications) if notifications else None
+            except Exception:
+                # Leave the rows pending; they are picked up again on the next reload
+                with self._cond:
+                    self._reload = True
+                continue
+            with self._cond:
+                if futures:
+                    self._fired.update(notification['id'] for notification in notifications)
+                    self.stats['fired'] += len(notifications)
+                else:
+                    # Nothing was sent (this process is not dispatching): try again later
+                    retry_at = datetime.now() + self.retry_interval
+                    for notification in notifications:
+                        heapq.heappush(self._heap, (retry_at, notification['id']))
+
+    def start(self):
+        try:
+            self.ensure_index()
+        except sqlite3.Error:
+            # The table may not exist yet; the window query retries until it does
+            pass
+        if self._thread is None or not self._thread.is_alive():
+            self._stop = False
+            self._thread = threading.Thread(target=self._run, name='scheduled-notifications', daemon=True)
+            self._thread.start()
+        return self
+
+    def refresh(self):
+        """Reload the window, e.g. after a notification was scheduled inside it"""
+        with self._cond:
+            self._reload = True
+            self._cond.notify()
+
+    def schedule(self, scheduled_for):
+        """Note a newly created notification; only reloads if it falls inside the window"""
+        due = parse_timestamp(scheduled_for)
+        if due is not None and (self._window_end is None or due <= self._window_end):
+            self.refresh()
+
+    def close(self):
+        with self._cond:
+            self._stop = True
+            self._cond.notify()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
@@ -0,0 +1,203 @@
+"""Batched, cached sentiment inference in front of AIFeatures.
+
+SentimentService coalesces concurrent analyze() calls, from any session or thread,
+into micro-batches of up to max_batch texts. A batch is flushed after at most
+max_wait_ms, and each batch runs as a single transformer forward pass. If a batch
+fails, its texts go through the original analyze_sentiment one by one. Results are
+cached in an LRU keyed by a content hash, so repeated texts skip inference.
+Inference can be made cheaper on CPU by capping max_length and by applying int8
+dynamic quantization to the model's Linear layers.
+
+Batching needs the transformers pipeline that AIFeatures holds under one of
+_PIPELINE_ATTRIBUTES. Without it, texts still go through analyze_sentiment one by
+one; a warning is logged and stats() reports 'pipeline': False.
+"""
+import hashlib
+import logging
+import queue
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+
+_PIPELINE_ATTRIBUTES = ('sentiment_pipeline', 'sentiment_analyzer', 'sentiment_model', 'classifier')
+logger = logging.getLogger(__name__)
+
+_INDEXED_LABELS = {
+    2: {'label_0': 'negative', 'label_1': 'positive'},
+    3: {'label_0': 'negative', 'label_1': 'neutral', 'label_2': 'positive'},
+}
+
+
+def _content_key(text, max_length):
+    return hashlib.sha1(f"{max_length}:{text}".encode('utf-8')).hexdigest()
+
+
+def _sentiment_label(label, n_labels):
+    label = str(label).lower()
+    if label in _INDEXED_LABELS.get(n_labels, {}):
+        return _INDEXED_LABELS[n_labels][label]
+    for prefix, sentiment in (('pos', 'positive'), ('neg', 'negative'), ('neu', 'neutral')):
+        if label.startswith(prefix):
+            return sentiment
+    return label
+
+
+def sentiment_score(result):
+    """Map a sentiment result to a 0 (negative) .. 1 (positive) score"""
+    scores = result.get('scores') or {}
+    if 'positive' in scores:
+        return scores['positive']
+    confidence = float(result.get('confidence', 1.0))
+    sentiment = result.get('sentiment')
+    if sentiment == 'positive':
+        return confidence
+    if sentiment == 'negative':
+        return 1.0 - confidence
+    return 0.5
+
+
+class SentimentService:
+    """Micro-batching, caching wrapper around AIFeatures.analyze_sentiment"""
+
+    def __init__(self, ai_features, max_batch=32, max_wait_ms=10, cache_size=4096, max_length=512):
+        self.ai_features = ai_features
+        self._analyze_one = ai_features.analyze_sentiment
+        self.max_batch = max_batch
+        self.max_wait_ms = max_wait_ms
+        self.max_length = max_length
+        self.cache_size = cache_size
+        self.quantized = False
+        self._cache = OrderedDict()
+        self._cache_lock = threading.Lock()
+        self._queue = queue.Queue()
+        self._stats = {'requests': 0, 'cache_hits': 0, 'batches': 0, 'batched_texts': 0, 'fallbacks': 0}
+        self._warned = False
+        self._worker = threading.Thread(target=self._run, name='sentiment-batcher', daemon=True)
+        self._worker.start()
+
+    def _pipeline(self):
+        for attr in _PIPELINE_ATTRIBUTES:
+            pipeline = getattr(self.ai_features, attr, None)
+            if callable(pipeline) and hasattr(pipeline, 'model'):
+                return pipeline
+        if not self._warned:
+            self._warned = True
+            logger.warning("%s has none of %s; sentiment is analyzed one text at a time without batching",
+                           type(self.ai_features).__name__, ', '.join(_PIPELINE_ATTRIBUTES))
+        return None
+
+    def configure(self, max_length=None, max_batch=None, quantize=None):
+        """Apply settings from the AI Configuration tab"""
+        if max_length is not None:
+            self.max_length = int(max_length)
+        if max_batch is not None:
+            self.max_batch = max(1, int(max_batch))
+        if quantize and not self.quantized:
+            pipeline = self._pipeline()
+            if pipeline is None:
+                return False
+            import torch
+            pipeline.model = torch.quantization.quantize_dynamic(pipeline.model, {torch.nn.Linear}, dtype=torch.qint8)
+            self.quantized = True
+        return True
+
+    def stats(self):
+        with self._cache_lock:
+            stats = dict(self._stats, cache_entries=len(self._cache), max_batch=self.max_batch,
+                         max_length=self.max_length, quantized=self.quantized)
+        stats['pipeline'] = self._pipeline() is not None
+        return stats
+
+    def _cache_get(self, key):
+        with self._cache_lock:
+            result = self._cache.get(key)
+            if result is not None:
+                self._cache.move_to_end(key)
+                self._stats['cache_hits'] += 1
+            return result
+
+    def _cache_put(self, key, result):
+        with self._cache_lock:
+            self._cache[key] = result
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def _infer(self, texts):
+        pipeline = self._pipeline()
+        if pipeline is None:
+            return [self._analyze_one(text) for text in texts]
+        outputs = pipeline(list(texts), batch_size=len(texts), truncation=True,
+                           max_length=self.max_length, top_k=None)
+        results = []
+        for scores in outputs:
+            scores = scores if isinstance(scores, list) else [scores]
+            best = max(scores, key=lambda s: s['score'])
+            results.append({
+                'sentiment': _sentiment_label(best['label'], len(scores)),
+                'confidence': float(best['score']),
+                'scores': {_sentiment_label(s['label'], len(scores)): float(s['score']) for s in scores},
+            })
+        return results
+
+    def _run(self):
+        wait = self.max_wait_ms / 1000.0
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < self.max_batch:
+                try:
+                    batch.append(self._queue.get(timeout=wait))
+                except queue.Empty:
+                    break
+            # The same text may be queued twice by concurrent callers; infer it once
+            futures_by_key = OrderedDict()
+            for key, text, future in batch:
+                futures_by_key.setdefault(key, (text, []))[1].append(future)
+            try:
+                results = self._infer([text for text, _ in futures_by_key.values()])
+            except Exception:
+                # A failed batch falls back to the original method, one text at a time,
+                # so its own error handling and result contract apply
+                self._fallback(futures_by_key)
+                continue
+            with self._cache_lock:
+                self._stats['batches'] += 1
+                self._stats['batched_texts'] += len(futures_by_key)
+            for (key, (_, futures)), result in zip(futures_by_key.items(), results):
+                self._cache_put(key, result)
+                for future in futures:
+                    future.set_result(result)
+
+    def _fallback(self, futures_by_key):
+        with self._cache_lock:
+            self._stats['fallbacks'] += len(futures_by_key)
+        for key, (text, futures) in futures_by_key.items():
+            try:
+                result = self._analyze_one(text)
+            except Exception as e:
+                for future in futures:
+                    future.set_exception(e)
+                continue
+            for future in futures:
+                future.set_result(result)
+
+    def submit(self, text):
+        """Return a Future of the sentiment result for text"""
+        with self._cache_lock:
+            self._stats['requests'] += 1
+        key = _content_key(text, self.max_length)
+        future = Future()
+        cached = self._cache_get(key)
+        if cached is not None:
+            future.set_result(cached)
+        else:
+            self._queue.put((key, text, future))
+        return future
+
+    def analyze(self, text):
+        return self.submit(text).result()
+
+    def analyze_batch(self, texts):
+        """Analyze many texts; misses are queued together so they share batches"""
+        futures = [self.submit(text) for text in texts]
+        return [future.result() for future in futures]
@@ -0,0 +1,209 @@
+"""Session and permission caching for StudentAuth, InstructorAuth and AdminAuth.
+
+One page render used to verify the same session and look up the same user several
+times, and each of those calls hit the auth storage. CachedAuth wraps a session's
+auth object and answers repeated calls in three layers:
+
+1. A per-rerun memo. The same call twice in one script run is answered once.
+2. A verified-session cache. After storage has verified a session once, the proxy
+   keeps that result in server memory until verify_ttl expires. Later reruns
+   reuse it without a storage lookup. The result never leaves server memory, so
+   it is a plain expiring entry rather than a signed token.
+3. A short-TTL cache of info and permission lookups, shared by the process
+   (SessionCache.results).
+
+Revocation: logging out, or any call that changes users or sessions, revokes the
+session and drops its cached results. Revoked ids are written to a small SQLite
+table that every process polls with one indexed query every few seconds. Cached
+verifications of revoked sessions are then dropped everywhere, and the next call
+goes back to storage.
+"""
+import threading
+import time
+
+from query_cache import QueryCache
+
+# Auth methods whose results can be cached, and those that change sessions or users
+READ_METHODS = (
+    'verify_student_session', 'get_student_info', 'has_student_permission',
+    'verify_instructor_session', 'get_instructor_info', 'has_instructor_permission',
+    'verify_session', 'get_user_info', 'has_permission',
+)
+WRITE_PREFIXES = ('logout', 'revoke', 'delete', 'update', 'change', 'deactivate', 'remove', 'reset', 'set_')
+
+REVOCATION_SCHEMA = """
+CREATE TABLE IF NOT EXISTS revoked_sessions (
+    session_id TEXT NOT NULL UNIQUE,
+    revoked_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+"""
+
+
+def is_verified(result):
+    """Whether a verify_* result means success: (ok, info) tuples or a plain truthy value"""
+    if isinstance(result, (tuple, list)):
+        return bool(result) and bool(result[0])
+    return bool(result)
+
+
+class RevocationList:
+    """Revoked session ids, shared between processes through SQLite"""
+
+    def __init__(self, connect=None, write=None, poll_interval=2.0):
+        self._connect = connect
+        # SQLiteDatabase.write, so a revocation shares the group commit with other small writes
+        self._write = write
+        self.poll_interval = poll_interval
+        self._revoked = set()
+        self._last_rowid = 0
+        self._polled_at = 0.0
+        self._ready = False
+        self._lock = threading.Lock()
+
+    def _open(self):
+        conn = self._connect()
+        if not self._ready:
+            conn.executescript(REVOCATION_SCHEMA)
+            conn.commit()
+            self._ready = True
+        return conn
+
+    def _poll(self):
+        if self._connect is None or time.monotonic() - self._polled_at < self.poll_interval:
+            return
+        with self._lock:
+            self._polled_at = time.monotonic()
+            conn = self._open()
+            try:
+                rows = conn.execute(
+                    "SELECT rowid, session_id FROM revoked_sessions WHERE rowid > ? ORDER BY rowid", (self._last_rowid,)
+                ).fetchall()
+            finally:
+                conn.close()
+            for row in rows:
+                self._revoked.add(row[1])
+                self._last_rowid = row[0]
+
+    def revoke(self, session_id):
+        with self._lock:
+            self._revoked.add(session_id)
+        if self._connect is None:
+            return
+        sql, params = "INSERT OR IGNORE INTO revoked_sessions (session_id) VALUES (?)", (session_id,)
+        conn = self._open()
+        if self._write is not None:
+            conn.close()
+            self._write(sql, params).result()
+            return
+        try:
+            conn.execute(sql, params)
+            conn.commit()
+        finally:
+            conn.close()
+
+    def is_revoked(self, session_id):
+        self._poll()
+        return session_id in self._revoked
+
+
+class SessionCache:
+    """Process-wide revocation list and TTL cache of auth lookups"""
+
+    def __init__(self, connect=None, write=None, verify_ttl=300.0, result_ttl=30.0):
+        self.verify_ttl = verify_ttl
+        self.revocations = RevocationList(connect, write)
+        self.results = QueryCache(default_ttl=result_ttl)
+        self._stats = {'memo_hits': 0, 'verified_hits': 0, 'storage_lookups': 0, 'revocations': 0}
+        self._stats_lock = threading.Lock()
+
+    def count(self, stat):
+        with self._stats_lock:
+            self._stats[stat] += 1
+
+    def revoke(self, session_id):
+        self.revocations.revoke(session_id)
+        self.results.invalidate(f"session:{session_id}")
+        self.count('revocations')
+
+    def stats(self):
+        with self._stats_lock:
+            stats = dict(self._stats)
+        cache = self.results.stats()
+        stats.update(cached_hits=cache['hits'], cached_entries=cache['entries'])
+        return stats
+
+
+class CachedAuth:
+    """Per-session proxy for an auth object that caches session and permission lookups"""
+
+    def __init__(self, auth, role, session_cache):
+        self.auth = auth
+        self.role = role
+        self.session_cache = session_cache
+        self._memo = {}
+        # (verify method, session id) -> (expiry, the successful verification result)
+        self._verified = {}
+
+    def begin_rerun(self):
+        """Start a new script run: the per-rerun memo only lives for one run"""
+        self._memo = {}
+
+    def _forget(self, session_id):
+        for key in [key for key in self._verified if key[1] == session_id]:
+            del self._verified[key]
+
+    def _read(self, name, method, args, kwargs):
+        cache = self.session_cache
+        session_id = args[0] if args else kwargs.get('session_id')
+        key = (name, args, tuple(sorted(kwargs.items())))
+        try:
+            if key in self._memo:
+                cache.count('memo_hits')
+                return self._memo[key]
+        except TypeError:
+            return method(*args, **kwargs)
+        verified = self._verified.get((name, session_id))
+        if session_id is None or cache.revocations.is_revoked(session_id):
+            self._forget(session_id)
+            result = method(*args, **kwargs)
+        elif name.startswith('verify') and verified is not None and verified[0] > time.monotonic():
+            cache.count('verified_hits')
+            result = verified[1]
+        else:
+            def lookup():
+                cache.count('storage_lookups')
+                return method(*args, **kwargs)
+            result = cache.results.get((self.role,) + key, lookup, tags=(f"session:{session_id}", self.role))
+            if name.startswith('verify'):
+                if is_verified(result):
+                    self._verified[(name, session_id)] = (time.monotonic() + cache.verify_ttl, result)
+                else:
+                    self._verified.pop((name, session_id), None)
+        self._memo[key] = result
+        return result
+
+    def _write(self, name, method, args, kwargs):
+        try:
+            return method(*args, **kwargs)
+        finally:
+            self._memo = {}
+            if name.startswith('logout') and args and isinstance(args[0], str):
+                self._forget(args[0])
+                self.session_cache.revoke(args[0])
+            else:
+                # A user or permission change can affect any session of this role
+                self._verified.clear()
+                self.session_cache.results.invalidate(self.role)
+
+    def __getattr__(self, name):
+        attr = getattr(self.auth, name)
+        if not callable(attr):
+            return attr
+        if name in READ_METHODS:
+            return lambda *args, **kwargs: self._read(name, attr, args, kwargs)
+        if name.startswith(WRITE_PREFIXES):
+            return lambda *args, **kwargs: self._write(name, attr, args, kwargs)
+        return attr
+
+    def __repr__(self):
+        return f"CachedAuth({self.role!r}, {self.auth!r})"
@@ -1,9 +1,5 @@
 import streamlit as st
-import cv2
 import numpy as np
-import pandas as pd
-import plotly.express as px
-import plotly.graph_objects as go
 from datetime import datetime, timedelta
 import io
 import base64
@@ -11,12 +7,12 @@ from PIL import Image
 import time
 import json
 import os
+import sqlite3
 
 # Import our custom modules
-from attendance_system import AttendanceSystem
-from notification_engine import NotificationEngine
-from ai_features import AIFeatures
-from database import DatabaseManager
+from engine_registry import get_engine_registry, get_face_index, invalidate_rosters
+from lazy_imports import lazy_import, import_metrics, prewarm
+from session_cache import CachedAuth
 from config import STREAMLIT_THEME
 from admin_auth import AdminAuth, show_admin_login, show_admin_logout, check_admin_auth, require_admin_auth, show_admin_dashboard, show_user_management, show_system_settings, show_system_logs
 from user_auth import StudentAuth, show_student_login, show_student_logout, check_student_auth, require_student_auth, show_student_profile, show_student_dashboard, show_student_attendance, show_student_reports
@@ -24,6 +20,12 @@ from instructor_auth import InstructorAuth, show_instructor_login, show_instruct
 from instructor_features import show_instructor_class_management, show_instructor_class_attendance, show_instructor_notifications, show_instructor_reports
 from style import GLOBAL_CSS, with_primary_color
 
+# Heavy modules are imported by the first page that uses them, not before login
+cv2 = lazy_import('cv2')
+pd = lazy_import('pandas')
+px = lazy_import('plotly.express')
+go = lazy_import('plotly.graph_objects')
+
 # Page configuration
 st.set_page_config(
     page_title="Smart Notification App",
@@ -106,27 +108,188 @@ def show_browser_notification(title, body):
 st.markdown(GLOBAL_CSS, unsafe_allow_html=True)
 
 # Initialize session state
-if 'attendance_system' not in st.session_state:
-    st.session_state.attendance_system = AttendanceSystem()
-if 'notification_engine' not in st.session_state:
-    st.session_state.notification_engine = NotificationEngine()
-if 'ai_features' not in st.session_state:
-    st.session_state.ai_features = AIFeatures()
-if 'db' not in st.session_state:
-    st.session_state.db = DatabaseManager()
-if 'admin_auth' not in st.session_state:
-    st.session_state.admin_auth = AdminAuth()
+# Heavy engines are shared by every session; sessions only keep handles to them
+engine_registry = get_engine_registry()
+for engine_name in ('attendance_system', 'notification_engine', 'ai_features', 'db'):
+    if engine_name not in st.session_state:
+        st.session_state[engine_name] = engine_registry.handle(engine_name)
+if 'face_settings' not in st.session_state:
+    st.session_state.face_settings = {'tolerance': 0.6, 'model': 'hog', 'detect_max_side': 800, 'upsample': 1}
+# Auth objects stay per session, behind a proxy that caches session and permission lookups
+session_cache = engine_registry.get('session_cache')
+for auth_name, auth_class, role in (('admin_auth', AdminAuth, 'admin'),
+                                    ('student_auth', StudentAuth, 'student'),
+                                    ('instructor_auth', InstructorAuth, 'instructor')):
+    if not isinstance(st.session_state.get(auth_name), CachedAuth):
+        st.session_state[auth_name] = CachedAuth(auth_class(), role, session_cache)
+    st.session_state[auth_name].begin_rerun()
 if 'admin_page' not in st.session_state:
     st.session_state.admin_page = "dashboard"
-if 'student_auth' not in st.session_state:
-    st.session_state.student_auth = StudentAuth()
 if 'student_page' not in st.session_state:
     st.session_state.student_page = "dashboard"
-if 'instructor_auth' not in st.session_state:
-    st.session_state.instructor_auth = InstructorAuth()
 if 'instructor_page' not in st.session_state:
     st.session_state.instructor_page = "dashboard"
 
+def get_detection_config():
+    """Build the face detection cascade settings chosen on the Settings page"""
+    from face_pipeline import DetectionConfig
+    face_settings = st.session_state.face_settings
+    return DetectionConfig(
+        model=face_settings['model'],
+        detect_max_side=face_settings['detect_max_side'],
+        upsample=face_settings['upsample']
+    )
+
+def record_attendance(result):
+    """Write attendance rows for a result that did not come from mark_attendance
+
+    If the rows cannot be written, the result is marked unsuccessful and carries the
+    reason in result['error'], so the page reports it like any other failure.
+    """
+    from person_attendance import AttendanceUnavailable, record_attendance as write_attendance
+    if not result['success']:
+        return False
+    try:
+        recorded = write_attendance(engine_registry.get('sqlite'), result['recognized_faces'])
+    except AttendanceUnavailable as e:
+        result['success'] = False
+        result['error'] = f"Faces were recognized, but attendance could not be recorded: {e}"
+        return False
+    if recorded:
+        engine_registry.get('query_cache').invalidate('attendance')
+    return True
+
+def show_stage_timings(result):
+    """Caption the time face_pipeline spent in each stage of a photo"""
+    timings = result.get('timings') or {}
+    stages = [(label, timings[key]) for key, label in (('decode_ms', 'decode'), ('downscale_ms', 'downscale'),
+              ('detect_ms', 'detect'), ('encode_ms', 'encode'), ('match_ms', 'match')) if key in timings]
+    if stages:
+        st.caption(" · ".join(f"{label} {ms:.0f} ms" for label, ms in stages))
+
+def mark_attendance_from_upload(image_bytes, index=None):
+    """Recognize an uploaded photo on the face workers and record attendance for the matches
+
+    Uploads use the same detection cascade (Settings > Face Recognition) and face
+    index as the stream and bulk paths, so bulk-registered people are recognized too.
+    Pass a roster index to match against one class instead of everyone.
+    """
+    from face_pipeline import PoolBusy
+    try:
+        future = engine_registry.get('face_workers').recognize(
+            image_bytes, index if index is not None else get_face_index(engine_registry), config=get_detection_config(),
+            tolerance=st.session_state.face_settings['tolerance'], timeout=30
+        )
+    except PoolBusy as e:
+        return {'success': False, 'recognized_faces': [], 'unknown_faces': [], 'error': str(e)}
+    result = future.result()
+    record_attendance(result)
+    return result
+
+def inbox_database():
+    """Return the shared notifications database with the inbox tables in place"""
+    from notification_inbox import ensure_inbox
+    sqlite_db = engine_registry.get('sqlite')
+    sqlite_db.ensure('inbox', ensure_inbox)
+    return sqlite_db
+
+def inbox_connection():
+    """Open a connection to the notifications database with the inbox tables in place"""
+    return inbox_database().connect()
+
+def analytics_connection():
+    """Open a connection to the notifications database with the analytics rollups in place"""
+    from analytics_rollups import ensure_rollups, ensure_attendance_rollups, compact_rollups
+    sqlite_db = engine_registry.get('sqlite')
+    sqlite_db.ensure('rollups', lambda conn: (ensure_rollups(conn), compact_rollups(conn)))
+    # Re-checked on every connection until AttendanceSystem has created its table
+    sqlite_db.ensure('attendance_rollups', ensure_attendance_rollups)
+    return sqlite_db.connect()
+
+def registered_people_count():
+    face_store = engine_registry.get('face_store')
+    face_store.refresh()
+    names = face_store.names
+    if not names and engine_registry.is_loaded('attendance_system'):
+        names = st.session_state.attendance_system.known_face_names
+    return len(set(names))
+
+def get_attendance_summary(days):
+    """Attendance summary for the last `days` days, read from the daily rollups"""
+    from analytics_rollups import attendance_summary
+    
+    def compute():
+        conn = analytics_connection()
+        try:
+            return attendance_summary(conn, days, registered_people=registered_people_count())
+        finally:
+            conn.close()
+    
+    return engine_registry.get('query_cache').get(('attendance_summary', days), compute,
+                                                  tags=('attendance', 'people'))
+
+def get_notification_analytics(days):
+    """Notification analytics for the last `days` days, read from the daily rollups"""
+    from analytics_rollups import notification_analytics
+    
+    def compute():
+        conn = analytics_connection()
+        try:
+            return notification_analytics(conn, days)
+        finally:
+            conn.close()
+    
+    return engine_registry.get('query_cache').get(('notification_analytics', days), compute,
+                                                  tags=('notifications',))
+
+def attendance_connection():
+    """Open a connection with the rollups and the per-person attendance index in place"""
+    from attendance_series import ensure_series_indexes
+    conn = analytics_connection()
+    engine_registry.get('sqlite').ensure('series_indexes', ensure_series_indexes)
+    return conn
+
+def get_attendance_trend(days, people=None, max_points=120):
+    """Daily attendance for the last `days` days as a chart DataFrame, downsampled for long ranges"""
+    from attendance_series import attendance_series, lttb
+    conn = attendance_connection()
+    try:
+        dates, counts = attendance_series(conn, datetime.now().date() - timedelta(days=days - 1), people=people)
+    finally:
+        conn.close()
+    dates, counts = lttb(dates, counts, max_points)
+    return pd.DataFrame({'Date': dates, 'Attendance': counts})
+
+LIVE_REFRESH_SECONDS = 5
+
+def live_fragment(run_every=LIVE_REFRESH_SECONDS):
+    """Rerun the decorated function on its own every run_every seconds (st.fragment)
+
+    Streamlit versions without fragments get the plain function, which then updates
+    on full reruns as before.
+    """
+    fragment = getattr(st, 'fragment', None) or getattr(st, 'experimental_fragment', None)
+    if fragment is None:
+        return lambda func: func
+    return fragment(run_every=run_every)
+
+def feed_connection():
+    """Open a connection with the change-version counter and history indexes in place"""
+    from change_feed import ensure_change_feed
+    from notification_queries import ensure_history_indexes
+    sqlite_db = engine_registry.get('sqlite')
+    sqlite_db.ensure('change_feed', ensure_change_feed)
+    sqlite_db.ensure('history_indexes', ensure_history_indexes)
+    return sqlite_db.connect()
+
+def live_feed(name, key, limit):
+    """This session's LiveFeed for a list, replaced when the list's filters (key) change"""
+    from change_feed import LiveFeed
+    feeds = st.session_state.setdefault('live_feeds', {})
+    if name not in feeds or feeds[name][0] != key:
+        feeds[name] = (key, LiveFeed(limit))
+    return feeds[name][1]
+
 def get_quick_meet_room():
     room_file = os.path.join('notifications', 'quick_meet_room.json')
     if os.path.exists(room_file):
@@ -188,6 +351,12 @@ def main():
                 show_instructor_login()
         # No extra info, no AI, no meet, no default credentials
         return
+    # User is logged in - load the heavy modules and engines in the background
+    prewarm([pd, px, go, cv2], engine_registry)
+    engine_registry.get('dispatcher')
+    engine_registry.get('scheduled_timer')
+    engine_registry.get('outbox')
+    
     # User is logged in - show appropriate interface
     if admin_logged_in:
         show_admin_interface()
@@ -364,10 +533,10 @@ def show_dashboard():
     st.header("📊 Dashboard Overview")
     
     # Get attendance summary
-    attendance_summary = st.session_state.attendance_system.get_attendance_summary(7)
+    attendance_summary = get_attendance_summary(7)
     
     # Get notification analytics
-    notification_analytics = st.session_state.notification_engine.get_notification_analytics(7)
+    notification_analytics = get_notification_analytics(7)
     
     # Key metrics
     col1, col2, col3, col4 = st.columns(4)
@@ -405,16 +574,8 @@ def show_dashboard():
     
     with col1:
         st.subheader("📈 Attendance Trend (Last 7 Days)")
-        if attendance_summary.get('today_attendance'):
-            # Create a simple attendance chart
-            dates = [datetime.now() - timedelta(days=i) for i in range(7, 0, -1)]
-            attendance_data = [attendance_summary.get('stats', {}).get('today_attendance', 0)] * 7
-            
-            df_attendance = pd.DataFrame({
-                'Date': dates,
-                'Attendance': attendance_data
-            })
-            
+        df_attendance = get_attendance_trend(7)
+        if df_attendance['Attendance'].any():
             fig_attendance = px.line(df_attendance, x='Date', y='Attendance', 
                                    title='Daily Attendance Count')
             st.plotly_chart(fig_attendance, use_container_width=True)
@@ -450,15 +611,31 @@ def show_dashboard():
             st.write("No recent attendance records")
     
     with col2:
-        st.write("**Recent Notifications:**")
-        recent_notifications = st.session_state.db.get_notifications(limit=5)
-        if recent_notifications:
-            # Play sound once per rerun when there are any notifications
+        show_recent_notifications()
+
+@live_fragment()
+def show_recent_notifications():
+    """Dashboard list that polls the change version and fetches only newer notifications"""
+    from notification_queries import query_notifications
+    st.write("**Recent Notifications:**")
+    feed = live_feed('dashboard', None, 5)
+    conn = feed_connection()
+    try:
+        new_notifications = feed.refresh(
+            conn, lambda after_id, before_id, limit: query_notifications(
+                conn, after_id=after_id, before_id=before_id, limit=limit
+            )['notifications']
+        )
+    finally:
+        conn.close()
+    if feed.rows:
+        if new_notifications:
+            # Announce notifications that arrived while the dashboard was open
             play_notification_sound()
-            for notification in recent_notifications:
-                st.write(f"• {notification['title']} - {notification['created_at']}")
-        else:
-            st.write("No recent notifications")
+        for notification in feed.rows:
+            st.write(f"• {notification['title']} - {notification['created_at']}")
+    else:
+        st.write("No recent notifications")
 
 def show_attendance_management():
     st.header("👥 Attendance Management")
@@ -485,6 +662,16 @@ def show_attendance_management():
                     
                     if success:
                         st.success(f"✅ {person_name} registered successfully!")
+                        # Persist exactly the new encoding so other sessions and processes see it
+                        attendance_system = st.session_state.attendance_system.engine
+                        known_names = attendance_system.known_face_names
+                        known_encodings = getattr(attendance_system, 'known_face_encodings', [])
+                        if person_name in known_names and len(known_encodings) == len(known_names):
+                            encoding = known_encodings[len(known_names) - 1 - known_names[::-1].index(person_name)]
+                            engine_registry.get('face_store').append(person_name, encoding)
+                            if engine_registry.is_loaded('face_index'):
+                                engine_registry.get('face_index').add(person_name, encoding)
+                            invalidate_rosters(engine_registry)
                         st.session_state.notification_engine.create_system_notification(
                             "Person Registered", f"{person_name} has been registered for attendance tracking"
                         )
@@ -501,6 +688,44 @@ def show_attendance_management():
             - Avoid sunglasses or hats
             - Single person per photo
             """)
+        
+        st.markdown("---")
+        st.subheader("Bulk Registration")
+        st.caption("Upload a ZIP of photos named after each person (e.g. Jane_Doe.jpg) or grouped in a folder per person (e.g. Jane Doe/front.jpg), or enter a folder on the server. Bulk-registered people are recognized by every photo, camera and stream attendance path.")
+        
+        col1, col2 = st.columns([1, 1])
+        with col1:
+            bulk_zip = st.file_uploader("Upload ZIP Archive", type=['zip'], key="bulk_register_zip")
+        with col2:
+            bulk_folder = st.text_input("Or Server Folder", placeholder="/path/to/photos")
+        
+        if st.button("Register All", type="primary"):
+            source = bulk_zip if bulk_zip is not None else bulk_folder.strip()
+            if not source:
+                st.warning("Please provide a ZIP archive or a folder")
+            elif isinstance(source, str) and not os.path.isdir(source):
+                st.error("❌ Folder not found")
+            else:
+                from bulk_registration import bulk_register
+                
+                with st.spinner("Registering photos..."):
+                    report = bulk_register(
+                        source,
+                        engine_registry.get('face_workers'),
+                        engine_registry.get('face_store'),
+                        index=get_face_index(engine_registry),
+                        config=get_detection_config()
+                    )
+                engine_registry.get('query_cache').invalidate('people')
+                invalidate_rosters(engine_registry)
+                
+                st.success(f"✅ Registered {report['registered']} people, {report['failed']} failed "
+                           f"({report['images_per_second']:.1f} images/s)")
+                st.dataframe(pd.DataFrame(report['rows']), use_container_width=True)
+                if report['registered']:
+                    st.session_state.notification_engine.create_system_notification(
+                        "Bulk Registration", f"{report['registered']} people have been registered for attendance tracking"
+                    )
     
     with tab2:
         st.subheader("Mark Attendance")
@@ -515,7 +740,7 @@ def show_attendance_management():
                     image_bytes = uploaded_attendance.read()
                     
                     with st.spinner("Processing attendance..."):
-                        result = st.session_state.attendance_system.mark_attendance(image_bytes=image_bytes)
+                        result = mark_attendance_from_upload(image_bytes)
                     
                     if result['success']:
                         st.success("✅ Attendance marked successfully!")
@@ -537,6 +762,7 @@ def show_attendance_management():
                         st.error("❌ Failed to mark attendance")
                         if 'error' in result:
                             st.error(f"Error: {result['error']}")
+                    show_stage_timings(result)
                 else:
                     st.warning("Please upload a photo")
         
@@ -563,7 +789,7 @@ def show_attendance_management():
                 st.rerun()
         
         # Get attendance data
-        attendance_summary = st.session_state.attendance_system.get_attendance_summary(days_filter)
+        attendance_summary = get_attendance_summary(days_filter)
         
         # Display statistics
         col1, col2, col3 = st.columns(3)
@@ -596,13 +822,14 @@ def show_attendance_management():
                 
                 # Process the captured image
                 if st.button("Process Captured Image"):
-                    # Convert frame to bytes
-                    _, buffer = cv2.imencode('.jpg', frame)
-                    image_bytes = buffer.tobytes()
+                    from face_pipeline import recognize_frame
                     
+                    # The frame is matched as an array, without a JPEG encode/decode round trip
                     with st.spinner("Processing..."):
-                        result = st.session_state.attendance_system.mark_attendance(image_bytes=image_bytes)
+                        result = recognize_frame(frame_rgb, get_face_index(engine_registry), config=get_detection_config(),
+                                                 tolerance=st.session_state.face_settings['tolerance'])
                     
+                    record_attendance(result)
                     if result['success']:
                         st.success("✅ Attendance processed!")
                         
@@ -615,9 +842,52 @@ def show_attendance_management():
                         # Create notification
                         st.session_state.notification_engine.create_attendance_notification(result)
                     else:
-                        st.error("❌ No faces recognized")
+                        st.error(f"❌ {result['error']}" if 'error' in result else "❌ No faces recognized")
+                    show_stage_timings(result)
             else:
                 st.error("❌ Failed to capture from camera")
+        
+        st.markdown("---")
+        st.subheader("Continuous Stream")
+        
+        col1, col2 = st.columns([2, 1])
+        with col1:
+            stream_source = st.text_input("Camera index or video file", value="0",
+                                          help="Use a camera index such as 0, or a path to a video file")
+        with col2:
+            stream_seconds = st.number_input("Duration (seconds)", min_value=5, max_value=300, value=30)
+        
+        if st.button("Start Stream Attendance"):
+            from video_attendance import VideoAttendanceStream
+            
+            source = int(stream_source) if stream_source.strip().isdigit() else stream_source.strip()
+            stream = VideoAttendanceStream(source, get_face_index(engine_registry), config=get_detection_config(),
+                                           tolerance=st.session_state.face_settings['tolerance'])
+            live = st.empty()
+            
+            def show_new_faces(tracks):
+                names = [track.name for track in tracks if track.name]
+                if names:
+                    live.write(f"👀 Recognized: {', '.join(names)}")
+            
+            with st.spinner("Watching stream..."):
+                result = stream.run(max_seconds=stream_seconds, on_new_faces=show_new_faces)
+            
+            record_attendance(result)
+            if result['success']:
+                st.success(f"✅ Recognized {len(result['recognized_faces'])} people")
+                for face in result['recognized_faces']:
+                    st.write(f"• {face['name']} ({face['confidence']:.2f})")
+                st.session_state.notification_engine.create_attendance_notification(result)
+            elif 'error' in result:
+                st.error(f"❌ {result['error']}")
+            else:
+                st.warning("No registered faces recognized in the stream")
+            
+            stats = result['stats']
+            st.caption(f"Frames: {stats['frames_read']} read, {stats['frames_processed']} processed, "
+                       f"{stats['frames_skipped']} skipped · {stats['faces_encoded']} faces encoded · "
+                       f"{stats['avg_process_ms']:.0f} ms/frame")
 
 def show_notifications():
     st.header("🔔 Smart Notifications")
@@ -642,7 +912,18 @@ def show_notifications():
             with col_priority:
                 priority = st.selectbox("Priority", [1, 2, 3, 4, 5], index=1)
             
-            ai_enhanced = st.checkbox("🤖 AI Enhanced", help="Use AI to improve notification content")
+            col_audience, col_target = st.columns(2)
+            with col_audience:
+                audience_type = st.selectbox("Audience", ["Everyone", "Major", "Department", "Year", "Class", "User"])
+            with col_target:
+                audience_value = st.text_input("Audience Value", placeholder="e.g. Computer Science",
+                                               disabled=audience_type == "Everyone")
+            
+            targeted = audience_type != "Everyone"
+            ai_enhanced = st.checkbox("🤖 AI Enhanced", help="Use AI to improve notification content",
+                                      disabled=targeted)
+            if targeted:
+                st.caption("AI enhancement only applies to notifications for everyone")
             schedule_notification = st.checkbox("📅 Schedule Notification")
             
             scheduled_time = None
@@ -650,25 +931,50 @@ def show_notifications():
                 scheduled_time = st.datetime_input("Schedule for", value=datetime.now() + timedelta(hours=1))
             
             if st.button("Create Notification", type="primary"):
-                if title and message:
-                    success = st.session_state.notification_engine.create_notification(
-                        title=title,
-                        message=message,
-                        notification_type=notification_type,
-                        priority=priority,
-                        scheduled_for=scheduled_time,
-                        ai_enhanced=ai_enhanced
-                    )
+                if targeted and not audience_value.strip():
+                    st.warning(f"Please enter the {audience_type.lower()} this notification is for")
+                elif title and message:
+                    failure = None
+                    if targeted:
+                        from notification_inbox import create_targeted_notification
+                        # Written with its audience rows in one transaction; it is never shown to everyone
+                        conn = inbox_connection()
+                        try:
+                            create_targeted_notification(
+                                conn, [f"{audience_type.lower()}:{audience_value.strip()}"],
+                                title=title, message=message, notification_type=notification_type,
+                                priority=priority, scheduled_for=scheduled_time
+                            )
+                            success = True
+                        except sqlite3.Error as e:
+                            success, failure = False, str(e)
+                        finally:
+                            conn.close()
+                        if success:
+                            engine_registry.get('query_cache').invalidate('notifications')
+                    else:
+                        success = st.session_state.notification_engine.create_notification(
+                            title=title,
+                            message=message,
+                            notification_type=notification_type,
+                            priority=priority,
+                            scheduled_for=scheduled_time,
+                            ai_enhanced=ai_enhanced
+                        )
                     
                     if success:
                         st.success("✅ Notification created successfully!")
+                        if priority >= 4:
+                            engine_registry.get('dispatcher').wake()
+                        if scheduled_time:
+                            engine_registry.get('scheduled_timer').schedule(scheduled_time)
                         # Play sound and show a browser notification preview
                         play_notification_sound()
                         show_browser_notification(title, message)
-                        if ai_enhanced:
+                        if ai_enhanced and not targeted:
                             st.info("🤖 AI has enhanced your notification content")
                     else:
-                        st.error("❌ Failed to create notification")
+                        st.error(f"❌ Failed to create notification{f': {failure}' if failure else ''}")
                 else:
                     st.warning("Please provide both title and message")
         
@@ -694,59 +1000,32 @@ def show_notifications():
     with tab2:
         st.subheader("Notification History")
         
+        search_text = st.text_input("🔍 Search", placeholder="e.g. exam room change")
+        
         # Filter options
-        col1, col2, col3 = st.columns(3)
+        col1, col2, col3, col4, col5 = st.columns(5)
         with col1:
             status_filter = st.selectbox("Status", ["All", "pending", "sent", "failed"])
         with col2:
             type_filter = st.selectbox("Type", ["All", "info", "warning", "error", "success", "attendance", "meeting", "system"])
         with col3:
+            priority_filter = st.selectbox("Priority", ["All", 1, 2, 3, 4, 5])
+        with col4:
+            date_range = st.date_input("Created", value=(), help="Leave empty for all dates")
+        with col5:
             limit = st.selectbox("Limit", [10, 25, 50, 100], index=1)
         
-        # Get notifications
-        notifications = st.session_state.db.get_notifications(limit=limit)
-        
-        # Filter notifications
-        if status_filter != "All":
-            notifications = [n for n in notifications if n['status'] == status_filter]
-        if type_filter != "All":
-            notifications = [n for n in notifications if n['notification_type'] == type_filter]
+        # Filters are applied in SQL; pages are addressed by cursor, not offset
+        filters = (search_text.strip(), status_filter, type_filter, priority_filter, tuple(date_range), limit)
+        if st.session_state.get('history_filters') != filters:
+            st.session_state.history_filters = filters
+            st.session_state.history_cursors = [None]
+        start = end = None
+        if len(date_range) >= 1:
+            start = date_range[0].isoformat()
+            end = (date_range[-1] + timedelta(days=1)).isoformat()
         
-        # Display notifications
-        for notification in notifications:
-            with st.container():
-                col1, col2, col3 = st.columns([3, 1, 1])
-                
-                with col1:
-                    st.write(f"**{notification['title']}**")
-                    st.write(notification['message'])
-                    st.caption(f"Created: {notification['created_at']}")
-                
-                with col2:
-                    priority_color = {
-                        1: "🟢", 2: "🟡", 3: "🟠", 4: "🔴", 5: "🚨"
-                    }
-                    st.write(f"{priority_color.get(notification['priority'], '⚪')} Priority {notification['priority']}")
-                    st.write(f"Type: {notification['notification_type']}")
-                
-                with col3:
-                    status_color = {
-                        'pending': '🟡',
-                        'sent': '✅',
-                        'failed': '❌'
-                    }
-                    st.write(f"{status_color.get(notification['status'], '❓')} {notification['status'].title()}")
-                    
-                    if notification['status'] == 'pending':
-                        if st.button(f"Send", key=f"send_{notification['id']}"):
-                            success = st.session_state.notification_engine.send_notification(notification['id'])
-                            if success:
-                                st.success("Sent!")
-                                play_notification_sound()
-                                show_browser_notification(notification['title'], notification['message'])
-                                st.rerun()
-                            else:
-                                st.error("Failed to send")
+        show_notification_history(search_text, status_filter, type_filter, priority_filter, start, end, limit)
     
     with tab3:
         st.subheader("Send Notifications")
@@ -755,9 +1034,25 @@ def show_notifications():
         
         with col1:
             st.write("**Process Notification Queue**")
+            dispatcher = engine_registry.get('dispatcher')
+            dispatcher_metrics = dispatcher.metrics()
+            if dispatcher_metrics['is_leader']:
+                st.caption(f"🟢 Background dispatcher active · {dispatcher_metrics['queue_depth']} queued · "
+                           f"{dispatcher_metrics['in_flight']} in flight · {dispatcher_metrics['throughput_per_minute']}/min · "
+                           f"{dispatcher_metrics['sent']} sent, {dispatcher_metrics['failed']} failed")
+                for priority, latency in sorted(dispatcher_metrics['latency_by_priority'].items(), reverse=True):
+                    within_target = "✅" if latency['p99'] <= latency['target'] else "⚠️"
+                    st.caption(f"{within_target} Priority {priority}: p50 {latency['p50']:.1f}s · "
+                               f"p99 {latency['p99']:.1f}s · target {latency['target']}s")
+            else:
+                st.caption("⏸️ Another app process is dispatching notifications")
+            outbox_counts = engine_registry.get('outbox').counts()
+            if outbox_counts.get('retry') or outbox_counts.get('dead'):
+                st.caption(f"🔁 {outbox_counts.get('retry', 0)} awaiting retry · "
+                           f"💀 {outbox_counts.get('dead', 0)} dead-lettered")
             if st.button("Process All Pending", type="primary"):
                 with st.spinner("Processing notifications..."):
-                    sent_count = st.session_state.notification_engine.process_notification_queue()
+                    sent_count = dispatcher.run_once()
                 st.success(f"✅ Sent {sent_count} notifications!")
                 if sent_count:
                     play_notification_sound()
@@ -776,6 +1071,119 @@ def show_notifications():
                 play_notification_sound()
                 show_browser_notification("System Test", "Notification system test completed")
 
+@live_fragment()
+def show_notification_history(search_text, status_filter, type_filter, priority_filter, start, end, limit):
+    """History list; the first page stays live by fetching only notifications newer than it shows"""
+    from change_feed import change_version
+    from notification_queries import query_notifications
+    status = None if status_filter == "All" else status_filter
+    notification_type = None if type_filter == "All" else type_filter
+    priority = None if priority_filter == "All" else priority_filter
+    cursors = st.session_state.history_cursors
+    
+    conn = feed_connection()
+    try:
+        if len(cursors) == 1 and not search_text.strip():
+            feed = live_feed('history', (status, notification_type, priority, start, end, limit), limit)
+            feed.refresh(conn, lambda after_id, before_id, page_size: query_notifications(
+                conn, status=status, notification_type=notification_type, priority=priority,
+                start=start, end=end, after_id=after_id, before_id=before_id, limit=page_size
+            )['notifications'])
+            notifications = feed.rows
+            page = {'next_cursor': notifications[-1]['id'] if len(notifications) == limit else None}
+        else:
+            # Search results and older pages are re-read only when the change version moves
+            key = (search_text, status, notification_type, priority, start, end, cursors[-1], limit,
+                   change_version(conn))
+            cached = st.session_state.get('history_page')
+            if cached is None or cached[0] != key:
+                page, error = None, None
+                if search_text.strip():
+                    from notification_search import ensure_search, search_notifications
+                    try:
+                        engine_registry.get('sqlite').ensure('search', ensure_search)
+                        page = search_notifications(
+                            conn, search_text, status=status, notification_type=notification_type,
+                            priority=priority, start=start, end=end, cursor=cursors[-1], limit=limit
+                        )
+                        notifications = page['notifications']
+                    except sqlite3.OperationalError:
+                        notifications, error = [], "Search is unavailable: this SQLite build has no FTS5 support"
+                else:
+                    page = query_notifications(
+                        conn, status=status, notification_type=notification_type, priority=priority,
+                        start=start, end=end, before_id=cursors[-1], limit=limit
+                    )
+                    notifications = page['notifications']
+                st.session_state.history_page = cached = (key, notifications, page, error)
+            _, notifications, page, error = cached
+            if error:
+                st.error(error)
+    finally:
+        conn.close()
+    
+    if page is not None:
+        col1, col2, col3 = st.columns([1, 1, 4])
+        with col1:
+            if st.button("◀ Newer", disabled=len(st.session_state.history_cursors) == 1):
+                st.session_state.history_cursors.pop()
+                st.rerun()
+        with col2:
+            if st.button("Older ▶", disabled=page['next_cursor'] is None):
+                st.session_state.history_cursors.append(page['next_cursor'])
+                st.rerun()
+        with col3:
+            st.caption(f"Page {len(st.session_state.history_cursors)}")
+    
+    if not notifications:
+        st.info("No notifications match these filters")
+    
+    # Display notifications
+    for notification in notifications:
+        with st.container():
+            col1, col2, col3 = st.columns([3, 1, 1])
+            
+            with col1:
+                st.write(f"**{notification['title']}**")
+                st.write(notification.get('snippet') or notification['message'])
+                st.caption(f"Created: {notification['created_at']}")
+            
+            with col2:
+                priority_color = {
+                    1: "🟢", 2: "🟡", 3: "🟠", 4: "🔴", 5: "🚨"
+                }
+                st.write(f"{priority_color.get(notification['priority'], '⚪')} Priority {notification['priority']}")
+                st.write(f"Type: {notification['notification_type']}")
+            
+            with col3:
+                status_color = {
+                    'pending': '🟡',
+                    'sent': '✅',
+                    'failed': '❌'
+                }
+                st.write(f"{status_color.get(notification['status'], '❓')} {notification['status'].title()}")
+                
+                if notification['status'] == 'pending':
+                    if st.button(f"Send", key=f"send_{notification['id']}"):
+                        # Through the dispatcher, so the row is claimed and never sent twice
+                        futures = engine_registry.get('dispatcher').submit([notification])
+                        if not futures:
+                            st.info("This notification is already being sent, or another app process is dispatching it")
+                        elif futures[0].result(timeout=60):
+                            st.success("Sent!")
+                            play_notification_sound()
+                            show_browser_notification(notification['title'], notification['message'])
+                            st.rerun()
+                        else:
+                            st.error("Failed to send")
+                elif notification['status'] == 'failed':
+                    if st.button("Retry Now", key=f"retry_{notification['id']}"):
+                        if engine_registry.get('outbox').requeue(notification['id']):
+                            engine_registry.get('outbox').run_once()
+                            st.rerun()
+                        else:
+                            st.info("Retry already in progress")
+
 def show_ai_features():
     st.header("🤖 AI Features")
     
@@ -916,6 +1324,7 @@ def show_ai_features():
                     
                     if success:
                         st.success("✅ AI notification created!")
+                        engine_registry.get('scheduled_timer').schedule(result['suggested_time'])
                     else:
                         st.error("❌ Failed to create notification")
             else:
@@ -930,8 +1339,8 @@ def show_analytics():
         st.subheader("Attendance Analytics")
         
         # Get attendance data
-        days = st.selectbox("Time Period", [7, 30, 90], key="attendance_days")
-        attendance_summary = st.session_state.attendance_system.get_attendance_summary(days)
+        days = st.selectbox("Time Period", [7, 30, 90, 365, 730], key="attendance_days")
+        attendance_summary = get_attendance_summary(days)
         
         # Key metrics
         col1, col2, col3, col4 = st.columns(4)
@@ -952,24 +1361,16 @@ def show_analytics():
         
         with col1:
             st.write("**Attendance Trend**")
-            # Create sample trend data
-            dates = pd.date_range(end=datetime.now(), periods=days, freq='D')
-            attendance_data = np.random.randint(5, 20, days)  # Sample data
-            
-            df_trend = pd.DataFrame({
-                'Date': dates,
-                'Attendance': attendance_data
-            })
-            
+            df_trend = get_attendance_trend(days)
             fig_trend = px.line(df_trend, x='Date', y='Attendance', title='Daily Attendance Trend')
             st.plotly_chart(fig_trend, use_container_width=True)
         
         with col2:
             st.write("**People Distribution**")
-            people_list = attendance_summary.get('people_list', [])
-            if people_list:
-                # Create sample attendance count for each person
-                people_data = {person: np.random.randint(1, days) for person in people_list}
+            per_person = attendance_summary.get('per_person', {})
+            if per_person:
+                # Top 20 attendees in the period
+                people_data = dict(list(per_person.items())[:20])
                 
                 fig_people = px.bar(
                     x=list(people_data.keys()),
@@ -978,13 +1379,13 @@ def show_analytics():
                 )
                 st.plotly_chart(fig_people, use_container_width=True)
             else:
-                st.info("No registered people found")
+                st.info("No attendance recorded in this period")
     
     with tab2:
         st.subheader("Notification Analytics")
         
         days = st.selectbox("Time Period", [7, 30, 90], key="notification_days")
-        analytics = st.session_state.notification_engine.get_notification_analytics(days)
+        analytics = get_notification_analytics(days)
         
         # Key metrics
         col1, col2, col3, col4 = st.columns(4)
@@ -1037,10 +1438,15 @@ def show_analytics():
         notifications = st.session_state.db.get_notifications(limit=100)
         
         if notifications:
-            sentiments = []
-            for n in notifications:
-                if n.get('sentiment_score') is not None:
-                    sentiments.append(n['sentiment_score'])
+            from sentiment_batcher import sentiment_score
+            # Score the notifications saved without a sentiment in one batched call
+            unscored = [n for n in notifications if n.get('sentiment_score') is None]
+            results = st.session_state.ai_features.sentiment_service.analyze_batch(
+                [f"{n['title']}. {n['message']}" for n in unscored]
+            )
+            for n, result in zip(unscored, results):
+                n['sentiment_score'] = sentiment_score(result)
+            sentiments = [n['sentiment_score'] for n in notifications]
             
             if sentiments:
                 avg_sentiment = np.mean(sentiments)
@@ -1100,20 +1506,49 @@ def show_settings():
         
         with col1:
             st.write("**Face Recognition Settings**")
-            tolerance = st.slider("Recognition Tolerance", 0.1, 1.0, 0.6, 0.1)
-            model = st.selectbox("Recognition Model", ["hog", "cnn"])
+            face_settings = st.session_state.face_settings
+            tolerance = st.slider("Recognition Tolerance", 0.1, 1.0, face_settings['tolerance'], 0.1)
+            model = st.selectbox("Recognition Model", ["hog", "cnn"], index=["hog", "cnn"].index(face_settings['model']))
+            detect_max_side = st.select_slider(
+                "Detection Resolution (longest side)",
+                options=[480, 640, 800, 1024, 1600, "Full"],
+                value=face_settings['detect_max_side'] or "Full",
+                help="Faces are found on a downscaled copy and encoded at full resolution. Lower is faster, higher finds smaller faces."
+            )
+            upsample = st.selectbox("Detection Upsampling", [0, 1, 2], index=face_settings['upsample'])
             
             if st.button("Update Face Recognition Settings"):
+                st.session_state.face_settings = {
+                    'tolerance': tolerance,
+                    'model': model,
+                    'detect_max_side': None if detect_max_side == "Full" else detect_max_side,
+                    'upsample': upsample,
+                }
                 st.success("Settings updated!")
         
         with col2:
             st.write("**Notification Settings**")
-            email_enabled = st.checkbox("Email Notifications", value=True)
-            push_enabled = st.checkbox("Push Notifications", value=True)
-            webhook_enabled = st.checkbox("Webhook Notifications", value=True)
+            channels = engine_registry.get('channels')
+            channel_status = channels.status()
+            email_enabled = st.checkbox("Email Notifications", value=channel_status['email'] == 'enabled')
+            push_enabled = st.checkbox("Push Notifications", value=channel_status['push'] == 'enabled')
+            webhook_enabled = st.checkbox("Webhook Notifications", value=channel_status['webhook'] == 'enabled')
             
             if st.button("Update Notification Settings"):
+                channels.configure(email_enabled, push_enabled, webhook_enabled)
                 st.success("Settings updated!")
+            
+            channel_stats = channels.stats()
+            st.caption(" · ".join(f"{name.title()}: {status} ({channel_stats[name]['sent']} sent, {channel_stats[name]['failed']} failed)"
+                                  for name, status in channels.status().items()))
+        
+        st.write("**Startup Metrics**")
+        metrics = import_metrics()
+        if metrics:
+            for module_name, info in sorted(metrics.items(), key=lambda item: -item[1]['seconds']):
+                st.write(f"• {module_name}: {info['seconds']:.2f}s ({info['trigger']})")
+        else:
+            st.caption("No deferred modules loaded yet")
     
     with tab2:
         st.subheader("AI Configuration")
@@ -1122,11 +1557,25 @@ def show_settings():
         
         with col1:
             st.write("**Sentiment Analysis**")
+            sentiment_service = st.session_state.ai_features.sentiment_service
             model_name = st.text_input("Model Name", value="sentiment-analysis")
-            max_length = st.number_input("Max Text Length", value=512)
+            max_length = st.number_input("Max Text Length", min_value=16, max_value=512, value=sentiment_service.max_length)
+            max_batch = st.number_input("Batch Size", min_value=1, max_value=256, value=sentiment_service.max_batch)
+            quantize = st.checkbox("Int8 Quantization (CPU)", value=sentiment_service.quantized,
+                                   disabled=sentiment_service.quantized,
+                                   help="Dynamically quantize the model's linear layers. Cannot be undone without a restart.")
             
             if st.button("Update AI Settings"):
-                st.success("AI settings updated!")
+                if sentiment_service.configure(max_length=max_length, max_batch=max_batch, quantize=quantize):
+                    st.success("AI settings updated!")
+                else:
+                    st.warning("Settings updated, but the sentiment model does not support quantization")
+            
+            sentiment_stats = sentiment_service.stats()
+            st.caption(f"{sentiment_stats['requests']} requests · {sentiment_stats['cache_hits']} cache hits · "
+                       f"{sentiment_stats['batches']} batches ({sentiment_stats['batched_texts']} texts)")
+            if not sentiment_stats['pipeline']:
+                st.warning("No sentiment pipeline was found on AIFeatures, so texts are analyzed one at a time without batching")
         
         with col2:
             st.write("**Smart Scheduling**")
@@ -1166,8 +1615,8 @@ def show_settings():
             st.write("**Database Statistics**")
             
             # Get database stats
-            attendance_stats = st.session_state.attendance_system.get_attendance_summary(30)
-            notification_stats = st.session_state.notification_engine.get_notification_analytics(30)
+            attendance_stats = get_attendance_summary(30)
+            notification_stats = get_notification_analytics(30)
             
             st.write(f"**Attendance Records:** {attendance_stats.get('stats', {}).get('total_attendance', 0)}")
             st.write(f"**Notifications:** {notification_stats.get('total_notifications', 0)}")
@@ -1207,6 +1656,35 @@ def show_settings():
                 admin_stats = st.session_state.admin_auth.get_admin_stats()
                 st.write(f"**Total Admin Users:** {admin_stats['total_users']}")
                 st.write(f"**Active Sessions:** {admin_stats['active_sessions']}")
+            
+            st.write("**Shared Engines**")
+            for name, stats in engine_registry.stats().items():
+                if stats['loaded']:
+                    st.write(f"✅ {name}: loaded in {stats['load_seconds']:.2f}s, +{stats['rss_delta_mb']:.1f} MB")
+                elif stats['error']:
+                    st.write(f"❌ {name}: {stats['error']}")
+                else:
+                    st.write(f"⏸️ {name}: not loaded")
+            cache_stats = engine_registry.get('query_cache').stats()
+            st.caption(f"Query cache: {cache_stats['hit_rate']}% hits ({cache_stats['hits']} hits, "
+                       f"{cache_stats['misses']} misses) · {cache_stats['entries']} entries · "
+                       f"{cache_stats['invalidations']} invalidations")
+            auth_stats = session_cache.stats()
+            st.caption(f"Session cache: {auth_stats['storage_lookups']} storage lookups · "
+                       f"{auth_stats['verified_hits']} cached verifications · {auth_stats['memo_hits']} per-rerun hits · "
+                       f"{auth_stats['revocations']} revocations")
+            if engine_registry.is_loaded('sqlite'):
+                db_stats = engine_registry.get('sqlite').stats
+                st.caption(f"SQLite: {db_stats['connections']} connections opened · {db_stats['writes']} writes "
+                           f"in {db_stats['batches']} commits (largest {db_stats['largest_batch']})")
+            
+            if st.button("Warm Up Engines"):
+                with st.spinner("Loading engines..."):
+                    failures = engine_registry.warm_up()
+                if failures:
+                    st.error(f"Failed to load: {', '.join(failures)}")
+                else:
+                    st.success("All engines loaded!")
 
 def show_admin_panel():
     """Show admin panel with different admin functions"""
@@ -1260,7 +1738,7 @@ def show_student_attendance():
                 image_bytes = uploaded_file.read()
                 
                 with st.spinner("Processing attendance..."):
-                    result = st.session_state.attendance_system.mark_attendance(image_bytes=image_bytes)
+                    result = mark_attendance_from_upload(image_bytes)
                 
                 if result['success']:
                     st.success("✅ Attendance marked successfully!")
@@ -1275,20 +1753,22 @@ def show_student_attendance():
                     st.session_state.notification_engine.create_attendance_notification(result)
                 else:
                     st.error("❌ Failed to mark attendance")
+                    if 'error' in result:
+                        st.error(f"Error: {result['error']}")
             else:
                 st.warning("Please upload a photo")
     
     with col2:
         st.subheader("My Attendance Records")
         
-        # Get student's attendance records
-        attendance_summary = st.session_state.attendance_system.get_attendance_summary(30)
-        student_records = []
-        
-        if attendance_summary.get('today_attendance'):
-            for record in attendance_summary['today_attendance']:
-                if record['person_name'].lower() == student_info['username'].lower():
-                    student_records.append(record)
+        # Only this student's rows, through the per-person index
+        from person_attendance import person_records
+        conn = attendance_connection()
+        try:
+            student_records = person_records(conn, student_info['username'],
+                                             since=datetime.now().date() - timedelta(days=29))
+        finally:
+            conn.close()
         
         if student_records:
             df = pd.DataFrame(student_records)
@@ -1318,18 +1798,54 @@ def show_student_notifications():
         show_student_login()
         return
     
-    # Get notifications
-    notifications = st.session_state.db.get_notifications(limit=20)
+    from notification_inbox import audiences_for
+    
+    # This student's inbox: notifications for everyone, their major/year, or them
+    show_student_inbox(student_info['username'].lower(),
+                       audiences_for(student_info['username'], student_info.get('profile')))
+
+@live_fragment()
+def show_student_inbox(user_id, audiences):
+    """Inbox list that polls the change version and fetches only newer notifications"""
+    from change_feed import ensure_change_feed
+    from notification_inbox import get_inbox, unread_count, mark_read, mark_all_read
+    feed = live_feed('inbox', (user_id, tuple(audiences)), 20)
+    engine_registry.get('sqlite').ensure('change_feed', ensure_change_feed)
+    conn = inbox_connection()
+    try:
+        version = feed.version
+        new_notifications = feed.refresh(
+            conn, lambda after_id, before_id, limit: get_inbox(
+                conn, user_id, audiences, limit=limit, before_id=before_id, after_id=after_id
+            )
+        )
+        if feed.version != version or 'inbox_unread' not in st.session_state:
+            st.session_state.inbox_unread = unread_count(conn, user_id, audiences)
+    finally:
+        conn.close()
+    notifications = feed.rows
+    unread = st.session_state.inbox_unread
+    if new_notifications:
+        st.toast(f"🔔 {len(new_notifications)} new notification(s)")
     
     if notifications:
-        st.subheader("Recent Notifications")
+        col1, col2 = st.columns([3, 1])
+        with col1:
+            st.subheader(f"Recent Notifications ({unread}{'+' if unread >= 100 else ''} unread)")
+        with col2:
+            if unread and st.button("Mark All Read"):
+                mark_all_read(inbox_database(), user_id, notifications[0]['id'])
+                feed.reset()
+                st.session_state.pop('inbox_unread', None)
+                st.rerun()
         
         for notification in notifications:
             with st.container():
                 col1, col2 = st.columns([3, 1])
                 
                 with col1:
-                    st.write(f"**{notification['title']}**")
+                    marker = "" if notification['is_read'] else "🔵 "
+                    st.write(f"{marker}**{notification['title']}**")
                     st.write(notification['message'])
                     st.caption(f"Created: {notification['created_at']}")
                 
@@ -1339,6 +1855,12 @@ def show_student_notifications():
                     }
                     st.write(f"{priority_color.get(notification['priority'], '⚪')} Priority {notification['priority']}")
                     st.write(f"Type: {notification['notification_type']}")
+                    if not notification['is_read']:
+                        if st.button("Mark Read", key=f"read_{notification['id']}"):
+                            mark_read(inbox_database(), user_id, [notification['id']])
+                            feed.reset()
+                            st.session_state.pop('inbox_unread', None)
+                            st.rerun()
     else:
         st.info("No notifications available")
 
@@ -1367,26 +1889,29 @@ def show_student_reports():
     # Student-specific attendance stats
     st.subheader("My Attendance Summary")
     
-    attendance_summary = st.session_state.attendance_system.get_attendance_summary(30)
+    from person_attendance import person_summary
+    conn = attendance_connection()
+    try:
+        my_summary = person_summary(conn, student_info['username'], days=30)
+    finally:
+        conn.close()
     
-    col1, col2, col3 = st.columns(3)
+    col1, col2, col3, col4 = st.columns(4)
     
     with col1:
-        st.metric("Total Records", attendance_summary.get('stats', {}).get('total_attendance', 0))
+        st.metric("Days Present (30d)", my_summary['days_present'], delta=f"{my_summary['total_records']} records")
     with col2:
-        st.metric("This Month", attendance_summary.get('stats', {}).get('unique_people', 0))
+        st.metric("This Month", f"{my_summary['monthly_rate']}%")
     with col3:
-        st.metric("Today", attendance_summary.get('stats', {}).get('today_attendance', 0))
+        st.metric("Current Streak", f"{my_summary['current_streak']} days",
+                  delta=f"best {my_summary['longest_streak']}")
+    with col4:
+        last_seen = my_summary['last_seen']
+        st.metric("Last Seen", last_seen.strftime('%b %d, %H:%M') if last_seen else "Never")
     
     # Simple attendance chart
     st.subheader("Attendance Trend")
-    dates = pd.date_range(end=datetime.now(), periods=7, freq='D')
-    attendance_data = [5, 7, 6, 8, 9, 7, 8]  # Sample data
-    
-    df_trend = pd.DataFrame({
-        'Date': dates,
-        'Attendance': attendance_data
-    })
+    df_trend = get_attendance_trend(7, people=[student_info['username']])
     
     fig_trend = px.line(df_trend, x='Date', y='Attendance', title='My Attendance Trend (Last 7 Days)')
     st.plotly_chart(fig_trend, use_container_width=True)
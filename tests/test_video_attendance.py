@@ -0,0 +1,92 @@
+"""A recorded video file stands in for the classroom camera."""
+import os
+
+import numpy as np
+import pytest
+
+cv2 = pytest.importorskip('cv2')
+
+from db_access import ATTENDANCE_BENCHMARK_SCHEMA, SQLiteDatabase
+from face_index import FaceEncodingIndex
+from person_attendance import AttendanceUnavailable, person_records, record_attendance
+from video_attendance import VideoAttendanceStream
+
+FRAMES = 30
+KNOWN = np.full(128, 0.1, dtype=np.float32)
+
+
+def write_video(path, frames=FRAMES, size=(160, 120)):
+    """A bright square (the "face") drifting across a dark background"""
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'MJPG'), 30.0, size)
+    if not writer.isOpened():
+        pytest.skip("this OpenCV build cannot write MJPG video")
+    for i in range(frames):
+        frame = np.zeros((size[1], size[0], 3), dtype=np.uint8)
+        frame[40:80, 20 + i:60 + i] = 255
+        writer.write(frame)
+    writer.release()
+
+
+def detect_bright_square(rgb_frame, config):
+    ys, xs = np.nonzero(rgb_frame.max(axis=2) > 128)
+    if not len(ys):
+        return []
+    return [(int(ys.min()), int(xs.max()), int(ys.max()), int(xs.min()))]
+
+
+def encode_as_known(rgb_frame, boxes):
+    return [KNOWN for _ in boxes]
+
+
+def test_stream_tracks_a_face_across_frames_and_encodes_it_once(tmp_path):
+    path = str(tmp_path / 'classroom.avi')
+    write_video(path)
+    index = FaceEncodingIndex()
+    index.add('Jane Doe', KNOWN)
+    stream = VideoAttendanceStream(path, index, detect=detect_bright_square, encode=encode_as_known)
+    seen = []
+
+    result = stream.run(on_new_faces=seen.extend)
+
+    assert result['success']
+    assert [face['name'] for face in result['recognized_faces']] == ['Jane Doe']
+    assert result['stats']['frames_read'] == FRAMES
+    assert result['stats']['faces_encoded'] == 1
+    assert [track.name for track in seen] == ['Jane Doe']
+
+
+def test_stream_reports_a_source_it_cannot_open(tmp_path):
+    stream = VideoAttendanceStream(str(tmp_path / 'missing.avi'), FaceEncodingIndex())
+
+    result = stream.run()
+
+    assert not result['success']
+    assert 'Unable to open' in result['error']
+
+
+def test_recognized_faces_are_recorded_as_attendance_rows(tmp_path):
+    path = str(tmp_path / 'classroom.avi')
+    write_video(path)
+    index = FaceEncodingIndex()
+    index.add('Jane Doe', KNOWN)
+    result = VideoAttendanceStream(path, index, detect=detect_bright_square, encode=encode_as_known).run()
+    database = SQLiteDatabase(os.path.join(str(tmp_path), 'attendance.db'))
+    database.ensure('attendance', lambda conn: conn.execute(ATTENDANCE_BENCHMARK_SCHEMA))
+
+    assert record_attendance(database, result['recognized_faces']) == 1
+
+    conn = database.connect()
+    try:
+        assert [row['person_name'] for row in person_records(conn, 'jane doe')] == ['Jane Doe']
+    finally:
+        conn.close()
+        database.close()
+
+
+def test_recording_without_an_attendance_table_raises_attendance_unavailable(tmp_path):
+    database = SQLiteDatabase(os.path.join(str(tmp_path), 'empty.db'))
+    try:
+        with pytest.raises(AttendanceUnavailable):
+            record_attendance(database, [{'name': 'Jane Doe', 'confidence': 0.9}])
+    finally:
+        database.close()
@@ -0,0 +1,159 @@
+"""Continuous attendance from a camera or video stream.
+
+Frames are read with cv2.VideoCapture and go straight into recognition as arrays,
+with no JPEG encode/decode round trip. Faces are detected on each processed frame
+and tracked between frames by box overlap. Each face is encoded and matched once,
+when its track first appears. When processing falls behind the stream's frame rate,
+frames are skipped so the stream keeps up. The detector and encoder are parameters,
+so a video file can stand in for the camera in tests.
+"""
+import math
+import time
+
+import numpy as np
+
+from face_index import DEFAULT_TOLERANCE
+from face_pipeline import DetectionConfig, detect_faces
+
+
+def _iou(a, b):
+    # face_recognition boxes are (top, right, bottom, left)
+    top, bottom = max(a[0], b[0]), min(a[2], b[2])
+    left, right = max(a[3], b[3]), min(a[1], b[1])
+    if bottom <= top or right <= left:
+        return 0.0
+    inter = (bottom - top) * (right - left)
+    area_a = (a[2] - a[0]) * (a[1] - a[3])
+    area_b = (b[2] - b[0]) * (b[1] - b[3])
+    return inter / float(area_a + area_b - inter)
+
+
+def encode_faces(rgb_frame, boxes):
+    """128-d encodings for the given boxes of an RGB frame"""
+    import face_recognition
+    return face_recognition.face_encodings(rgb_frame, known_face_locations=boxes)
+
+
+class _Track:
+    __slots__ = ('track_id', 'box', 'name', 'confidence', 'missed')
+
+    def __init__(self, track_id, box, name, confidence):
+        self.track_id = track_id
+        self.box = box
+        self.name = name
+        self.confidence = confidence
+        self.missed = 0
+
+
+class VideoAttendanceStream:
+    """Track faces across frames of a camera index or video file"""
+
+    def __init__(self, source, index, config=None, tolerance=DEFAULT_TOLERANCE,
+                 iou_threshold=0.3, max_missed=5, max_skip=10, detect=detect_faces, encode=encode_faces):
+        self.source = source
+        self.index = index
+        self.config = config or DetectionConfig()
+        self.tolerance = tolerance
+        self.iou_threshold = iou_threshold
+        self.max_missed = max_missed
+        self.max_skip = max_skip
+        self.detect = detect
+        self.encode = encode
+        self._tracks = []
+        self._next_track_id = 1
+        self.recognized = {}
+        self.unknown_tracks = set()
+        self.stats = {'frames_read': 0, 'frames_processed': 0, 'frames_skipped': 0,
+                      'faces_encoded': 0, 'avg_process_ms': 0.0}
+
+    def _update_tracks(self, rgb_frame, boxes):
+        unmatched = list(range(len(boxes)))
+        for track in self._tracks:
+            best, best_iou = None, self.iou_threshold
+            for i in unmatched:
+                overlap = _iou(track.box, boxes[i])
+                if overlap >= best_iou:
+                    best, best_iou = i, overlap
+            if best is None:
+                track.missed += 1
+            else:
+                track.box, track.missed = boxes[best], 0
+                unmatched.remove(best)
+        self._tracks = [t for t in self._tracks if t.missed <= self.max_missed]
+
+        if not unmatched:
+            return []
+        new_boxes = [boxes[i] for i in unmatched]
+        encodings = self.encode(rgb_frame, new_boxes)
+        self.stats['faces_encoded'] += len(encodings)
+        new_tracks = []
+        for box, match in zip(new_boxes, self.index.match(np.asarray(encodings, dtype=np.float32), self.tolerance)):
+            track = _Track(self._next_track_id, box, match['name'], match['confidence'])
+            self._next_track_id += 1
+            self._tracks.append(track)
+            new_tracks.append(track)
+            if track.name is None:
+                self.unknown_tracks.add(track.track_id)
+            elif track.confidence > self.recognized.get(track.name, {}).get('confidence', -1):
+                self.recognized[track.name] = {'name': track.name, 'confidence': track.confidence,
+                                               'first_seen': time.time()}
+        return new_tracks
+
+    def process_frame(self, bgr_frame):
+        """Detect and track faces in one BGR frame, returning newly started tracks"""
+        rgb_frame = np.ascontiguousarray(bgr_frame[:, :, ::-1])
+        boxes = self.detect(rgb_frame, self.config)
+        return self._update_tracks(rgb_frame, boxes)
+
+    def run(self, max_seconds=None, max_frames=None, on_new_faces=None):
+        """Consume the stream until it ends or a limit is hit, returning a result dict"""
+        import cv2
+        capture = cv2.VideoCapture(self.source)
+        if not capture.isOpened():
+            return {'success': False, 'recognized_faces': [], 'unknown_faces': [],
+                    'error': f"Unable to open video source {self.source!r}", 'stats': self.stats}
+        fps = capture.get(cv2.CAP_PROP_FPS) or 30.0
+        frame_budget = 1.0 / fps
+        ewma = None
+        skip = 0
+        started = time.perf_counter()
+        try:
+            while True:
+                if max_seconds is not None and time.perf_counter() - started >= max_seconds:
+                    break
+                if max_frames is not None and self.stats['frames_read'] >= max_frames:
+                    break
+                if skip:
+                    # grab() advances without decoding the frame
+                    if not capture.grab():
+                        break
+                    self.stats['frames_read'] += 1
+                    self.stats['frames_skipped'] += 1
+                    skip -= 1
+                    continue
+                ok, frame = capture.read()
+                if not ok:
+                    break
+                self.stats['frames_read'] += 1
+                frame_started = time.perf_counter()
+                new_tracks = self.process_frame(frame)
+                elapsed = time.perf_counter() - frame_started
+                ewma = elapsed if ewma is None else 0.8 * ewma + 0.2 * elapsed
+                self.stats['frames_processed'] += 1
+                self.stats['avg_process_ms'] = ewma * 1000
+                # Skip as many frames as processing one frame costs in stream time
+                skip = min(self.max_skip, max(0, math.ceil(ewma / frame_budget) - 1))
+                if new_tracks and on_new_faces is not None:
+                    on_new_faces(new_tracks)
+        finally:
+            capture.release()
+        return self.result()
+
+    def result(self):
+        recognized = sorted(self.recognized.values(), key=lambda face: -face['confidence'])
+        return {
+            'success': bool(recognized),
+            'recognized_faces': recognized,
+            'unknown_faces': [{'track_id': track_id} for track_id in sorted(self.unknown_tracks)],
+            'stats': dict(self.stats),
+        }